@@ -0,0 +1,116 @@
+import asyncio
+import os
+from typing import List, Optional, Tuple
+
+from detect import DETECT_BATCH_SIZE, detect_blobs
+from detect_pool import DetectionPool, pool
+from telemetry import add_to_trace, collecting
+
+# Merge concurrent single-image /detect calls into one inference call
+DETECT_MICROBATCH = os.getenv("DETECT_MICROBATCH", "1") != "0"
+# How long the first request of a batch waits for company before running alone
+DETECT_BATCH_WAIT_MS = float(os.getenv("DETECT_BATCH_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """Collects uploads submitted within a short window and detects them together.
+
+    Each submit() awaits its own (started, finished, result) tuple; the worker
+    drains up to max_batch queued images per run and hands them to the
+    detection pool as a single job.
+    """
+
+    def __init__(self, detection_pool: DetectionPool = pool, max_batch: int = DETECT_BATCH_SIZE,
+                 max_wait_ms: float = DETECT_BATCH_WAIT_MS):
+        self.pool = detection_pool
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._running: set = set()
+        self.batches = 0
+        self.images = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 0.0):
+        """Stop collecting; with a timeout, queued and running batches get that long to finish first."""
+        if self._worker is not None and timeout > 0:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while not self._queue.empty() and loop.time() < deadline:
+                await asyncio.sleep(0.01)
+            # Let the collector hand over its last partial batch
+            await asyncio.sleep(self.max_wait)
+            if self._running:
+                await asyncio.wait(set(self._running), timeout=max(0.0, deadline - loop.time()))
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+
+    async def submit(self, image_bytes: bytes) -> Tuple[float, float, Optional[dict]]:
+        if self._worker is None:
+            # Not started (batching disabled): one job per request
+            started, finished, results = await self.pool.run(detect_blobs, [image_bytes])
+            return started, finished, results[0]
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_bytes, future))
+        started, finished, result, spans = await future
+        # The batch's stage timings are part of every request it served
+        add_to_trace(spans)
+        return started, finished, result
+
+    async def _collect(self) -> List[Tuple[bytes, asyncio.Future]]:
+        items = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(items) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _dispatch(self, items: List[Tuple[bytes, asyncio.Future]]):
+        try:
+            with collecting() as spans:
+                started, finished, results = await self.pool.run(detect_blobs, [blob for blob, _ in items], len(items))
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.images += len(items)
+        for (_, future), result in zip(items, results):
+            if not future.done():
+                future.set_result((started, finished, result, spans))
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            items = [(blob, future) for blob, future in items if not future.cancelled()]
+            if items:
+                # Keep collecting while this batch runs, so several batches can share the pool
+                task = asyncio.create_task(self._dispatch(items))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    def stats(self):
+        return {
+            "enabled": self._worker is not None,
+            "batches": self.batches,
+            "images": self.images,
+            "mean_batch": round(self.images / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+batcher = MicroBatcher()
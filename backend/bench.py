@@ -0,0 +1,681 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the backend hot paths.
+
+    python bench.py plan                 # packing engines across grid sizes
+    python bench.py plan --json out.json
+    python bench.py plan3d               # 3D planner on a 13.6 m trailer
+    python bench.py preprocess           # full decode vs draft decode + resize
+    python bench.py boxes                # per-box Pydantic vs the columnar BoxArray
+    python bench.py load-plan            # plan_load across grid sizes and box counts
+    python bench.py detect               # OpenCV fallback and detect_boxes on synthetic photos
+    python bench.py chat                 # /chat and /chat/stream against local stub upstreams
+    python bench.py video                # sustained fps of detect-every-N plus tracking
+    python bench.py detector             # ultralytics vs ONNX Runtime: startup, RSS and latency
+    python bench.py startup              # import cost of main by package, and time until /ready
+    python bench.py all --json now.json  # every suite above with its defaults
+    python bench.py all --compare base.json   # exit 1 if any timing regressed
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from models import Box
+from packing import ENGINES
+
+
+def _legacy_first_fit(grid_w: int, grid_h: int, boxes: List[Box]) -> List[Optional[Tuple[int, int]]]:
+    """The original nested-list first-fit from plan_load, kept as the reference."""
+    occupied = [[False for _ in range(grid_w)] for _ in range(grid_h)]
+
+    def can_place(x, y, w, h):
+        if x < 0 or y < 0 or x + w > grid_w or y + h > grid_h:
+            return False
+        for yy in range(y, y + h):
+            for xx in range(x, x + w):
+                if occupied[yy][xx]:
+                    return False
+        return True
+
+    def place(x, y, w, h):
+        for yy in range(y, y + h):
+            for xx in range(x, x + w):
+                occupied[yy][xx] = True
+
+    positions: List[Optional[Tuple[int, int]]] = []
+    for b in boxes:
+        pos = None
+        for yy in range(grid_h):
+            for xx in range(grid_w):
+                if can_place(xx, yy, b.w, b.h):
+                    place(xx, yy, b.w, b.h)
+                    pos = (xx, yy)
+                    break
+            if pos:
+                break
+        positions.append(pos)
+    return positions
+
+
+def _engine_positions(strategy: str, grid_w: int, grid_h: int, boxes: List[Box]) -> List[Optional[Tuple[int, int]]]:
+    engine = ENGINES[strategy](grid_w, grid_h)
+    return [engine.insert(b.w, b.h) for b in boxes]
+
+
+def random_boxes(grid_w: int, grid_h: int, count: int, seed: int = 0) -> List[Box]:
+    """Cartons sized relative to the grid so fill stays comparable across resolutions."""
+    rng = random.Random(seed)
+    boxes = []
+    for i in range(count):
+        w = max(1, int(grid_w * rng.uniform(0.03, 0.15)))
+        h = max(1, int(grid_h * rng.uniform(0.03, 0.15)))
+        boxes.append(Box(id=f"box-{i + 1}", x=0, y=0, w=w, h=h))
+    return sorted(boxes, key=lambda b: b.w * b.h, reverse=True)
+
+
+def _time(fn: Callable, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_plan(args) -> List[Dict]:
+    results = []
+    for size in args.grids:
+        grid_w, grid_h = (int(v) for v in size.split("x"))
+        boxes = random_boxes(grid_w, grid_h, args.boxes, seed=args.seed)
+        row = {"bench": "plan", "grid": size, "boxes": len(boxes)}
+        for strategy in sorted(ENGINES):
+            row[f"{strategy}_ms"] = round(_time(lambda: _engine_positions(strategy, grid_w, grid_h, boxes), args.repeat) * 1000, 3)
+        if grid_w * grid_h <= args.legacy_max_cells:
+            row["legacy_ms"] = round(_time(lambda: _legacy_first_fit(grid_w, grid_h, boxes), 1) * 1000, 3)
+            row["first_fit_identical"] = _legacy_first_fit(grid_w, grid_h, boxes) == _engine_positions("first_fit", grid_w, grid_h, boxes)
+            row["speedup_first_fit"] = round(row["legacy_ms"] / max(row["first_fit_ms"], 1e-6), 1)
+            row["speedup_skyline"] = round(row["legacy_ms"] / max(row["skyline_ms"], 1e-6), 1)
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def random_cartons(count: int, seed: int = 0, min_side: int = 30, max_side: int = 80, rotation: str = "upright"):
+    from models import Box3D
+
+    rng = random.Random(seed)
+    return [
+        Box3D(id=f"carton-{i + 1}", w=rng.randint(min_side, max_side), h=rng.randint(min_side, max_side),
+              d=rng.randint(min_side, max_side), weight=round(rng.uniform(5, 40), 1), fragile=rng.random() < 0.05,
+              rotation=rotation)
+        for i in range(count)
+    ]
+
+
+# Carton side ranges per plan3d case: "mixed" runs out of trailer volume from about 250
+# cartons on, "fits" stays under a third of it, so every carton is placed up to 600 or so
+PLAN3D_CASES = {"mixed": (30, 80), "fits": (20, 50)}
+
+
+def bench_plan3d(args) -> List[Dict]:
+    from models import Axle, LoadPlan3DRequest, Vehicle
+    from planner3d import plan_load_3d
+
+    vehicle = Vehicle(name="trailer", width=245, length=1360, height=270, max_payload=24000,
+                      axles=[Axle(position=120, max_load=12000), Axle(position=1100, max_load=9000),
+                             Axle(position=1230, max_load=9000)])
+    results = []
+    for case in args.cases:
+        for rotation in args.rotations:
+            for count in args.counts:
+                cartons = random_cartons(count, args.seed, *PLAN3D_CASES[case], rotation=rotation)
+                body = LoadPlan3DRequest(vehicle=vehicle, boxes=cartons)
+                plan = plan_load_3d(body)
+                row = {
+                    "bench": "plan3d",
+                    "case": case,
+                    "rotation": rotation,
+                    "boxes": count,
+                    "ms": round(_time(lambda: plan_load_3d(body), args.repeat) * 1000, 3),
+                    "placed": len(plan.placements),
+                    "volume_utilization": plan.volume_utilization,
+                    "total_weight": plan.total_weight,
+                }
+                results.append(row)
+                print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def synthetic_jpeg(width: int, height: int, boxes: int = 10, seed: int = 0) -> bytes:
+    """A light background with dark rectangle outlines, JPEG-encoded like a phone photo."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 200, dtype=np.uint8)
+    noise = rng.integers(-12, 12, size=image.shape, dtype=np.int16)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    for _ in range(boxes):
+        bw, bh = int(width * rng.uniform(0.05, 0.2)), int(height * rng.uniform(0.05, 0.2))
+        x, y = int(rng.integers(0, width - bw)), int(rng.integers(0, height - bh))
+        cv2.rectangle(image, (x, y), (x + bw, y + bh), (40, 40, 40), max(2, width // 500))
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return buf.tobytes()
+
+
+def synthetic_video(width: int, height: int, frames: int, boxes: int = 6, step: int = 4, seed: int = 0) -> List[bytes]:
+    """JPEG frames of filled cartons sliding right by `step` pixels per frame, like a camera panning a load."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    cartons = []
+    for _ in range(boxes):
+        bw, bh = int(width * rng.uniform(0.08, 0.15)), int(height * rng.uniform(0.08, 0.15))
+        cartons.append((int(rng.integers(0, width // 2)), int(rng.integers(0, height - bh)), bw, bh))
+    encoded = []
+    for i in range(frames):
+        image = np.full((height, width, 3), 200, dtype=np.uint8)
+        for x, y, bw, bh in cartons:
+            x = (x + i * step) % (width - bw)
+            cv2.rectangle(image, (x, y), (x + bw, y + bh), (60, 60, 60), -1)
+        encoded.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+    return encoded
+
+
+def bench_preprocess(args) -> List[Dict]:
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    from detect import preprocess
+
+    def legacy(data: bytes):
+        return np.array(Image.open(io.BytesIO(data)).convert("RGB"))[:, :, ::-1]
+
+    results = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        data = synthetic_jpeg(width, height, seed=args.seed)
+        frame = preprocess(data, args.working_size)
+        row = {
+            "bench": "preprocess",
+            "size": size,
+            "working_size": args.working_size,
+            "legacy_ms": round(_time(lambda: legacy(data), args.repeat) * 1000, 3),
+            "preprocess_ms": round(_time(lambda: preprocess(data, args.working_size), args.repeat) * 1000, 3),
+            "bytes_saved": frame.stats["bytes_saved"],
+            "memory_ratio": frame.stats["memory_ratio"],
+        }
+        row["time_saved_ms"] = round(row["legacy_ms"] - row["preprocess_ms"], 3)
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def bench_boxes(args) -> List[Dict]:
+    import numpy as np
+
+    from boxes import BoxArray
+    from models import DetectResponse
+
+    def legacy(rows: np.ndarray, conf: np.ndarray) -> str:
+        # One validated model per candidate, dumped per box, then validation again in the response model
+        models = [Box(id=f"box-{i + 1}", x=int(r[0]), y=int(r[1]), w=int(r[2]), h=int(r[3]), confidence=float(c))
+                  for i, (r, c) in enumerate(zip(rows, conf))]
+        return DetectResponse(boxes=[m.model_dump() for m in models], image_width=4000, image_height=3000).model_dump_json()
+
+    def columnar(rows: np.ndarray, conf: np.ndarray) -> str:
+        boxes = BoxArray(rows, conf)
+        return json.dumps({"boxes": boxes.to_dicts(), "image_width": 4000, "image_height": 3000})
+
+    results = []
+    for count in args.counts:
+        rng = np.random.default_rng(args.seed)
+        rows = rng.integers(1, 4000, size=(count, 4)).astype(np.int32)
+        conf = rng.uniform(0.25, 1.0, size=count)
+        row = {
+            "bench": "boxes",
+            "boxes": count,
+            "legacy_ms": round(_time(lambda: legacy(rows, conf), args.repeat) * 1000, 3),
+            "columnar_ms": round(_time(lambda: columnar(rows, conf), args.repeat) * 1000, 3),
+            "identical": json.loads(legacy(rows, conf))["boxes"] == json.loads(columnar(rows, conf))["boxes"],
+        }
+        row["speedup"] = round(row["legacy_ms"] / max(row["columnar_ms"], 1e-6), 1)
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def bench_load_plan(args) -> List[Dict]:
+    from load_planner import plan_load
+    from models import LoadPlanRequest
+
+    results = []
+    for size in args.grids:
+        grid_w, grid_h = (int(v) for v in size.split("x"))
+        for count in args.counts:
+            body = LoadPlanRequest(grid_width=grid_w, grid_height=grid_h,
+                                   boxes=random_boxes(grid_w, grid_h, count, seed=args.seed))
+            plan = plan_load(body)
+            row = {
+                "bench": "load_plan",
+                "grid": size,
+                "boxes": count,
+                "ms": round(_time(lambda: plan_load(body), args.repeat) * 1000, 3),
+                "placed": len(plan.placements),
+                "score": plan.score,
+            }
+            results.append(row)
+            print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def bench_detect(args) -> List[Dict]:
+    from detect import _opencv_rect_detect, detect_boxes, preprocess
+    from model_registry import registry
+
+    results = []
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        data = synthetic_jpeg(width, height, boxes=args.boxes, seed=args.seed)
+        frame = preprocess(data)
+        result = detect_boxes(data)
+        row = {
+            "bench": "detect",
+            "size": size,
+            "backend": registry.status()["backend"] or "opencv",
+            "opencv_ms": round(_time(lambda: _opencv_rect_detect(frame.image), args.repeat) * 1000, 3),
+            "detect_boxes_ms": round(_time(lambda: detect_boxes(data), args.repeat) * 1000, 3),
+            "found": len(result["boxes"]) if result else 0,
+        }
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def bench_video(args) -> List[Dict]:
+    from boxes import BoxArray
+    from detect import detect_blobs
+    from tracking import Tracker
+
+    width, height = (int(v) for v in args.size.split("x"))
+    frames = synthetic_video(width, height, args.frames, seed=args.seed)
+    results = []
+    for every in args.detect_every:
+        tracker = Tracker()
+        per_frame, detections, ids = [], 0, set()
+        start = time.perf_counter()
+        for index, data in enumerate(frames):
+            t0 = time.perf_counter()
+            # Same policy as VideoStream: detect on schedule or when nothing is tracked
+            if index % every == 0 or not len(tracker):
+                result = detect_blobs([data], 1, args.working_size)[0]
+                tracker.update(BoxArray.from_boxes(result["boxes"]), index)
+                detections += 1
+            else:
+                tracker.predict(index)
+            ids.update(tracker.ids)
+            per_frame.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+        row = {"bench": "video", "size": args.size, "working_size": args.working_size, "detect_every": every,
+               "frames": len(frames), "detections": detections, "track_ids": len(ids),
+               "fps": round(len(frames) / elapsed, 1), **_percentiles(per_frame)}
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _probe_detector(backend: str, weights: Optional[str], size: str, repeat: int, seed: int) -> Dict[str, Any]:
+    """Runs in a fresh interpreter, so import time and memory belong to this backend alone."""
+    os.environ["DETECTOR_BACKEND"] = backend
+    if weights:
+        os.environ["YOLO_WEIGHTS"] = weights
+    baseline_rss = _peak_rss_mb()
+
+    start = time.perf_counter()
+    from detect import preprocess
+    from model_registry import BACKEND, DEFAULT_WEIGHTS, registry
+    imported = time.perf_counter()
+    if BACKEND is None:
+        from detectors import BACKENDS
+        return {"skipped": f"{BACKENDS[backend].module} is not installed"}
+    entry = registry.load(warmup=False)
+    if entry is None:
+        return {"skipped": registry.status()["models"].get(DEFAULT_WEIGHTS, {}).get("error", "load failed")}
+    loaded = time.perf_counter()
+    registry.warmup()
+    warmed = time.perf_counter()
+
+    width, height = (int(v) for v in size.split("x"))
+    image = preprocess(synthetic_jpeg(width, height, seed=seed)).image
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        boxes = registry.predict([image])[0]
+        samples.append(time.perf_counter() - t0)
+    return {
+        "weights": DEFAULT_WEIGHTS,
+        "import_ms": round((imported - start) * 1000, 1),
+        "load_ms": round((loaded - imported) * 1000, 1),
+        "warmup_ms": round((warmed - loaded) * 1000, 1),
+        "startup_ms": round((warmed - start) * 1000, 1),
+        "peak_rss_mb": _peak_rss_mb(),
+        "detect_rss_mb": round(_peak_rss_mb() - baseline_rss, 1),
+        "found": len(boxes),
+        **_percentiles(samples),
+    }
+
+
+def bench_detector(args) -> List[Dict]:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    for spec in args.backends:
+        # "onnx=yolov8n-int8.onnx" benchmarks a specific weights file
+        backend, _, weights = spec.partition("=")
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            probe = executor.submit(_probe_detector, backend, weights or None, args.size, args.repeat, args.seed).result()
+        if "skipped" in probe:
+            print(f"skipping {spec}: {probe['skipped']}", file=sys.stderr)
+            continue
+        row = {"bench": "detector", "backend": backend, "size": args.size, **probe}
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+_READY_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    while client.get("/ready").status_code != 200 and time.perf_counter() - start < float(sys.argv[1]):
+        time.sleep(0.02)
+    ready = time.perf_counter()
+    report = client.get("/ready").json()
+print(json.dumps({"import_ms": (imported - start) * 1000, "ready_ms": (ready - start) * 1000, "report": report}))
+"""
+
+
+def import_times(module: str = "main", env: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    """Self import time per top-level package while importing `module` in a fresh interpreter (-X importtime)."""
+    import subprocess
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                          text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True)
+    totals: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, self_us, _, name = (part.strip() for part in line.replace("import time:", "|", 1).split("|"))
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1000
+    return totals
+
+
+def bench_startup(args) -> List[Dict]:
+    import subprocess
+
+    env = dict(os.environ, READY_SUBSYSTEMS=",".join(args.subsystems), PRELOAD_MODEL="1" if args.preload else "0")
+    totals = import_times("main", env)
+    results = []
+    for package, ms in sorted(totals.items(), key=lambda kv: -kv[1])[:args.top]:
+        row = {"bench": "startup", "module": package, "import_self_ms": round(ms, 1),
+               "share": round(ms / sum(totals.values()), 3)}
+        results.append(row)
+        print(json.dumps(row), file=sys.stderr)
+
+    # A second fresh process: wall time to import main, then until every requested subsystem is warm
+    proc = subprocess.run([sys.executable, "-c", _READY_PROBE, str(args.timeout)], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True)
+    probe = json.loads(proc.stdout.strip().splitlines()[-1])
+    report = probe["report"]
+    row = {"bench": "startup", "subsystems": ",".join(args.subsystems), "ready": report["ready"],
+           "import_main_ms": round(probe["import_ms"], 1), "ready_ms": round(probe["ready_ms"], 1)}
+    # Flat keys, so --compare checks each subsystem's warm-up and each deferred import on its own
+    row.update({f"warm_{name}_ms": round(s.get("seconds", 0) * 1000, 1) for name, s in report["subsystems"].items()})
+    row.update({f"lazy_{name}_ms": ms for name, ms in report["lazy_imports_ms"].items()})
+    results.append(row)
+    print(json.dumps(row), file=sys.stderr)
+    return results
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50_ms": round(statistics.median(ordered) * 1000, 3), "p95_ms": round(pick(0.95) * 1000, 3),
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 3)}
+
+
+def bench_chat(args) -> List[Dict]:
+    from stub_upstreams import StubUpstream
+
+    stub = StubUpstream(llm_delay=args.llm_delay, tts_delay=args.tts_delay, token_delay=args.token_delay).start()
+    # The backend reads its upstream configuration at import time
+    os.environ.update({"ANTHROPIC_API_KEY": "bench-key", "ANTHROPIC_BASE_URL": stub.url,
+                       "ELEVENLABS_API_KEY": "bench-key", "ELEVENLABS_BASE_URL": stub.url, "PRELOAD_MODEL": "0"})
+    os.chdir(tempfile.mkdtemp())
+    import httpx
+    import uvicorn
+    import main as app_main
+
+    # A real server rather than TestClient, which buffers streamed bodies and hides time-to-first-token
+    server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=0, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    payload = {"messages": [{"role": "user", "content": "How should I load 5 boxes?"}],
+               "context": {"boxes": [], "vehicle": "van"}}
+    results = []
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        for cached in (False, True):
+            chat, stream, first_token, first_audio = [], [], [], []
+            for i in range(args.requests):
+                # A fresh reply per request misses the TTS cache; a fixed one measures the hit path
+                stub.reply = "I can see 5 boxes. Load the heavy ones first." if cached else \
+                    f"I can see {i + 5} boxes. They fit in two rows. Load the heavy ones first."
+                start = time.perf_counter()
+                assert client.post("/chat", json=payload).status_code == 200
+                chat.append(time.perf_counter() - start)
+
+                stub.reply = stub.reply.replace("boxes.", "cartons.")
+                start = time.perf_counter()
+                token_at = audio_at = None
+                with client.stream("POST", "/chat/stream", json=payload) as response:
+                    for line in response.iter_lines():
+                        if line.startswith("event: token") and token_at is None:
+                            token_at = time.perf_counter() - start
+                        elif line.startswith("event: audio") and audio_at is None:
+                            audio_at = time.perf_counter() - start
+                stream.append(time.perf_counter() - start)
+                first_token.append(token_at or 0.0)
+                first_audio.append(audio_at or 0.0)
+
+            for endpoint, samples in (("chat", chat), ("chat_stream", stream),
+                                      ("chat_stream_first_token", first_token),
+                                      ("chat_stream_first_audio", first_audio)):
+                row = {"bench": "chat", "endpoint": endpoint, "tts_cached": cached,
+                       "requests": args.requests, **_percentiles(samples)}
+                results.append(row)
+                print(json.dumps(row), file=sys.stderr)
+    server.should_exit = True
+    stub.stop()
+    return results
+
+
+SUITES = ("plan", "plan3d", "preprocess", "boxes", "load-plan", "detect", "chat", "video", "detector", "startup")
+
+# Fields that identify a result row; everything ending in _ms is compared against the baseline
+IDENTITY_KEYS = ("bench", "case", "rotation", "grid", "boxes", "size", "working_size", "endpoint", "tts_cached",
+                 "detect_every", "backend", "weights", "module", "subsystems")
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple:
+    return tuple((k, row[k]) for k in IDENTITY_KEYS if k in row)
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float, floor_ms: float) -> List[Dict]:
+    """Timings that got slower than the baseline by more than `tolerance` (a fraction)."""
+    previous = {_row_key(row): row for row in baseline}
+    regressions = []
+    for row in results:
+        old = previous.get(_row_key(row))
+        if old is None:
+            continue
+        for key, value in row.items():
+            if not key.endswith("_ms") or key not in old:
+                continue
+            # Sub-floor timings are dominated by noise
+            if value > old[key] * (1 + tolerance) and value - old[key] > floor_ms:
+                regressions.append({**dict(_row_key(row)), "metric": key, "baseline": old[key], "current": value,
+                                    "change": round(value / max(old[key], 1e-6) - 1, 3)})
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    import numpy as np
+
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "time": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", help="write results to this file")
+
+    plan = sub.add_parser("plan", parents=[common], help="packing engines vs the legacy first-fit")
+    plan.add_argument("--grids", nargs="+", default=["20x15", "60x45", "120x340", "240x1360"])
+    plan.add_argument("--boxes", type=int, default=200)
+    plan.add_argument("--repeat", type=int, default=3)
+    plan.add_argument("--seed", type=int, default=0)
+    plan.add_argument("--legacy-max-cells", type=int, default=60 * 45,
+                      help="skip the pure-Python reference above this many cells")
+    plan.set_defaults(func=bench_plan)
+
+    plan3d = sub.add_parser("plan3d", parents=[common], help="3D extreme-point planner")
+    plan3d.add_argument("--counts", type=int, nargs="+", default=[100, 250, 500, 1000])
+    plan3d.add_argument("--cases", nargs="+", choices=sorted(PLAN3D_CASES), default=["mixed", "fits"])
+    plan3d.add_argument("--rotations", nargs="+", choices=["fixed", "upright", "any"], default=["upright", "any"])
+    plan3d.add_argument("--repeat", type=int, default=3)
+    plan3d.add_argument("--seed", type=int, default=0)
+    plan3d.set_defaults(func=bench_plan3d)
+
+    pre = sub.add_parser("preprocess", parents=[common], help="image decode and downscale")
+    pre.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    pre.add_argument("--working-size", type=int, default=1280)
+    pre.add_argument("--repeat", type=int, default=5)
+    pre.add_argument("--seed", type=int, default=0)
+    pre.set_defaults(func=bench_preprocess)
+
+    boxes = sub.add_parser("boxes", parents=[common], help="per-box Pydantic vs columnar serialization")
+    boxes.add_argument("--counts", type=int, nargs="+", default=[100, 1000, 10000])
+    boxes.add_argument("--repeat", type=int, default=5)
+    boxes.add_argument("--seed", type=int, default=0)
+    boxes.set_defaults(func=bench_boxes)
+
+    load_plan = sub.add_parser("load-plan", parents=[common], help="plan_load end to end")
+    load_plan.add_argument("--grids", nargs="+", default=["20x15", "60x45", "120x340"])
+    load_plan.add_argument("--counts", type=int, nargs="+", default=[10, 50, 200])
+    load_plan.add_argument("--repeat", type=int, default=3)
+    load_plan.add_argument("--seed", type=int, default=0)
+    load_plan.set_defaults(func=bench_load_plan)
+
+    det = sub.add_parser("detect", parents=[common], help="OpenCV fallback and detect_boxes")
+    det.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    det.add_argument("--boxes", type=int, default=10, help="rectangles drawn per synthetic image")
+    det.add_argument("--repeat", type=int, default=3)
+    det.add_argument("--seed", type=int, default=0)
+    det.set_defaults(func=bench_detect)
+
+    chat = sub.add_parser("chat", parents=[common], help="/chat and /chat/stream against stub upstreams")
+    chat.add_argument("--requests", type=int, default=20)
+    chat.add_argument("--llm-delay", type=float, default=0.0, help="seconds before the stub LLM answers")
+    chat.add_argument("--tts-delay", type=float, default=0.0, help="seconds before the stub TTS answers")
+    chat.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    chat.set_defaults(func=bench_chat)
+
+    video = sub.add_parser("video", parents=[common], help="detect every N frames plus tracking, in process")
+    video.add_argument("--size", default="1280x720")
+    video.add_argument("--working-size", type=int, default=640)
+    video.add_argument("--frames", type=int, default=120)
+    video.add_argument("--detect-every", type=int, nargs="+", default=[1, 5, 10])
+    video.add_argument("--seed", type=int, default=0)
+    video.set_defaults(func=bench_video)
+
+    detector = sub.add_parser("detector", parents=[common], help="detection backends, each in a fresh process")
+    detector.add_argument("--backends", nargs="+", default=["ultralytics", "onnx"],
+                          help="backend names, optionally with weights: onnx=yolov8n-int8.onnx")
+    detector.add_argument("--size", default="1920x1080")
+    detector.add_argument("--repeat", type=int, default=20)
+    detector.add_argument("--seed", type=int, default=0)
+    detector.set_defaults(func=bench_detector)
+
+    startup = sub.add_parser("startup", parents=[common], help="import cost by package and time until /ready")
+    startup.add_argument("--subsystems", nargs="+", default=["planning", "detection", "chat", "tts"],
+                         help="READY_SUBSYSTEMS for the measured process")
+    startup.add_argument("--preload", action="store_true", help="load the detection weights during warm-up")
+    startup.add_argument("--top", type=int, default=15, help="packages to report")
+    startup.add_argument("--timeout", type=float, default=120)
+    startup.set_defaults(func=bench_startup)
+
+    every = sub.add_parser("all", parents=[common], help="run every suite with its defaults")
+    every.add_argument("--skip", nargs="+", default=[], choices=SUITES)
+
+    for command in (plan, plan3d, pre, boxes, load_plan, det, chat, video, detector, startup, every):
+        command.add_argument("--compare", help="baseline JSON from an earlier run; exit 1 on regressions")
+        command.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, as a fraction")
+        command.add_argument("--floor-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+
+    args = parser.parse_args()
+    if args.command == "all":
+        results = []
+        for name in SUITES:
+            if name not in args.skip:
+                # Each suite parses its own defaults so `all` runs exactly what the subcommands would
+                suite = parser.parse_args([name])
+                results.extend(suite.func(suite))
+    else:
+        results = args.func(args)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        # Older files are a bare list of rows
+        baseline = baseline["results"] if isinstance(baseline, dict) else baseline
+        regressions = compare(results, baseline, args.tolerance, args.floor_ms)
+        for r in regressions:
+            print(f"REGRESSION {json.dumps(r)}", file=sys.stderr)
+        print(f"{len(regressions)} regression(s) against {args.compare}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
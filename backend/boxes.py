@@ -0,0 +1,105 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from models import Box
+
+
+class BoxArray:
+    """Boxes as parallel columns instead of one Pydantic object per box.
+
+    `xywh` is an (N, 4) int32 array and `confidence` a float64 array; ids and
+    labels stay Python lists because they are only read when serializing.
+    Detection and planning work on these columns and convert once, at the
+    API boundary, with to_dicts() or to_models().
+    """
+
+    __slots__ = ("xywh", "confidence", "labels", "ids")
+
+    def __init__(self, xywh: np.ndarray, confidence: Optional[np.ndarray] = None,
+                 labels: Optional[List[str]] = None, ids: Optional[List[str]] = None):
+        self.xywh = np.asarray(xywh, dtype=np.int32).reshape(-1, 4)
+        n = len(self.xywh)
+        self.confidence = np.ones(n) if confidence is None else np.asarray(confidence, dtype=np.float64)
+        self.labels = ["box"] * n if labels is None else list(labels)
+        # Detection numbers its boxes box-1, box-2, ... in output order
+        self.ids = [f"box-{i}" for i in range(1, n + 1)] if ids is None else list(ids)
+
+    @classmethod
+    def empty(cls) -> "BoxArray":
+        return cls(np.zeros((0, 4), dtype=np.int32))
+
+    @classmethod
+    def from_boxes(cls, boxes: Iterable[Union[Box, Dict[str, Any]]]) -> "BoxArray":
+        rows = [b if isinstance(b, dict) else b.__dict__ for b in boxes]
+        return cls(
+            np.array([[r["x"], r["y"], r["w"], r["h"]] for r in rows], dtype=np.int32).reshape(-1, 4),
+            np.array([r.get("confidence", 1.0) for r in rows], dtype=np.float64),
+            [r.get("label", "box") for r in rows],
+            [r["id"] for r in rows],
+        )
+
+    def __len__(self) -> int:
+        return len(self.xywh)
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.xywh[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.xywh[:, 1]
+
+    @property
+    def w(self) -> np.ndarray:
+        return self.xywh[:, 2]
+
+    @property
+    def h(self) -> np.ndarray:
+        return self.xywh[:, 3]
+
+    def take(self, index: Sequence[int]) -> "BoxArray":
+        index = np.asarray(index, dtype=np.intp)
+        return BoxArray(self.xywh[index], self.confidence[index],
+                        [self.labels[i] for i in index], [self.ids[i] for i in index])
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Plain dicts in the Box schema, built from whole columns at once."""
+        keys = ("id", "x", "y", "w", "h", "label", "confidence")
+        x, y, w, h = self.xywh.T.tolist() if len(self) else ([], [], [], [])
+        return [dict(zip(keys, row)) for row in zip(self.ids, x, y, w, h, self.labels, self.confidence.tolist())]
+
+    def to_models(self) -> List[Box]:
+        # The columns are already typed, so skip per-field validation
+        return [Box.model_construct(**row) for row in self.to_dicts()]
+
+
+def nms(xywh: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5,
+        contain_threshold: Optional[float] = None) -> np.ndarray:
+    """Greedy IoU non-max suppression; returns kept indices, best score first.
+
+    With `contain_threshold`, a box is also dropped when that share of its own
+    area lies inside an already kept box (small hits nested in a big one).
+    """
+    if len(xywh) == 0:
+        return np.zeros(0, dtype=np.int64)
+    x1 = xywh[:, 0].astype(np.float64)
+    y1 = xywh[:, 1].astype(np.float64)
+    x2 = x1 + xywh[:, 2]
+    y2 = y1 + xywh[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iw = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        ih = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = iw * ih
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        suppressed = iou > iou_threshold
+        if contain_threshold is not None:
+            suppressed |= inter / np.maximum(areas[rest], 1e-9) > contain_threshold
+        order = rest[~suppressed]
+    return np.asarray(keep, dtype=np.int64)
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+
+from telemetry import log_error, span
+
+# Idle sessions are dropped after this many seconds, and the oldest beyond CHAT_SESSION_MAX
+CHAT_SESSION_TTL = float(os.getenv("CHAT_SESSION_TTL", "3600"))
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "256"))
+# Messages sent verbatim on every turn; older ones are folded into the rolling summary
+CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "8"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+# Shortest prefix the API will cache: 2048 tokens for the Haiku models, 1024 for Sonnet and Opus.
+# A breakpoint on a shorter prefix is silently ignored, so none is set there.
+CHAT_CACHE_MIN_TOKENS = int(os.getenv("CHAT_CACHE_MIN_TOKENS", "2048"))
+
+SUMMARY_PROMPT = """You keep the running summary of a conversation between a warehouse worker and Logithon, a cargo loading assistant.
+Merge the new turns into the summary so far. Keep box counts, dimensions, the vehicle, the route, decisions and open questions; drop greetings and filler.
+Answer with the summary only, in at most 150 words."""
+
+_EPHEMERAL = {"type": "ephemeral"}
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def _blocks(content: Any) -> List[Dict[str, Any]]:
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return [dict(block) for block in content]
+
+
+def _sizes(boxes: List[Dict[str, Any]]) -> str:
+    counts = Counter((str(b.get("w")), str(b.get("h"))) for b in boxes)
+    return ", ".join(f"{n}x {w}x{h}" for (w, h), n in counts.most_common(8))
+
+
+def context_block(context: Optional[Dict[str, Any]]) -> str:
+    """The client's boxes, plan and detections as a few compact lines instead of raw JSON."""
+    if not context:
+        return ""
+    lines = []
+    for key, value in context.items():
+        if value in (None, "", [], {}):
+            continue
+        # Anything but a list of objects is passed through as JSON below
+        boxes = isinstance(value, list) and all(isinstance(b, dict) for b in value)
+        if key == "boxes" and boxes:
+            lines.append(f"grid boxes: {len(value)} ({_sizes(value)})")
+        elif key == "pixelBoxes" and boxes:
+            confidences = [b["confidence"] for b in value if isinstance(b.get("confidence"), (int, float))]
+            labels = Counter(str(b.get("label", "box")) for b in value)
+            mean = f", mean confidence {sum(confidences) / len(confidences):.2f}" if confidences else ""
+            lines.append(f"detections: {len(value)} ({', '.join(f'{n} {l}' for l, n in labels.most_common(5))}{mean})")
+        elif key == "imageSize" and isinstance(value, dict):
+            lines.append(f"image: {value.get('w')}x{value.get('h')} px")
+        else:
+            text = value if isinstance(value, str) else json.dumps(value, separators=(",", ":"))
+            lines.append(f"{key}: {text[:200]}")
+    if not lines:
+        return ""
+    return "<load_context>\n" + "\n".join(lines) + "\n</load_context>"
+
+
+def estimate_tokens(text: str) -> int:
+    # About four characters per token for English; only used to decide where caching can pay off
+    return len(text) // 4
+
+
+def build_request(system_prompt: str, messages: List[Dict[str, Any]], summary: str = "",
+                  context: Optional[Dict[str, Any]] = None,
+                  min_cache_tokens: int = CHAT_CACHE_MIN_TOKENS) -> Dict[str, Any]:
+    """`system` and `messages` for messages.create, ordered so the unchanging prefix is cached.
+
+    Cache breakpoints go after the static system prompt, after the rolling
+    summary and on the last message before the new turn, but only where the
+    prefix up to that point reaches `min_cache_tokens`. Below that the API
+    caches nothing, so with the short default prompt the first breakpoint
+    usually lands on the history once a session has grown. The context
+    changes every turn, so it rides on the newest user message rather than
+    invalidating the cached prefix.
+    """
+    prefix = estimate_tokens(system_prompt)
+    system: List[Dict[str, Any]] = [{"type": "text", "text": system_prompt}]
+    if prefix >= min_cache_tokens:
+        system[0]["cache_control"] = _EPHEMERAL
+    if summary:
+        text = f"Summary of the earlier conversation:\n{summary}"
+        prefix += estimate_tokens(text)
+        system.append({"type": "text", "text": text})
+        if prefix >= min_cache_tokens:
+            system[-1]["cache_control"] = _EPHEMERAL
+    messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+    block = context_block(context)
+    if block and messages and messages[-1]["role"] == "user":
+        messages[-1]["content"] = [{"type": "text", "text": block}] + _blocks(messages[-1]["content"])
+    if len(messages) >= 3:
+        prefix += sum(estimate_tokens(_text(m["content"])) for m in messages[:-1])
+        if prefix >= min_cache_tokens:
+            blocks = _blocks(messages[-2]["content"])
+            blocks[-1]["cache_control"] = _EPHEMERAL
+            messages[-2]["content"] = blocks
+    return {"system": system, "messages": messages}
+
+
+class ChatSession:
+    """Conversation kept on the server: a rolling summary plus the most recent messages.
+
+    Clients send only their new messages. Once the history grows past
+    CHAT_RECENT_MESSAGES, the oldest turns are summarized in the background
+    after the reply has gone out, so the prompt stays about the same size
+    however long the shift runs.
+
+    A turn holds `lock` from the moment it adds its messages until it records
+    the reply or discards them, and the summarizer takes it before trimming
+    the history, so a trim never shifts the messages under a running turn.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.summary = ""
+        self.messages: List[Dict[str, Any]] = []
+        self.context: Optional[Dict[str, Any]] = None
+        self.turns = 0
+        self.touched = time.time()
+        self.lock = asyncio.Lock()
+        self._summarizing: Optional[asyncio.Task] = None
+
+    def add(self, messages: List[Dict[str, Any]], context: Optional[Dict[str, Any]]):
+        self.messages.extend({"role": m.get("role", "user"), "content": m.get("content", "")} for m in messages)
+        if context is not None:
+            self.context = context
+
+    def discard_since(self, mark: int):
+        """Drop messages added after `mark`, e.g. the turn of a failed request. Call with `lock` held."""
+        del self.messages[mark:]
+
+    def add_reply(self, text: str):
+        self.messages.append({"role": "assistant", "content": text})
+        self.turns += 1
+
+    def request(self, system_prompt: str) -> Dict[str, Any]:
+        return build_request(system_prompt, self.messages, self.summary, self.context)
+
+    def compact(self, client, model: str):
+        """Start folding messages beyond the recent window into the summary, if not already running."""
+        overflow = len(self.messages) - CHAT_RECENT_MESSAGES
+        if overflow <= 0 or client is None or (self._summarizing is not None and not self._summarizing.done()):
+            return
+        # Cut before a user message so the kept history still starts with the user
+        cut = next((i for i in range(overflow, len(self.messages)) if self.messages[i]["role"] == "user"), None)
+        if cut:
+            transcript = "\n".join(f"{m['role']}: {_text(m['content'])}" for m in self.messages[:cut])
+            self._summarizing = asyncio.create_task(self._summarize(client, model, cut, transcript))
+
+    async def _summarize(self, client, model: str, cut: int, transcript: str):
+        try:
+            with span("chat_summary"):
+                response = await client.messages.create(
+                    model=model,
+                    max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+                    system=SUMMARY_PROMPT,
+                    messages=[{"role": "user", "content": f"Summary so far:\n{self.summary or '(none)'}\n\nNew turns:\n{transcript}"}],
+                )
+        except Exception as e:
+            log_error("chat_summary_error", session_id=self.session_id, error=str(e))
+            return
+        # Turns only append or discard their own messages, which all come after `cut`; waiting
+        # for the lock means no turn is between taking its mark and discarding
+        async with self.lock:
+            self.summary = response.content[0].text.strip()
+            del self.messages[:cut]
+
+
+class ChatSessionStore:
+    """In-memory chat sessions, evicted by idle time and count like the plan sessions."""
+
+    def __init__(self, ttl_seconds: float = CHAT_SESSION_TTL, max_sessions: int = CHAT_SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    def create(self) -> ChatSession:
+        self.cleanup()
+        session = ChatSession(uuid.uuid4().hex)
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.touched > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        session.touched = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def cleanup(self):
+        cutoff = time.time() - self.ttl_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.touched < cutoff]:
+            del self._sessions[session_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+chat_sessions = ChatSessionStore()
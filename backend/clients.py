@@ -0,0 +1,61 @@
+import os
+from typing import Optional
+
+from startup import lazy_import
+
+# The SDKs take most of the app's import time, so they load with the first client that needs them
+anthropic = lazy_import("anthropic")
+elevenlabs = lazy_import("elevenlabs")
+httpx = lazy_import("httpx")
+
+# Environment variables for external services (the Anthropic SDK also honours ANTHROPIC_BASE_URL)
+ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
+ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL")
+
+# Upper bound on concurrent upstream connections shared by all requests in a worker
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+_http_client: Optional["httpx.AsyncClient"] = None
+_anthropic_client: Optional["anthropic.AsyncAnthropic"] = None
+_elevenlabs_client: Optional["elevenlabs.AsyncElevenLabs"] = None
+
+
+def http_client() -> "httpx.AsyncClient":
+    """One pooled HTTP client per worker, reused by every ElevenLabs call."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+        )
+    return _http_client
+
+
+def anthropic_client() -> Optional["anthropic.AsyncAnthropic"]:
+    # The SDK keeps its own connection pool (and its own httpx build), so the
+    # client itself is what gets shared across requests
+    global _anthropic_client
+    if _anthropic_client is None and ANTHROPIC_API_KEY:
+        _anthropic_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY, timeout=HTTP_TIMEOUT)
+    return _anthropic_client
+
+
+def elevenlabs_client() -> Optional["elevenlabs.AsyncElevenLabs"]:
+    global _elevenlabs_client
+    if _elevenlabs_client is None and ELEVENLABS_API_KEY:
+        kwargs = {"base_url": ELEVENLABS_BASE_URL} if ELEVENLABS_BASE_URL else {}
+        _elevenlabs_client = elevenlabs.AsyncElevenLabs(api_key=ELEVENLABS_API_KEY, httpx_client=http_client(), **kwargs)
+    return _elevenlabs_client
+
+
+async def close_clients():
+    global _http_client, _anthropic_client, _elevenlabs_client
+    if _anthropic_client is not None:
+        await _anthropic_client.close()
+    if _http_client is not None:
+        await _http_client.aclose()
+    _http_client = None
+    _anthropic_client = None
+    _elevenlabs_client = None
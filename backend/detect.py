@@ -1,138 +1,237 @@
 import io
-from typing import List
+import os
+import time
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-import cv2
-from PIL import Image
-from pydantic import BaseModel
 
-try:
-    from ultralytics import YOLO
-except Exception:
-    YOLO = None
+from boxes import BoxArray, nms
+from model_registry import registry
+from startup import lazy_import
+from telemetry import observe, span
 
+# Decoders load on the first image, so workers that never detect don't pay for them
+cv2 = lazy_import("cv2")
+Image = lazy_import("PIL.Image")
 
-class BoxModel(BaseModel):
-    id: str
-    x: int
-    y: int
-    w: int
-    h: int
-    label: str = "box"
-    confidence: float = 1.0
+# Images per YOLO call for batched detection
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "8"))
+# Longer image side used for detection; uploads are decoded/resized down to it (0 = full size)
+DETECT_WORKING_SIZE = int(os.getenv("DETECT_WORKING_SIZE", "1280"))
+# Threads used to decode uploads of a batch in parallel (PIL releases the GIL while decoding)
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(min(8, os.cpu_count() or 1))))
+# IoU above which two fallback candidates are treated as the same box
+NMS_IOU = float(os.getenv("NMS_IOU", "0.5"))
+# Share of a candidate's area inside a better box above which it is dropped as a fragment
+NMS_CONTAIN = float(os.getenv("NMS_CONTAIN", "0.6"))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
 
+_decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
 
-def _opencv_rect_detect(image_np: np.ndarray) -> List[BoxModel]:
-    # Convert to grayscale
+
+def _opencv_rect_detect(image_np: np.ndarray) -> BoxArray:
+    # Convert to grayscale once; every pass below works on it
     gray = cv2.cvtColor(image_np, cv2.COLOR_BGR2GRAY)
-    
-    # Apply multiple detection methods for better box detection
-    boxes: List[BoxModel] = []
-    idx = 1
-    
-    # Method 1: Edge detection with multiple thresholds
+
+    # Candidates are gathered as arrays and de-duplicated together at the end
+    rects: List[np.ndarray] = []
+    confidences: List[np.ndarray] = []
+    # Tie-break within a confidence level: larger contours, stronger template matches
+    strengths: List[np.ndarray] = []
+
+    # Method 1: Edge detection with multiple thresholds.
+    # The Sobel derivatives Canny needs are the same for every threshold, so compute them once.
+    dx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3)
+    dy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3)
     for low_thresh, high_thresh in [(30, 100), (50, 150), (80, 200)]:
-        edges = cv2.Canny(gray, low_thresh, high_thresh)
+        edges = cv2.Canny(dx, dy, low_thresh, high_thresh)
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        for cnt in contours:
-            x, y, w, h = cv2.boundingRect(cnt)
-            # More lenient size filtering - accept smaller boxes
-            if w * h < 200 or w < 10 or h < 10:  # Filter very tiny noise
-                continue
-            # Check if this box overlaps significantly with existing boxes
-            overlap = False
-            for existing_box in boxes:
-                if (abs(x - existing_box.x) < 20 and abs(y - existing_box.y) < 20 and 
-                    abs(w - existing_box.w) < 20 and abs(h - existing_box.h) < 20):
-                    overlap = True
-                    break
-            if not overlap:
-                boxes.append(BoxModel(id=f"box-{idx}", x=int(x), y=int(y), w=int(w), h=int(h), confidence=0.6))
-                idx += 1
-    
+        if not contours:
+            continue
+        found = np.array([cv2.boundingRect(cnt) for cnt in contours], dtype=np.int32)
+        w, h = found[:, 2], found[:, 3]
+        # More lenient size filtering - accept smaller boxes, drop very tiny noise
+        found = found[(w * h >= 200) & (w >= 10) & (h >= 10)]
+        rects.append(found)
+        confidences.append(np.full(len(found), 0.6))
+        strengths.append((found[:, 2] * found[:, 3]).astype(np.float64))
+
     # Method 2: Template matching for rectangular shapes
-    # Create a simple rectangular template
     template_sizes = [(30, 30), (50, 50), (80, 80)]
     for tw, th in template_sizes:
+        if gray.shape[0] < th or gray.shape[1] < tw:
+            continue
         template = np.ones((th, tw), dtype=np.uint8) * 255
         template = cv2.rectangle(template, (2, 2), (tw-3, th-3), 0, 2)
-        
+
         result = cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
-        locations = np.where(result >= 0.3)  # Lower threshold for more detections
-        
-        for pt in zip(*locations[::-1]):
-            x, y = pt
-            w, h = tw, th
-            # Check for overlaps
-            overlap = False
-            for existing_box in boxes:
-                if (abs(x - existing_box.x) < 30 and abs(y - existing_box.y) < 30):
-                    overlap = True
-                    break
-            if not overlap:
-                boxes.append(BoxModel(id=f"box-{idx}", x=int(x), y=int(y), w=int(w), h=int(h), confidence=0.4))
-                idx += 1
-    
-    return boxes
+        # Only local maxima above the (lenient) threshold; a single rectangle otherwise
+        # produces a dense cluster of neighbouring hits
+        peaks = (result >= 0.3) & (result >= cv2.dilate(result, np.ones((th, tw), np.uint8)))
+        ys, xs = np.nonzero(peaks)
+        found = np.stack([xs, ys, np.full(len(xs), tw), np.full(len(xs), th)], axis=1).astype(np.int32)
+        rects.append(found)
+        confidences.append(np.full(len(found), 0.4))
+        strengths.append(result[ys, xs].astype(np.float64))
 
+    if not rects:
+        return BoxArray.empty()
+    xywh = np.concatenate(rects)
+    confidence = np.concatenate(confidences)
+    strength = np.concatenate(strengths)
+    if len(xywh) == 0:
+        return BoxArray.empty()
 
-def detect_boxes(image_bytes: bytes):
-    # Load image into numpy
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    image_np = np.array(image)[:, :, ::-1]  # Convert RGB to BGR for OpenCV
-    image_h, image_w = image_np.shape[:2]
-
-    boxes: List[BoxModel] = []
-
-    if YOLO:
-        try:
-            # Use a lightweight YOLOv8n model
-            model = YOLO("yolov8n.pt")
-            results = model.predict(source=image_np, verbose=False)
-            idx = 1
-            for r in results:
-                for b in r.boxes:
-                    x1, y1, x2, y2 = b.xyxy[0].tolist()
-                    w = int(x2 - x1)
-                    h = int(y2 - y1)
-                    x = int(x1)
-                    y = int(y1)
-                    conf = float(b.conf[0].item()) if hasattr(b, "conf") else 0.5
-                    cls = int(b.cls[0].item()) if hasattr(b, "cls") else -1
-                    label = "box"
-                    # Map YOLO classes to box/package labels
-                    # Common classes: 0=person, 24=backpack, 26=handbag, 28=suitcase, 
-                    # 56=chair, 57=couch, 58=potted plant, 59=bed, 60=dining table, 
-                    # 61=toilet, 62=tv, 63=laptop, 64=mouse, 65=remote, 66=keyboard, 
-                    # 67=cell phone, 68=microwave, 69=oven, 70=toaster, 71=sink, 
-                    # 72=refrigerator, 73=book, 74=clock, 75=vase, 76=scissors, 
-                    # 77=teddy bear, 78=hair drier, 79=toothbrush
-                    
-                    # Accept more object types as potential boxes/packages
-                    package_classes = {24: "backpack", 26: "handbag", 28: "suitcase", 
-                                     73: "book", 75: "vase", 77: "teddy_bear"}
-                    
-                    # Also accept rectangular objects that could be boxes
-                    rectangular_classes = {56: "chair", 60: "dining_table", 62: "tv", 
-                                         63: "laptop", 68: "microwave", 69: "oven", 
-                                         70: "toaster", 72: "refrigerator"}
-                    
-                    if cls in package_classes:
-                        label = package_classes[cls]
-                    elif cls in rectangular_classes:
-                        label = f"box_{rectangular_classes[cls]}"
-                    else:
-                        # For any other detected object, treat as potential box
-                        label = f"object_{cls}"
-                    boxes.append(BoxModel(id=f"box-{idx}", x=x, y=y, w=w, h=h, label=label, confidence=conf))
-                    idx += 1
-        except Exception:
-            boxes = _opencv_rect_detect(image_np)
-    else:
-        boxes = _opencv_rect_detect(image_np)
+    # Rank by confidence, then strength, and keep the survivors in their original candidate order
+    rank = np.empty(len(xywh))
+    rank[np.lexsort((strength, confidence))] = np.arange(len(xywh))
+    keep = np.sort(nms(xywh, rank, NMS_IOU, contain_threshold=NMS_CONTAIN))
+
+    return BoxArray(xywh[keep], confidence[keep])
+
+
+class Frame:
+    """A decoded image at working resolution plus what is needed to map results back."""
+
+    __slots__ = ("image", "original_width", "original_height", "stats")
+
+    def __init__(self, image: np.ndarray, original_width: int, original_height: int, stats: Dict[str, float]):
+        self.image = image
+        self.original_width = original_width
+        self.original_height = original_height
+        self.stats = stats
+
+
+def preprocess(image_bytes: bytes, working_size: int = DETECT_WORKING_SIZE) -> Frame:
+    """Decode straight to (roughly) the working size and convert to BGR once.
+
+    JPEGs are decoded with PIL's draft mode, which scales by 1/2, 1/4 or 1/8
+    inside the DCT so the full-resolution bitmap is never materialised; the
+    remainder is a single resize. `working_size` caps the longer side, 0 keeps
+    the original resolution.
+    """
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    orig_w, orig_h = image.size
+    scale = 1.0
+    if working_size and max(orig_w, orig_h) > working_size:
+        scale = working_size / max(orig_w, orig_h)
+        target = (max(1, round(orig_w * scale)), max(1, round(orig_h * scale)))
+        image.draft("RGB", target)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image_np = np.asarray(image)
+    if scale < 1.0 and image_np.shape[1::-1] != target:
+        # draft() already did any 2x/4x/8x step, so what is left is a factor above 1/2
+        image_np = cv2.resize(image_np, target, interpolation=cv2.INTER_LINEAR)
+    # One contiguous copy at working size, instead of a full-size array plus a reversed-channel view
+    image_np = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+    work_h, work_w = image_np.shape[:2]
+
+    # The previous path held a full-size RGB array and a full-size BGR copy
+    full_bytes = orig_w * orig_h * 3 * 2
+    work_bytes = work_w * work_h * 3 * 2
+    stats = {
+        "decode_ms": round((time.perf_counter() - start) * 1000, 2),
+        "working_width": work_w,
+        "working_height": work_h,
+        "bytes_saved": full_bytes - work_bytes,
+        "memory_ratio": round(work_bytes / full_bytes, 4) if full_bytes else 1.0,
+    }
+    return Frame(image_np, orig_w, orig_h, stats)
+
+
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    """Full-resolution BGR array."""
+    return preprocess(image_bytes, working_size=0).image
 
+
+def unpack_archive(data: bytes) -> List[Tuple[str, bytes]]:
+    """Image members of a zip or tar(.gz) upload, in archive order."""
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            return [(info.filename, zf.read(info)) for info in zf.infolist()
+                    if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tf:
+        return [(member.name, tf.extractfile(member).read()) for member in tf.getmembers()
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def detect_images(images: List[np.ndarray], batch_size: int = DETECT_BATCH_SIZE) -> List[BoxArray]:
+    """Detect boxes on decoded BGR images, running YOLO in batches of `batch_size`."""
+    per_image: List[Optional[BoxArray]] = [None] * len(images)
+
+    model = registry.get()
+    if model is not None:
+        for start in range(0, len(images), max(1, batch_size)):
+            chunk = images[start:start + max(1, batch_size)]
+            try:
+                # Shared, already warmed-up YOLOv8n instance; one call per batch
+                with span("inference"):
+                    results = registry.predict(chunk)
+                per_image[start:start + len(results)] = results
+            except Exception:
+                pass
+
+    # Anything YOLO could not handle goes through the OpenCV fallback
+    for i, boxes in enumerate(per_image):
+        if boxes is None:
+            with span("fallback_detection"):
+                per_image[i] = _opencv_rect_detect(images[i])
+    return per_image
+
+
+def _to_original(boxes: BoxArray, frame: Frame) -> dict:
+    """Map working-resolution boxes back to original pixel coordinates and build the result dict."""
+    work_h, work_w = frame.image.shape[:2]
+    sx = frame.original_width / work_w
+    sy = frame.original_height / work_h
+    if (sx != 1.0 or sy != 1.0) and len(boxes):
+        xywh = boxes.xywh.astype(np.float64)
+        x2 = np.minimum(frame.original_width, np.round((xywh[:, 0] + xywh[:, 2]) * sx))
+        y2 = np.minimum(frame.original_height, np.round((xywh[:, 1] + xywh[:, 3]) * sy))
+        x = np.round(xywh[:, 0] * sx)
+        y = np.round(xywh[:, 1] * sy)
+        boxes.xywh = np.stack([x, y, x2 - x, y2 - y], axis=1).astype(np.int32)
     return {
-        "boxes": [b.dict() for b in boxes],
-        "image_width": int(image_w),
-        "image_height": int(image_h),
+        "boxes": boxes.to_dicts(),
+        "image_width": frame.original_width,
+        "image_height": frame.original_height,
+        "preprocess": frame.stats,
     }
+
+
+def _try_preprocess(image_bytes: bytes, working_size: int = DETECT_WORKING_SIZE) -> Optional[Frame]:
+    try:
+        return preprocess(image_bytes, working_size)
+    except Exception:
+        return None
+
+
+def detect_blobs(blobs: List[bytes], batch_size: int = DETECT_BATCH_SIZE,
+                 working_size: int = DETECT_WORKING_SIZE) -> List[Optional[dict]]:
+    """Decode and detect encoded images; undecodable ones come back as None.
+
+    Takes raw bytes so it can run in a worker process without pickling pixel arrays.
+    """
+    frames = list(_decode_pool.map(_try_preprocess, blobs, [working_size] * len(blobs)))
+    valid = [frame for frame in frames if frame is not None]
+    # Decoding ran on the decode threads; record it here so it lands in this job's spans
+    for frame in valid:
+        observe("decode", frame.stats["decode_ms"] / 1000)
+    results = iter([_to_original(boxes, frame)
+                    for boxes, frame in zip(detect_images([f.image for f in valid], batch_size), valid)])
+    return [next(results) if frame is not None else None for frame in frames]
+
+
+def warm():
+    """Load the decoders and run the OpenCV path once, so the first upload pays no import or first-call cost."""
+    blank = np.full((64, 64, 3), 200, dtype=np.uint8)
+    _, png = cv2.imencode(".png", blank)
+    _opencv_rect_detect(preprocess(png.tobytes()).image)
+
+
+def detect_boxes(image_bytes: bytes):
+    return detect_blobs([image_bytes])[0]
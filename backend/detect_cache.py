@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from detect import DETECT_WORKING_SIZE, NMS_CONTAIN, NMS_IOU
+from detectors import DETECT_CONF, DETECT_IOU, DETECT_MAX_DET
+from model_registry import DEFAULT_WEIGHTS, weights_fingerprint
+from telemetry import log
+
+# Results kept in memory; 0 disables the cache
+DETECT_CACHE_SIZE = int(os.getenv("DETECT_CACHE_SIZE", "256"))
+# Optional second tier on disk, shared by workers on the same host
+DETECT_CACHE_DIR = os.getenv("DETECT_CACHE_DIR")
+# Files kept in the disk tier; the least recently used (by mtime) are removed past this
+DETECT_CACHE_DISK_ENTRIES = int(os.getenv("DETECT_CACHE_DISK_ENTRIES", "10000"))
+# Bump when detection code changes in a way that alters results
+DETECTOR_VERSION = "2"
+
+
+class DetectionCache:
+    """LRU of DetectResponse dicts keyed by image content and detector configuration.
+
+    The key mixes the image hash with the detector version, thresholds and a
+    fingerprint of the weights file, so replacing the weights (or changing
+    NMS/working-size settings) naturally misses instead of serving stale boxes.
+
+    The disk tier may be shared by several processes. Reads refresh a file's
+    mtime, and once the directory holds more than `max_disk_entries` files the
+    oldest by mtime are removed. Disk errors only skip the cache.
+    """
+
+    def __init__(self, max_entries: int = DETECT_CACHE_SIZE, directory: Optional[str] = DETECT_CACHE_DIR,
+                 max_disk_entries: int = DETECT_CACHE_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        self.disk_errors = 0
+        # Approximate, since other processes write to the same directory; _prune recounts
+        self._disk_files = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_files = len(self._disk_entries())
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def config_tag(self) -> str:
+        return "|".join([
+            DETECTOR_VERSION,
+            weights_fingerprint(DEFAULT_WEIGHTS),
+            f"ws={DETECT_WORKING_SIZE}",
+            # The model's own thresholds, then the merge applied on top of its boxes
+            f"conf={DETECT_CONF}",
+            f"model_iou={DETECT_IOU}",
+            f"max_det={DETECT_MAX_DET}",
+            f"iou={NMS_IOU}",
+            f"contain={NMS_CONTAIN}",
+        ])
+
+    def key(self, image_bytes: bytes) -> str:
+        digest = hashlib.blake2b(image_bytes, digest_size=16)
+        digest.update(self.config_tag().encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+        result = self._read_disk(key)
+        if result is not None:
+            self.disk_hits += 1
+            self._remember(key, result)
+            return result
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        self._remember(key, result)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, result)
+
+    def _write_disk(self, key: str, result: Dict[str, Any]):
+        # Unique per writer, so workers caching the same image don't replace each other's temp file
+        tmp = os.path.join(self.directory, f"{key}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp, os.path.join(self.directory, f"{key}.json"))
+        except OSError as e:
+            self.disk_errors += 1
+            log("detect_cache_write_failed", logging.WARNING, error=str(e))
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._disk_files += 1
+            full = self._disk_files > self.max_disk_entries
+        if full:
+            self._prune()
+
+    def _disk_entries(self) -> List[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as it:
+                return [entry for entry in it if entry.name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _prune(self):
+        """Drop the least recently used files, leaving headroom so this doesn't run on every write."""
+        entries = []
+        for entry in self._disk_entries():
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                pass
+        keep = int(self.max_disk_entries * 0.9)
+        entries.sort()
+        removed = 0
+        for _, path in entries[:max(0, len(entries) - keep)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.disk_evictions += removed
+            self._disk_files = len(entries) - removed
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        path = os.path.join(self.directory, f"{key}.json")
+        try:
+            with open(path) as f:
+                result = json.load(f)
+            # Mark as recently used for _prune
+            os.utime(path)
+            return result
+        except (OSError, ValueError):
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "disk": bool(self.directory),
+            "disk_files": self._disk_files,
+            "disk_evictions": self.disk_evictions,
+            "disk_errors": self.disk_errors,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+detect_cache = DetectionCache()
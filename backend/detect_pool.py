@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional, Tuple
+
+from telemetry import captured, replay
+
+# Worker processes for detection; 0 keeps inference in this process on DETECT_THREADS threads
+DETECT_WORKERS = int(os.getenv("DETECT_WORKERS", "0"))
+DETECT_THREADS = int(os.getenv("DETECT_THREADS", "2"))
+# Requests admitted at once (queued + running); anything beyond gets a 429
+DETECT_MAX_QUEUE = int(os.getenv("DETECT_MAX_QUEUE", "32"))
+# Seconds a request may wait for its result before giving up with a 504
+DETECT_TIMEOUT = float(os.getenv("DETECT_TIMEOUT", "30"))
+# "spawn" avoids forking a process that already runs the event loop and client threads
+DETECT_START_METHOD = os.getenv("DETECT_START_METHOD", "spawn")
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+def _init_worker():
+    # Each worker process holds its own resident, warmed-up model
+    from model_registry import registry
+    registry.load()
+
+
+def _noop():
+    return None
+
+
+def _timed(fn: Callable, *args) -> Tuple[float, float, Any, List[Tuple[str, float]]]:
+    # time.monotonic is system-wide on Linux, so stamps compare across processes
+    started = time.monotonic()
+    result, spans = captured(fn, *args)
+    return started, time.monotonic(), result, spans
+
+
+class DetectionPool:
+    """Runs detection jobs off the event loop with bounded admission.
+
+    Callers take a slot() per request, which fails fast with PoolSaturated
+    once DETECT_MAX_QUEUE requests are in flight, then await run(), which
+    returns (started, finished, result) so queue wait and execution time can
+    be reported separately.
+    """
+
+    def __init__(self, workers: int = DETECT_WORKERS, max_queue: int = DETECT_MAX_QUEUE,
+                 timeout: float = DETECT_TIMEOUT):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(DETECT_START_METHOD),
+                initializer=_init_worker,
+            )
+            # Start every worker now so the first requests don't pay for spawning and model loading
+            for _ in range(self.workers):
+                self._executor.submit(_noop)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, DETECT_THREADS), thread_name_prefix="detect")
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+        self._executor = None
+
+    @contextmanager
+    def slot(self):
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            raise PoolSaturated(f"Detection queue is full ({self.max_queue} requests in flight)")
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn: Callable, *args) -> Tuple[float, float, Any]:
+        if self._executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            started, finished, result, spans = await loop.run_in_executor(self._executor, _timed, fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); replace the pool so later requests can succeed
+            self.shutdown(wait=False)
+            self.start()
+            raise
+        # Stage timings from the worker count towards this process's metrics and the current request
+        replay(spans)
+        return started, finished, result
+
+    async def wait(self, awaitable):
+        """Await a job with the per-request timeout; the job itself keeps running to completion."""
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise
+
+    def stats(self):
+        return {
+            "mode": "process" if self.workers > 0 else "thread",
+            "workers": self.workers if self.workers > 0 else max(1, DETECT_THREADS),
+            "in_flight": self.in_flight,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+pool = DetectionPool()
@@ -0,0 +1,237 @@
+import importlib.util
+import os
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from boxes import BoxArray, nms
+from startup import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Detection backend: ultralytics (PyTorch), onnx (ONNX Runtime), or auto (onnx when its weights are present)
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "auto")
+# ONNX Runtime execution providers in order of preference, e.g. OpenVINOExecutionProvider,CPUExecutionProvider
+ONNX_PROVIDERS = [p.strip() for p in os.getenv("ONNX_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+# Intra-op threads per inference session; 0 lets ONNX Runtime use every core
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+# Input side for models exported with a dynamic shape
+ONNX_INPUT_SIZE = int(os.getenv("ONNX_INPUT_SIZE", "640"))
+# Same defaults as ultralytics' predict(), so both backends report the same boxes
+DETECT_CONF = float(os.getenv("DETECT_CONF", "0.25"))
+DETECT_IOU = float(os.getenv("DETECT_IOU", "0.7"))
+DETECT_MAX_DET = int(os.getenv("DETECT_MAX_DET", "300"))
+
+# Map YOLO classes to box/package labels
+# Common classes: 0=person, 24=backpack, 26=handbag, 28=suitcase,
+# 56=chair, 57=couch, 58=potted plant, 59=bed, 60=dining table,
+# 61=toilet, 62=tv, 63=laptop, 64=mouse, 65=remote, 66=keyboard,
+# 67=cell phone, 68=microwave, 69=oven, 70=toaster, 71=sink,
+# 72=refrigerator, 73=book, 74=clock, 75=vase, 76=scissors,
+# 77=teddy bear, 78=hair drier, 79=toothbrush
+
+# Accept more object types as potential boxes/packages
+PACKAGE_CLASSES = {24: "backpack", 26: "handbag", 28: "suitcase",
+                   73: "book", 75: "vase", 77: "teddy_bear"}
+
+# Also accept rectangular objects that could be boxes
+RECTANGULAR_CLASSES = {56: "chair", 60: "dining_table", 62: "tv",
+                       63: "laptop", 68: "microwave", 69: "oven",
+                       70: "toaster", 72: "refrigerator"}
+
+
+def yolo_label(cls: int) -> str:
+    if cls in PACKAGE_CLASSES:
+        return PACKAGE_CLASSES[cls]
+    if cls in RECTANGULAR_CLASSES:
+        return f"box_{RECTANGULAR_CLASSES[cls]}"
+    # For any other detected object, treat as potential box
+    return f"object_{cls}"
+
+
+class Detector:
+    """A detection backend: loads one set of weights and turns BGR images into boxes.
+
+    Implementations keep their heavy imports inside load(), so choosing one
+    backend never pays for importing the other.
+    """
+
+    name = ""
+    # Module that must be importable for the backend to work
+    module = ""
+    default_weights = ""
+    # Whether predict() may run on several threads at once
+    thread_safe = False
+
+    def __init__(self, weights: str):
+        self.weights = weights
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    def load(self):
+        raise NotImplementedError
+
+    def predict(self, images: List[np.ndarray]) -> List[BoxArray]:
+        """Boxes in each image's own pixel coordinates, one BoxArray per image."""
+        raise NotImplementedError
+
+    def info(self) -> Dict[str, object]:
+        return {"backend": self.name, "weights": self.weights}
+
+
+def _ultralytics_boxes(result) -> BoxArray:
+    n = len(result.boxes)
+    if not n:
+        return BoxArray.empty()
+    # Whole tensors to NumPy once instead of .item() per box
+    x1, y1, x2, y2 = result.boxes.xyxy.cpu().numpy().astype(np.float64).T
+    xywh = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1).astype(np.int32)
+    conf = getattr(result.boxes, "conf", None)
+    confidence = conf.cpu().numpy().astype(np.float64) if conf is not None else np.full(n, 0.5)
+    cls = getattr(result.boxes, "cls", None)
+    classes = cls.cpu().numpy().astype(int).tolist() if cls is not None else [-1] * n
+    return BoxArray(xywh, confidence, [yolo_label(c) for c in classes])
+
+
+class UltralyticsDetector(Detector):
+    """YOLOv8 through ultralytics and PyTorch."""
+
+    name = "ultralytics"
+    module = "ultralytics"
+    default_weights = "yolov8n.pt"
+    # ultralytics predictors keep per-call state
+    thread_safe = False
+
+    def load(self):
+        from ultralytics import YOLO
+
+        self.model = YOLO(self.weights)
+
+    def predict(self, images: List[np.ndarray]) -> List[BoxArray]:
+        results = self.model.predict(source=images, conf=DETECT_CONF, iou=DETECT_IOU,
+                                     max_det=DETECT_MAX_DET, verbose=False)
+        return [_ultralytics_boxes(r) for r in results]
+
+
+def letterbox(image: np.ndarray, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """Scale to fit a size x size square and pad with grey, as YOLOv8 was trained.
+
+    Returns the padded image, the scale and the (left, top) padding needed to
+    map model coordinates back onto `image`.
+    """
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = max(1, round(h * scale)), max(1, round(w * scale))
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    canvas[top:top + nh, left:left + nw] = image if (nh, nw) == (h, w) else \
+        cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return canvas, scale, (left, top)
+
+
+def decode_yolov8(output: np.ndarray, scale: float, pad: Tuple[int, int], image_shape: Tuple[int, int],
+                  conf_threshold: float = DETECT_CONF, iou_threshold: float = DETECT_IOU,
+                  max_det: int = DETECT_MAX_DET) -> BoxArray:
+    """Boxes from one image's raw YOLOv8 head output, shape (4 + classes, anchors).
+
+    Rows 0-3 are the box centre and size in letterboxed input pixels, the rest
+    per-class scores (YOLOv8 has no separate objectness score).
+    """
+    pred = output.T if output.shape[0] < output.shape[1] else output
+    scores = pred[:, 4:]
+    classes = scores.argmax(axis=1)
+    confidence = scores[np.arange(len(pred)), classes]
+    keep = confidence >= conf_threshold
+    pred, classes, confidence = pred[keep], classes[keep], confidence[keep].astype(np.float64)
+    if not len(pred):
+        return BoxArray.empty()
+
+    h, w = image_shape
+    cx, cy, bw, bh = (pred[:, i].astype(np.float64) for i in range(4))
+    x1 = np.clip((cx - bw / 2 - pad[0]) / scale, 0, w)
+    y1 = np.clip((cy - bh / 2 - pad[1]) / scale, 0, h)
+    x2 = np.clip((cx + bw / 2 - pad[0]) / scale, 0, w)
+    y2 = np.clip((cy + bh / 2 - pad[1]) / scale, 0, h)
+    xywh = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+    # Per-class NMS in a single pass: shifting each class into its own region keeps classes from suppressing each other
+    shifted = xywh.copy()
+    shifted[:, :2] += classes[:, None] * (max(w, h) + 1)
+    keep = nms(shifted, confidence, iou_threshold)[:max_det]
+    return BoxArray(np.round(xywh[keep]), confidence[keep], [yolo_label(c) for c in classes[keep].tolist()])
+
+
+class OnnxDetector(Detector):
+    """YOLOv8 exported to ONNX, run with ONNX Runtime; pre- and post-processing in NumPy.
+
+    Works with FP32, FP16 and INT8-quantized exports (see export_detector.py).
+    OpenVINO is used when ONNX_PROVIDERS lists OpenVINOExecutionProvider and
+    the onnxruntime-openvino build is installed.
+    """
+
+    name = "onnx"
+    module = "onnxruntime"
+    default_weights = "yolov8n.onnx"
+    # InferenceSession.run is safe to call concurrently
+    thread_safe = True
+
+    def load(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS > 0:
+            options.intra_op_num_threads = ONNX_THREADS
+        installed = ort.get_available_providers()
+        providers = [p for p in ONNX_PROVIDERS if p in installed] or ["CPUExecutionProvider"]
+        self.session = ort.InferenceSession(self.weights, sess_options=options, providers=providers)
+        spec = self.session.get_inputs()[0]
+        self.input_name = spec.name
+        self.dtype = np.float16 if spec.type == "tensor(float16)" else np.float32
+        batch, _, height, _ = spec.shape
+        self.size = height if isinstance(height, int) else ONNX_INPUT_SIZE
+        # Exports without dynamic=True take a fixed batch (normally 1); 0 means any
+        self.max_batch = batch if isinstance(batch, int) else 0
+
+    def predict(self, images: List[np.ndarray]) -> List[BoxArray]:
+        results = []
+        step = self.max_batch or max(1, len(images))
+        for start in range(0, len(images), step):
+            chunk = images[start:start + step]
+            boxed = [letterbox(image, self.size) for image in chunk]
+            # BGR HWC uint8 -> RGB NCHW in [0, 1]
+            batch = np.stack([canvas for canvas, _, _ in boxed])[..., ::-1].transpose(0, 3, 1, 2)
+            batch = np.ascontiguousarray(batch, dtype=self.dtype) * self.dtype(1 / 255)
+            outputs = self.session.run(None, {self.input_name: batch})[0]
+            for (_, scale, pad), image, output in zip(boxed, chunk, outputs):
+                results.append(decode_yolov8(output.astype(np.float32), scale, pad, image.shape[:2]))
+        return results
+
+    def info(self) -> Dict[str, object]:
+        info = super().info()
+        if hasattr(self, "session"):
+            info.update(providers=self.session.get_providers(), input_size=self.size,
+                        dtype=np.dtype(self.dtype).name)
+        return info
+
+
+BACKENDS: Dict[str, Type[Detector]] = {
+    UltralyticsDetector.name: UltralyticsDetector,
+    OnnxDetector.name: OnnxDetector,
+}
+
+
+def resolve(backend: str = DETECTOR_BACKEND, weights: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """(backend name, weights path) for the configuration; the name is None when it is not installed."""
+    if backend == "auto":
+        if weights:
+            backend = OnnxDetector.name if weights.endswith(".onnx") else UltralyticsDetector.name
+        elif OnnxDetector.available() and os.path.exists(OnnxDetector.default_weights):
+            backend = OnnxDetector.name
+        else:
+            backend = UltralyticsDetector.name
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown DETECTOR_BACKEND {backend!r}; expected auto or one of {', '.join(BACKENDS)}")
+    cls = BACKENDS[backend]
+    return (backend if cls.available() else None), weights or cls.default_weights
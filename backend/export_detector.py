@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Export the YOLOv8 weights to ONNX for the ONNX Runtime backend, optionally quantized to INT8.
+
+    python export_detector.py                          # yolov8n.pt -> yolov8n.onnx
+    python export_detector.py --int8                   # also write yolov8n-int8.onnx (dynamic quantization)
+    python export_detector.py --int8 --calibration photos/   # static INT8 calibrated on real load photos
+
+Then start the backend with DETECTOR_BACKEND=onnx (and YOLO_WEIGHTS=yolov8n-int8.onnx
+for the quantized model). Exporting needs ultralytics; serving needs only onnxruntime,
+which is optional: pip install -r requirements-onnx.txt.
+"""
+import argparse
+import os
+import sys
+from typing import Iterator, List
+
+import numpy as np
+
+
+def export(weights: str, size: int, dynamic: bool) -> str:
+    from ultralytics import YOLO
+
+    # dynamic=True keeps the batch axis free so batched /detect calls run as one session.run
+    return YOLO(weights).export(format="onnx", imgsz=size, dynamic=dynamic, simplify=True, opset=17)
+
+
+def _calibration_batches(directory: str, size: int, limit: int) -> Iterator[np.ndarray]:
+    from detect import IMAGE_EXTENSIONS, decode_image
+    from detectors import letterbox
+
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            canvas, _, _ = letterbox(decode_image(f.read()), size)
+        yield np.ascontiguousarray(canvas[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255
+
+
+def quantize(model: str, output: str, calibration: str, size: int, limit: int):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    if not calibration:
+        # Weights only; activations are quantized on the fly. No data needed, smaller speed-up than static
+        quantize_dynamic(model, output, weight_type=QuantType.QUInt8)
+        return
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, input_name: str):
+            self.batches = ({input_name: batch} for batch in _calibration_batches(calibration, size, limit))
+
+        def get_next(self):
+            return next(self.batches, None)
+
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(model, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    quantize_static(model, output, Reader(input_name), quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--size", type=int, default=640, help="input side of the exported model")
+    parser.add_argument("--static-batch", action="store_true", help="export with a fixed batch of 1")
+    parser.add_argument("--int8", action="store_true", help="also write an INT8-quantized copy")
+    parser.add_argument("--calibration", help="directory of photos for static INT8 calibration")
+    parser.add_argument("--calibration-images", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    model = export(args.weights, args.size, dynamic=not args.static_batch)
+    print(f"exported {model}", file=sys.stderr)
+    if args.int8:
+        output = os.path.splitext(model)[0] + "-int8.onnx"
+        quantize(model, output, args.calibration, args.size, args.calibration_images)
+        print(f"quantized {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
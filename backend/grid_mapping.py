@@ -0,0 +1,63 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from models import Box, Calibration
+
+
+def _floor_coords(corners: np.ndarray, image_w: int, image_h: int, calibration: Optional[Calibration]) -> np.ndarray:
+    """Map (N, 4, 2) pixel corners to floor coordinates normalized to 0..1."""
+    if calibration is not None and calibration.homography is not None:
+        H = np.asarray(calibration.homography, dtype=np.float64)
+        if H.shape != (3, 3):
+            raise ValueError("homography must be a 3x3 matrix")
+        points = np.concatenate([corners, np.ones(corners.shape[:-1] + (1,))], axis=-1) @ H.T
+        w = points[..., 2:3]
+        if np.any(np.abs(w) < 1e-12):
+            raise ValueError("homography maps a box corner to infinity")
+        return points[..., :2] / w
+    if calibration is not None and calibration.roi is not None:
+        if len(calibration.roi) != 4:
+            raise ValueError("roi must be [x0, y0, x1, y1]")
+        x0, y0, x1, y1 = calibration.roi
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError("roi must have x1 > x0 and y1 > y0")
+        return (corners - [x0, y0]) / [x1 - x0, y1 - y0]
+    return corners / [max(image_w, 1), max(image_h, 1)]
+
+
+def map_to_grid(pixel_boxes: List[Dict[str, Any]], image_w: int, image_h: int, grid_w: int, grid_h: int,
+                calibration: Optional[Calibration] = None) -> List[Box]:
+    """Scale detected pixel boxes to grid cells, all boxes at once.
+
+    Without calibration this matches the frontend's old mapping: origins are
+    floored and clamped inside the grid, sizes ceiled and clamped to 1..grid.
+    With a homography the grid box is the bounding box of the four projected
+    corners, so perspective in phone photos doesn't skew box sizes.
+    """
+    if grid_w <= 0 or grid_h <= 0:
+        raise ValueError("grid_width and grid_height must be positive")
+    if not pixel_boxes:
+        return []
+    xywh = np.array([[b["x"], b["y"], b["w"], b["h"]] for b in pixel_boxes], dtype=np.float64)
+    x, y, w, h = xywh.T
+    corners = np.stack([
+        np.stack([x, y], axis=1), np.stack([x + w, y], axis=1),
+        np.stack([x, y + h], axis=1), np.stack([x + w, y + h], axis=1),
+    ], axis=1)
+    floor = _floor_coords(corners, image_w, image_h, calibration) * [grid_w, grid_h]
+    lo = floor.min(axis=1)
+    hi = floor.max(axis=1)
+
+    gx = np.clip(np.floor(lo[:, 0]), 0, grid_w - 1).astype(int)
+    gy = np.clip(np.floor(lo[:, 1]), 0, grid_h - 1).astype(int)
+    # Rounding first keeps float noise (9.0000001 cells) from adding a whole cell
+    size = np.round(hi - lo, 9)
+    gw = np.clip(np.ceil(size[:, 0]), 1, grid_w).astype(int)
+    gh = np.clip(np.ceil(size[:, 1]), 1, grid_h).astype(int)
+
+    return [
+        Box(id=b.get("id") or f"box-{i + 1}", x=int(gx[i]), y=int(gy[i]), w=int(gw[i]), h=int(gh[i]),
+            label=b.get("label", "box"), confidence=b.get("confidence", 1.0))
+        for i, b in enumerate(pixel_boxes)
+    ]
@@ -0,0 +1,186 @@
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import LoadPlanRequest
+from telemetry import chat_answers, log_error, span
+
+# Questions asking for judgement always go to the model, even if they mention a known fact
+_NEEDS_REASONING = re.compile(r"\b(why|should|could|would|better|improve|optimi[sz]e|recommend|suggest|explain|"
+                              r"compare|instead|what if|safe|stable|heavy|weight)\b", re.I)
+_NOUN = r"(boxes|box|cartons?|packages?|parcels?|items?|pieces?)"
+_PLACE_FAILED = re.compile(r"Could not place (\S+?),")
+# Larger grids from the client are not worth rasterizing here
+_MAX_GRID_CELLS = 1_000_000
+
+
+def _list(context: Dict[str, Any], key: str) -> List[Any]:
+    # Anything but a list from the client counts as missing, so a string is never split into characters
+    value = context.get(key)
+    return value if isinstance(value, list) else []
+
+
+def _boxes(context: Dict[str, Any], key: str = "boxes") -> List[Dict[str, Any]]:
+    return [b for b in _list(context, key) if isinstance(b, dict)]
+
+
+def _ids(items: List[Any]) -> List[str]:
+    return [str(i) for i in items if isinstance(i, (str, int)) and not isinstance(i, bool)]
+
+
+def _count(context: Dict[str, Any]) -> Optional[int]:
+    for key in ("boxCount", "box_count"):
+        if isinstance(context.get(key), int) and context[key] > 0:
+            return context[key]
+    for key in ("boxes", "pixelBoxes"):
+        if _boxes(context, key):
+            return len(_boxes(context, key))
+    return None
+
+
+def _unplaced(context: Dict[str, Any]) -> Optional[List[str]]:
+    if isinstance(context.get("unplaced"), list):
+        return _ids(context["unplaced"])
+    if isinstance(context.get("warnings"), list):
+        return [m.group(1) for w in context["warnings"] if isinstance(w, str) for m in [_PLACE_FAILED.search(w)] if m]
+    return None
+
+
+def _grid(context: Dict[str, Any]) -> Tuple[int, int]:
+    grid = context.get("grid") or {}
+    defaults = LoadPlanRequest.model_fields
+    return (int(grid.get("w") or defaults["grid_width"].default), int(grid.get("h") or defaults["grid_height"].default))
+
+
+def _join(items: List[str]) -> str:
+    return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def _box_count(context: Dict[str, Any]) -> Optional[str]:
+    n = _count(context)
+    if n is None:
+        return None
+    detected = len(_boxes(context, "pixelBoxes"))
+    extra = f" The photo detection found {detected}." if detected and detected != n else ""
+    return f"There {'is' if n == 1 else 'are'} {n} {'box' if n == 1 else 'boxes'} in the current load.{extra}"
+
+
+def _fill_ratio(context: Dict[str, Any]) -> Optional[str]:
+    boxes = _boxes(context)
+    if not boxes:
+        return None
+    try:
+        grid_w, grid_h = _grid(context)
+        rects = [tuple(int(b.get(k, 0)) for k in ("x", "y", "w", "h")) for b in boxes]
+    except (AttributeError, TypeError, ValueError, OverflowError):
+        # Malformed coordinates from the client; let Claude answer instead
+        return None
+    if grid_w <= 0 or grid_h <= 0 or grid_w * grid_h > _MAX_GRID_CELLS:
+        return None
+    occupied = np.zeros((grid_h, grid_w), dtype=bool)
+    for x, y, w, h in rects:
+        occupied[max(0, y):max(0, y + h), max(0, x):max(0, x + w)] = True
+    ratio = np.count_nonzero(occupied) / occupied.size
+    unplaced = _unplaced(context) or []
+    tail = f" {len(unplaced)} more did not fit." if unplaced else ""
+    return f"The plan fills {ratio:.0%} of the floor space with {len(boxes)} boxes placed.{tail}"
+
+
+def _load_order(context: Dict[str, Any]) -> Optional[str]:
+    sequence = _ids(_list(context, "sequence")) or _ids([b.get("id") for b in _boxes(context)])
+    if not sequence:
+        return None
+    if len(sequence) > 12:
+        return f"Load in this order: {', '.join(sequence[:12])}, then the remaining {len(sequence) - 12} as listed on screen."
+    return f"Load in this order: {_join(sequence)}."
+
+
+def _unplaced_boxes(context: Dict[str, Any]) -> Optional[str]:
+    unplaced = _unplaced(context)
+    if unplaced is None:
+        return None
+    if not unplaced:
+        return "Every box fits in the current plan."
+    return f"{len(unplaced)} {'box does' if len(unplaced) == 1 else 'boxes do'} not fit: {_join(unplaced)}."
+
+
+def _vehicle(context: Dict[str, Any]) -> Optional[str]:
+    vehicle = context.get("vehicle")
+    if isinstance(vehicle, dict):
+        vehicle = vehicle.get("name")
+    return f"You are loading the {vehicle}." if vehicle else None
+
+
+def _route(context: Dict[str, Any]) -> Optional[str]:
+    return f"The route is {context['route']}." if context.get("route") else None
+
+
+# Checked in order; the first pattern that matches owns the question
+INTENTS: List[Tuple[str, "re.Pattern[str]", Callable[[Dict[str, Any]], Optional[str]]]] = [
+    ("unplaced", re.compile(rf"\b(did ?n[o']t|does ?n[o']t|won'?t|could ?n[o']t|can'?t) fit\b|\bunplaced\b|"
+                            rf"\b(left ?over|left out)\b|\bwhich {_NOUN} (are|were) missing\b", re.I), _unplaced_boxes),
+    ("box_count", re.compile(rf"\bhow many {_NOUN}\b|\b{_NOUN} count\b|\bnumber of {_NOUN}\b|\bcount (the )?{_NOUN}\b", re.I),
+     _box_count),
+    ("fill_ratio", re.compile(r"\b(fill(ed)?( ratio| rate)?|utili[sz]ation|occupancy|how full|space (is )?used)\b", re.I),
+     _fill_ratio),
+    ("load_order", re.compile(rf"\b(load(ing)? (order|sequence)|order (to|of|for) load|what order|which order|"
+                              rf"which {_NOUN} (goes |go )?first|what (goes|do i load) first|sequence)\b", re.I),
+     _load_order),
+    ("vehicle", re.compile(r"\b(which|what) (vehicle|truck|van|trailer)\b", re.I), _vehicle),
+    ("route", re.compile(r"\b(what|which)('s| is)? (the |my |our )?route\b|\bwhere (are we|am i) going\b", re.I), _route),
+]
+
+
+class IntentRouter:
+    """Answers questions about data the client already sent, without calling the LLM.
+
+    Only short, factual questions that match one intent and whose data is in
+    the context are answered here; everything else, and anything asking for
+    judgement, returns None so the caller falls back to Claude.
+    """
+
+    def __init__(self, max_words: int = 20):
+        self.max_words = max_words
+        self.local = 0
+        self.fallback = 0
+        self.intents: Dict[str, int] = {}
+
+    def answer(self, text: str, context: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+        """(intent, reply) for questions it can answer from `context`, else None."""
+        with span("intent_router"):
+            try:
+                result = self._match(text, context if isinstance(context, dict) else {})
+            except Exception as e:
+                # A context shape no handler expected; Claude can still answer from it
+                log_error("intent_router_error", error=str(e))
+                result = None
+        if result is None:
+            self.fallback += 1
+            chat_answers.inc("llm", "")
+            return None
+        self.local += 1
+        self.intents[result[0]] = self.intents.get(result[0], 0) + 1
+        chat_answers.inc("local", result[0])
+        return result
+
+    def _match(self, text: str, context: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        if not text or len(text.split()) > self.max_words or _NEEDS_REASONING.search(text):
+            return None
+        for intent, pattern, handler in INTENTS:
+            if pattern.search(text):
+                reply = handler(context)
+                return (intent, reply) if reply else None
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.local + self.fallback
+        return {
+            "local": self.local,
+            "llm": self.fallback,
+            "local_share": round(self.local / total, 3) if total else 0.0,
+            "intents": dict(self.intents),
+        }
+
+
+router = IntentRouter()
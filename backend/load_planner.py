@@ -1,64 +1,119 @@
-from typing import List, Dict, Any
-from models import Box, LoadPlanRequest, LoadPlanResponse
+from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
 
-def plan_load(body: LoadPlanRequest) -> LoadPlanResponse:
-    grid_w = body.grid_width
-    grid_h = body.grid_height
-    boxes: List[Box] = body.boxes
+from boxes import BoxArray
+from models import LoadPlanRequest, LoadPlanResponse, PlanMetrics
+from packing import PackingEngine, get_engine
+from telemetry import span
+
+
+def compute_metrics(occupied: np.ndarray, placements: BoxArray) -> PlanMetrics:
+    """Score a packed grid with array ops; `occupied` is a [y, x] boolean array."""
+    grid_h, grid_w = occupied.shape
+    total_cells = grid_w * grid_h
+    filled = int(np.count_nonzero(occupied))
+
+    # Stability proxy: fewer adjacent edges reduce shifts
+    adjacency = int(np.count_nonzero(occupied[1:, :] & occupied[:-1, :]))
+    adjacency += int(np.count_nonzero(occupied[:, 1:] & occupied[:, :-1]))
+
+    center_of_mass = None
+    center_offset = None
+    if filled:
+        cx = float(occupied.sum(axis=0) @ (np.arange(grid_w) + 0.5)) / filled
+        cy = float(occupied.sum(axis=1) @ (np.arange(grid_h) + 0.5)) / filled
+        center_of_mass = [round(cx, 3), round(cy, 3)]
+        center_offset = [round(cx - grid_w / 2, 3), round(cy - grid_h / 2, 3)]
+
+    # Label every cell with its box so contacts between different boxes can be counted
+    solid = placements.take(np.nonzero((placements.w > 0) & (placements.h > 0))[0])
+    labels = np.zeros((grid_h + 2, grid_w + 2), dtype=np.int32)
+    labels[0, :] = labels[-1, :] = labels[:, 0] = labels[:, -1] = -1
+    for i, (x, y, w, h) in enumerate(solid.xywh.tolist(), start=1):
+        labels[y + 1:y + 1 + h, x + 1:x + 1 + w] = i
+    inner = labels[1:-1, 1:-1]
+    contacts = np.zeros(len(solid) + 1, dtype=np.int64)
+    for neighbour in (labels[:-2, 1:-1], labels[2:, 1:-1], labels[1:-1, :-2], labels[1:-1, 2:]):
+        touching = (inner > 0) & (neighbour != 0) & (neighbour != inner)
+        contacts += np.bincount(inner[touching], minlength=len(solid) + 1)
+    perimeter = 2 * (solid.w.astype(np.int64) + solid.h)
+    support = {box_id: round(c / p, 3) for box_id, c, p in zip(solid.ids, contacts[1:].tolist(), perimeter.tolist())}
+
+    return PlanMetrics(
+        fill_ratio=filled / total_cells if total_cells else 0,
+        filled_cells=filled,
+        total_cells=total_cells,
+        adjacency=adjacency,
+        adjacency_ratio=adjacency / (total_cells * 2) if total_cells else 0,
+        center_of_mass=center_of_mass,
+        center_offset=center_offset,
+        support=support,
+        min_support=min(support.values()) if support else 0.0,
+        mean_support=round(sum(support.values()) / len(support), 3) if support else 0.0,
+    )
+
+
+def plan_score(fill_ratio: float, adjacency_ratio: float) -> float:
+    return round(0.6 * fill_ratio + 0.4 * adjacency_ratio, 3)
 
-    # Sort boxes by area descending for a simple heuristic
-    sorted_boxes = sorted(boxes, key=lambda b: b.w * b.h, reverse=True)
 
-    occupied = [[False for _ in range(grid_w)] for _ in range(grid_h)]
-    placements: List[Box] = []
+def grid_score(occupied: np.ndarray) -> float:
+    """The plan score from the occupancy grid alone, cheap enough to evaluate per candidate."""
+    total_cells = occupied.size
+    if not total_cells:
+        return 0.0
+    adjacency = int(np.count_nonzero(occupied[1:, :] & occupied[:-1, :]))
+    adjacency += int(np.count_nonzero(occupied[:, 1:] & occupied[:, :-1]))
+    return plan_score(np.count_nonzero(occupied) / total_cells, adjacency / (total_cells * 2))
+
+
+def pack(grid_w: int, grid_h: int, boxes: BoxArray, strategy: str,
+         rotated: Optional[np.ndarray] = None) -> Tuple[PackingEngine, BoxArray, List[str]]:
+    """Insert boxes in the given order, turning the ones flagged in `rotated` by 90 degrees."""
+    engine = get_engine(strategy, grid_w, grid_h)
+    dims = boxes.xywh[:, 2:4].copy()
+    if rotated is not None:
+        dims[rotated] = dims[rotated][:, ::-1]
+    kept: List[int] = []
+    positions: List[Tuple[int, int]] = []
     warnings: List[str] = []
 
-    def can_place(x: int, y: int, w: int, h: int) -> bool:
-        if x < 0 or y < 0 or x + w > grid_w or y + h > grid_h:
-            return False
-        for yy in range(y, y + h):
-            for xx in range(x, x + w):
-                if occupied[yy][xx]:
-                    return False
-        return True
-
-    def place(x: int, y: int, w: int, h: int):
-        for yy in range(y, y + h):
-            for xx in range(x, x + w):
-                occupied[yy][xx] = True
-
-    # Simple first-fit left-to-right, top-to-bottom packing
-    for b in sorted_boxes:
-        placed = False
-        for yy in range(grid_h):
-            for xx in range(grid_w):
-                if can_place(xx, yy, b.w, b.h):
-                    place(xx, yy, b.w, b.h)
-                    placements.append(Box(id=b.id, x=xx, y=yy, w=b.w, h=b.h, label=b.label, confidence=b.confidence))
-                    placed = True
-                    break
-            if placed:
-                break
-        if not placed:
-            warnings.append(f"Could not place {b.id}, not enough space")
-
-    # Compute a simple stability score: fewer adjacent edges reduce shifts
-    adjacency = 0
-    for yy in range(grid_h):
-        for xx in range(grid_w):
-            if occupied[yy][xx]:
-                if yy > 0 and occupied[yy - 1][xx]:
-                    adjacency += 1
-                if xx > 0 and occupied[yy][xx - 1]:
-                    adjacency += 1
+    for i, (w, h) in enumerate(dims.tolist()):
+        pos = engine.insert(w, h)
+        if pos is None:
+            warnings.append(f"Could not place {boxes.ids[i]}, not enough space")
+            continue
+        kept.append(i)
+        positions.append(pos)
+
+    placements = boxes.take(kept)
+    if kept:
+        placements.xywh = np.concatenate([np.array(positions, dtype=np.int32), dims[kept]], axis=1)
+    return engine, placements, warnings
+
+
+def area_order(boxes: BoxArray) -> np.ndarray:
+    # Stable, so equal areas keep their input order like sorted(..., reverse=True)
+    return np.argsort(-(boxes.w.astype(np.int64) * boxes.h), kind="stable")
+
+
+def plan_load(body: LoadPlanRequest) -> LoadPlanResponse:
+    boxes = BoxArray.from_boxes(body.boxes)
+
+    # Sort boxes by area descending for a simple heuristic
+    with span("packing"):
+        engine, placements, warnings = pack(body.grid_width, body.grid_height, boxes.take(area_order(boxes)), body.strategy)
+    return build_response(engine, placements, warnings)
 
-    total_cells = grid_w * grid_h
-    filled = sum(1 for yy in range(grid_h) for xx in range(grid_w) if occupied[yy][xx])
-    fill_ratio = filled / total_cells if total_cells else 0
-    score = round(0.6 * fill_ratio + 0.4 * (adjacency / (total_cells * 2)), 3)
 
-    sequence: List[str] = [p.id for p in placements]
+def build_response(engine: PackingEngine, placements: BoxArray, warnings: List[str]) -> LoadPlanResponse:
+    with span("scoring"):
+        metrics = compute_metrics(engine.occupied, placements)
+        score = plan_score(metrics.fill_ratio, metrics.adjacency_ratio)
 
-    return LoadPlanResponse(placements=placements, score=score, warnings=warnings, sequence=sequence)
+    sequence: List[str] = list(placements.ids)
 
+    # The only place plan boxes become Pydantic models
+    return LoadPlanResponse(placements=placements.to_models(), score=score, warnings=warnings, sequence=sequence,
+                            metrics=metrics)
@@ -1,36 +1,112 @@
 import os
-import uuid
-from typing import List, Optional, Dict, Any
+import json
+import time
+import asyncio
+import contextlib
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Dict, Any, Tuple
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-import anthropic
-from elevenlabs import ElevenLabs
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from models import Box, DetectResponse, ChatRequest, ChatResponse, LoadPlanRequest, LoadPlanResponse
-from detect import detect_boxes
+from models import Box, Calibration, DetectResponse, DetectPlanResponse, DetectBatchResponse, ChatRequest, ChatResponse, LoadPlanRequest, LoadPlanResponse, LoadPlan3DRequest, LoadPlan3DResponse, LoadPlanBatchRequest, PlanDiff, PlanEditRequest, PlanSessionResponse, TTSRequest
+from detect import DETECT_BATCH_SIZE, detect_blobs, unpack_archive, warm as warm_decoders
+from detect_pool import PoolSaturated, pool
+from batching import DETECT_MICROBATCH, batcher
+from detect_cache import detect_cache
+from grid_mapping import map_to_grid
 from load_planner import plan_load
+from planner3d import plan_load_3d
+import optimizer
+import plan_pool
+from plan_batch import expand, stream_batch
+from plan_sessions import plan_sessions
+from chat_sessions import ChatSession, build_request, chat_sessions
+from intent_router import router
+from model_registry import registry
+from clients import anthropic_client, close_clients, elevenlabs_client
+from telemetry import RequestTelemetry, log_error, metrics_text, observe, span
+from startup import readiness
+from video_stream import VIDEO_DETECT_EVERY, VIDEO_WORKING_SIZE, VideoStream
+from tts import AUDIO_DIR, audio_store, tts_cache, cleanup_loop, drain, speech_url, split_sentences, stream_speech, stream_text
 
-# Environment variables for external services
-ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+# Load detection weights at startup instead of on the first /detect call
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "1") != "0"
+# On shutdown, seconds given to queued detections and in-flight speech synthesis to finish
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20"))
+CHAT_MODEL = "claude-3-haiku-20240307"
+NOT_CONFIGURED_REPLY = "I'm sorry, I cannot process your request because the AI service is not configured."
 
-# Initialize clients
-anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY) if ANTHROPIC_API_KEY else None
-elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY) if ELEVENLABS_API_KEY else None
 
-# Audio setup
-AUDIO_DIR = "audio_output"
-os.makedirs(AUDIO_DIR, exist_ok=True)
+async def warm_detection():
+    # With a process pool each worker loads its own copy instead
+    if PRELOAD_MODEL and pool.workers == 0:
+        # Already resident when run_server.py --prod loaded the weights before forking
+        await asyncio.to_thread(registry.load)
+        await asyncio.to_thread(registry.warmup)
+    # Goes through the pool so, with worker processes, it also waits for a worker to come up
+    await pool.run(warm_decoders)
 
-app = FastAPI(title="Logithon Backend", version="0.1.0")
+
+def warm_planning():
+    plan_load(LoadPlanRequest(boxes=[Box(id="warmup", x=0, y=0, w=2, h=2)]))
+
+
+async def warm_chat():
+    client = anthropic_client()
+    if client is None:
+        # Only required by default when the key is set, so this means READY_SUBSYSTEMS asked for it
+        raise RuntimeError("ANTHROPIC_API_KEY is not set")
+    # Listing models costs no tokens but still checks the key and opens a pooled connection
+    await client.models.list(limit=1)
+
+
+async def warm_tts():
+    client = elevenlabs_client()
+    if client is None:
+        raise RuntimeError("ELEVENLABS_API_KEY is not set")
+    await client.models.list()
+
+
+readiness.register("detection", warm_detection)
+readiness.register("planning", warm_planning)
+readiness.register("chat", warm_chat)
+readiness.register("tts", warm_tts)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts the worker pools and background tasks, and drains them again on shutdown."""
+    pool.start()
+    if DETECT_MICROBATCH:
+        batcher.start()
+    plan_pool.start()
+    app.state.audio_cleanup = asyncio.create_task(cleanup_loop())
+    # In the background, so the server accepts connections (and answers /health) while subsystems warm up
+    app.state.warmup = asyncio.create_task(readiness.warm())
+    try:
+        yield
+    finally:
+        await batcher.stop(SHUTDOWN_DRAIN_SECONDS)
+        # Waits for detection jobs that are already running
+        pool.shutdown()
+        plan_pool.shutdown()
+        app.state.warmup.cancel()
+        app.state.audio_cleanup.cancel()
+        await drain(SHUTDOWN_DRAIN_SECONDS)
+        # The cleanup loop saves the index periodically; persist the latest LRU order on the way out
+        tts_cache.save_index()
+        await close_clients()
+
+
+app = FastAPI(title="Logithon Backend", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -38,7 +114,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Profile"],
 )
+# Outermost, so its timings and request ID cover everything below it
+app.add_middleware(RequestTelemetry)
 
 # Mount audio directory to serve generated speech files
 app.mount("/audio", StaticFiles(directory=AUDIO_DIR), name="audio")
@@ -74,34 +153,152 @@ Always be specific about numbers, measurements, and efficiency explanations.
 
 @app.get("/health")
 async def health():
-    return JSONResponse({"status": "ok"})
+    return JSONResponse({"status": "ok", "detection": registry.status(), "audio": audio_store.stats(), "tts_cache": tts_cache.stats(), "batching": batcher.stats(), "detect_pool": pool.stats(), "detect_cache": detect_cache.stats(), "plan_sessions": plan_sessions.stats(), "chat_sessions": chat_sessions.stats(), "intent_router": router.stats(), "ready": readiness.ready})
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the READY_SUBSYSTEMS are warm, 503 until then or if one failed to warm."""
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+def _timings(submitted: float, started: float, finished: float) -> Dict[str, float]:
+    return {
+        "queue_ms": round(max(0.0, started - submitted) * 1000, 2),
+        "exec_ms": round((finished - started) * 1000, 2),
+    }
+
+
+async def _run_detection(awaitable_factory):
+    """Admit a detection request to the pool, mapping saturation and timeouts to HTTP errors."""
+    try:
+        with pool.slot():
+            return await pool.wait(awaitable_factory())
+    except PoolSaturated as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Detection timed out")
+    except BrokenProcessPool:
+        raise HTTPException(status_code=503, detail="Detection worker crashed, please retry")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage and request latency histograms in the Prometheus text format."""
+    return PlainTextResponse(metrics_text(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/detect", response_model=DetectResponse)
 async def detect(file: UploadFile = File(...)):
     # Read file into bytes
     image_bytes = await file.read()
-    # Run detection with YOLO v8 (with OpenCV fallback)
-    result = detect_boxes(image_bytes)
-    return result
+    # Results are plain dicts already in the DetectResponse schema; encode them directly
+    # instead of re-validating every box through the response model
+    return JSONResponse(await _detect_image(image_bytes))
 
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(body: ChatRequest):
-    """
-    Handle chat requests:
-    1. Send message history to Claude
-    2. Get text response
-    3. Generate audio using ElevenLabs
-    4. Return text and audio URL
+async def _detect_image(image_bytes: bytes) -> Dict[str, Any]:
+    submitted = time.monotonic()
+    # Retries and re-sent frames are answered from the cache
+    cache_key = detect_cache.key(image_bytes)
+    cached = detect_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "cached": True, "timings": _timings(submitted, submitted, time.monotonic())}
+    # Run detection with YOLO v8 (with OpenCV fallback) off the event loop,
+    # batched with concurrent uploads
+    started, finished, result = await _run_detection(lambda: batcher.submit(image_bytes))
+    if result is None:
+        raise HTTPException(status_code=400, detail="Could not decode image")
+    await detect_cache.put(cache_key, result)
+    return {**result, "timings": _timings(submitted, started, finished)}
+
+
+@app.post("/detect-and-plan", response_model=DetectPlanResponse)
+async def detect_and_plan(
+    file: UploadFile = File(...),
+    grid_width: int = Form(20),
+    grid_height: int = Form(15),
+    strategy: str = Form("first_fit"),
+    calibration: Optional[str] = Form(None),
+    optimize: bool = Form(False),
+    time_budget_ms: int = Form(300),
+    session: bool = Form(False),
+):
+    """Detect boxes, map them to grid cells and plan the load in one request.
+
+    `calibration` is an optional JSON Calibration (floor roi or homography).
+    With `session` the plan is also kept as an editable plan session.
     """
-    if not anthropic_client:
-        # Fallback if no API key
-        return ChatResponse(
-            reply="I'm sorry, I cannot process your request because the AI service is not configured.",
-            context=body.context
+    try:
+        calib = Calibration.model_validate_json(calibration) if calibration else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid calibration: {e}")
+    detection = await _detect_image(await file.read())
+
+    mapped = time.perf_counter()
+    try:
+        grid_boxes = map_to_grid(detection["boxes"], detection["image_width"], detection["image_height"],
+                                 grid_width, grid_height, calib)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    planned = time.perf_counter()
+
+    body = LoadPlanRequest(grid_width=grid_width, grid_height=grid_height, boxes=grid_boxes, strategy=strategy,
+                           optimize=optimize, time_budget_ms=time_budget_ms)
+    plan = await load_plan(body)
+    session_id = plan_sessions.create(body, plan).session_id if session else None
+    timings = {
+        "map_ms": round((planned - mapped) * 1000, 2),
+        "plan_ms": round((time.perf_counter() - planned) * 1000, 2),
+    }
+    return DetectPlanResponse(detection=detection, grid_boxes=grid_boxes, plan=plan, session_id=session_id,
+                              timings=timings)
+
+
+@app.post("/detect/batch", response_model=DetectBatchResponse)
+async def detect_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    batch_size: int = Query(DETECT_BATCH_SIZE, ge=1, le=64),
+):
+    """Detect boxes on many frames at once: multipart `files`, and/or a zip/tar `archive`."""
+    named: List[tuple] = []
+    for f in files or []:
+        named.append((f.filename or f"image-{len(named) + 1}", await f.read()))
+    if archive is not None:
+        try:
+            named.extend(await asyncio.to_thread(unpack_archive, await archive.read()))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Archive must be a zip or tar file")
+    if not named:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+
+    submitted = time.monotonic()
+    keys = [detect_cache.key(data) for _, data in named]
+    results: List[Optional[dict]] = [detect_cache.get(key) for key in keys]
+    cached = [result is not None for result in results]
+    misses = [i for i, hit in enumerate(cached) if not hit]
+    timings = _timings(submitted, submitted, time.monotonic())
+    if misses:
+        started, finished, fresh = await _run_detection(
+            lambda: pool.run(detect_blobs, [named[i][1] for i in misses], batch_size)
         )
+        timings = _timings(submitted, started, finished)
+        for i, result in zip(misses, fresh):
+            results[i] = result
+            if result is not None:
+                await detect_cache.put(keys[i], result)
+    failed = [name for (name, _), result in zip(named, results) if result is None]
+    if failed:
+        raise HTTPException(status_code=400, detail=f"Could not decode {', '.join(failed)}")
+    return JSONResponse({
+        "filenames": [name for name, _ in named],
+        "results": [{**result, "cached": hit, "timings": timings} for result, hit in zip(results, cached)],
+    })
+
 
+def _claude_messages(body: ChatRequest) -> List[Dict[str, Any]]:
     # Prepare messages for Claude
     messages = []
     for m in body.messages:
@@ -109,57 +306,330 @@ def chat(body: ChatRequest):
             "role": m.get("role", "user"),
             "content": m.get("content", "")
         })
+    return messages
 
-    try:
-        # Get response from Claude
-        response = anthropic_client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1024,
-            system=SYSTEM_PROMPT,
-            messages=messages
-        )
-        
-        assistant_response = response.content[0].text
-        
-        audio_url = None
-        if elevenlabs_client:
-            try:
-                # Use the user-provided voice ID
-                voice_id = "cNYrMw9glwJZXR8RwbuR"  
-                
-                audio_generator = elevenlabs_client.text_to_speech.convert(
-                    voice_id=voice_id,
-                    text=assistant_response,
-                    model_id="eleven_multilingual_v2"
+
+def _chat_session(body: ChatRequest) -> Optional[ChatSession]:
+    if body.session_id:
+        session = chat_sessions.get(body.session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired chat session")
+        return session
+    return chat_sessions.create() if body.session else None
+
+
+def _chat_prompt(body: ChatRequest, session: Optional[ChatSession]) -> Dict[str, Any]:
+    """System blocks and messages for Claude, from the session if there is one."""
+    if session is None:
+        return build_request(SYSTEM_PROMPT, _claude_messages(body), context=body.context)
+    session.add(body.messages, body.context)
+    return session.request(SYSTEM_PROMPT)
+
+
+def _session_lock(session: Optional[ChatSession]):
+    # Held for a whole turn, so a background summary can't trim the history under it
+    return session.lock if session else contextlib.nullcontext()
+
+
+async def _local_answer(body: ChatRequest, session: Optional[ChatSession]) -> Optional[Tuple[str, str]]:
+    """(intent, reply) when the newest question is answerable from the context alone."""
+    question = next((m.get("content") for m in reversed(body.messages) if m.get("role", "user") == "user"), None)
+    if not isinstance(question, str):
+        return None
+    context = body.context if body.context is not None else (session.context if session else None)
+    answer = router.answer(question, context)
+    if answer is not None and session:
+        # Keep the session history complete, so a later Claude turn sees this exchange too
+        async with session.lock:
+            session.add(body.messages, body.context)
+            session.add_reply(answer[1])
+    return answer
+
+
+def _usage(usage: Any) -> Dict[str, int]:
+    fields = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+    return {f: int(getattr(usage, f, 0) or 0) for f in fields}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(body: ChatRequest):
+    """
+    Handle chat requests:
+    1. Send message history to Claude
+    2. Get text response
+    3. Generate audio using ElevenLabs
+    4. Return text and audio URL
+    """
+    session = _chat_session(body)
+    # Counts, fill ratio, load order and the like are answered from the context without Claude
+    local = await _local_answer(body, session)
+    if local is not None:
+        intent, reply = local
+        return ChatResponse(reply=reply, audio_url=await speech_url(reply, body.audio_mode), context=body.context,
+                            session_id=session.session_id if session else None, intent=intent)
+
+    client = anthropic_client()
+    if not client:
+        # Fallback if no API key
+        return ChatResponse(reply=NOT_CONFIGURED_REPLY, context=body.context)
+
+    async with _session_lock(session):
+        mark = len(session.messages) if session else 0
+        try:
+            # Get response from Claude
+            with span("llm"):
+                response = await client.messages.create(
+                    model=CHAT_MODEL,
+                    max_tokens=1024,
+                    **_chat_prompt(body, session)
                 )
-                
-                # Save audio file
-                audio_filename = f"{uuid.uuid4()}.mp3"
-                audio_path = os.path.join(AUDIO_DIR, audio_filename)
-                
-                with open(audio_path, 'wb') as f:
-                    for chunk in audio_generator:
-                        f.write(chunk)
-                
-                # Return relative URL
-                audio_url = f"/audio/{audio_filename}"
-                
+            assistant_response = response.content[0].text
+        except Exception as e:
+            if session:
+                session.discard_since(mark)
+            log_error("chat_error", error=str(e))
+            # Return a polite error message instead of 500 if possible, or let it raise
+            raise HTTPException(status_code=500, detail=str(e))
+
+        if session:
+            session.add_reply(assistant_response)
+            session.compact(client, CHAT_MODEL)
+    audio_url = await speech_url(assistant_response, body.audio_mode)
+
+    return ChatResponse(
+        reply=assistant_response,
+        audio_url=audio_url,
+        context=body.context,
+        session_id=session.session_id if session else None,
+        usage=_usage(response.usage),
+    )
+
+
+@app.post("/chat/stream")
+async def chat_stream(body: ChatRequest):
+    """
+    Server-sent events version of /chat:
+    - `token` events carry text deltas as Claude produces them
+    - `audio` events carry one audio URL per sentence, in order, as soon as it is available
+    - `done` carries the full reply, session ID and token usage; `error` is sent instead if Claude fails
+    """
+    client = anthropic_client()
+    # Looked up before streaming starts, so an unknown session is still a plain 404
+    session = _chat_session(body)
+    session_id = session.session_id if session else None
+    local = await _local_answer(body, session)
+
+    async def events():
+        if local is not None:
+            intent, reply = local
+            yield _sse("token", {"text": reply})
+            url = await speech_url(reply, body.audio_mode)
+            if url:
+                yield _sse("audio", {"index": 0, "audio_url": url})
+            yield _sse("done", {"reply": reply, "context": body.context, "session_id": session_id, "intent": intent})
+            return
+        if not client:
+            yield _sse("token", {"text": NOT_CONFIGURED_REPLY})
+            yield _sse("done", {"reply": NOT_CONFIGURED_REPLY, "context": body.context})
+            return
+
+        pending: List[asyncio.Task] = []
+        sent = 0
+        buffer = ""
+        reply = ""
+
+        def ready_audio():
+            # Emit finished sentences strictly in order so playback never skips ahead
+            nonlocal sent
+            while sent < len(pending) and pending[sent].done():
+                url = pending[sent].result()
+                if url:
+                    yield _sse("audio", {"index": sent, "audio_url": url})
+                sent += 1
+
+        async with _session_lock(session):
+            started = time.perf_counter()
+            first_token = True
+            mark = len(session.messages) if session else 0
+            try:
+                async with client.messages.stream(
+                    model=CHAT_MODEL,
+                    max_tokens=1024,
+                    **_chat_prompt(body, session)
+                ) as stream:
+                    async for text in stream.text_stream:
+                        if first_token:
+                            observe("llm_first_token", time.perf_counter() - started)
+                            first_token = False
+                        reply += text
+                        buffer += text
+                        yield _sse("token", {"text": text})
+                        sentences, buffer = split_sentences(buffer)
+                        for sentence in sentences:
+                            pending.append(asyncio.create_task(speech_url(sentence, body.audio_mode)))
+                        for event in ready_audio():
+                            yield event
+                    usage = _usage((await stream.get_final_message()).usage)
+                observe("llm", time.perf_counter() - started)
             except Exception as e:
-                print(f"ElevenLabs error: {e}")
-                # Continue without audio
-        
-        return ChatResponse(
-            reply=assistant_response,
-            audio_url=audio_url,
-            context=body.context
-        )
+                if session:
+                    session.discard_since(mark)
+                log_error("chat_error", error=str(e))
+                for task in pending:
+                    task.cancel()
+                yield _sse("error", {"detail": str(e)})
+                return
+
+            if session:
+                session.add_reply(reply)
+                session.compact(client, CHAT_MODEL)
+        if buffer.strip():
+            pending.append(asyncio.create_task(speech_url(buffer.strip(), body.audio_mode)))
+        while sent < len(pending):
+            await asyncio.wait([pending[sent]])
+            for event in ready_audio():
+                yield event
+        yield _sse("done", {"reply": reply, "context": body.context, "session_id": session_id, "usage": usage})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 
+@app.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(session_id: str):
+    if not chat_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired chat session")
+    return {"deleted": True}
+
+
+async def _audio_response(text: str) -> StreamingResponse:
+    chunks = stream_speech(text)
+    # Pull the first chunk before answering so upstream failures still map to an HTTP error
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = b""
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        print(f"Chat error: {e}")
-        # Return a polite error message instead of 500 if possible, or let it raise
-        raise HTTPException(status_code=500, detail=str(e))
+        log_error("tts_error", error=str(e))
+        raise HTTPException(status_code=502, detail="Text-to-speech failed")
+
+    async def relay():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(relay(), media_type="audio/mpeg", headers={"Cache-Control": "no-store"})
+
+
+@app.get("/tts/stream/{token}")
+async def tts_stream(token: str):
+    text = stream_text(token)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired audio link")
+    return await _audio_response(text)
+
+
+@app.post("/tts")
+async def tts(body: TTSRequest):
+    return await _audio_response(body.text)
+
+
+@app.websocket("/ws/tts")
+async def tts_socket(websocket: WebSocket):
+    """Send {"text": ...}; audio arrives as binary frames followed by {"event": "end"}."""
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_json()
+            try:
+                async for chunk in stream_speech(message.get("text", "")):
+                    await websocket.send_bytes(chunk)
+                await websocket.send_json({"event": "end"})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                log_error("tts_error", error=str(e))
+                await websocket.send_json({"event": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+
+
+@app.websocket("/ws/detect")
+async def detect_socket(websocket: WebSocket, detect_every: int = Query(VIDEO_DETECT_EVERY, ge=1, le=120),
+                        working_size: int = Query(VIDEO_WORKING_SIZE, ge=160, le=4096)):
+    """Send encoded frames as binary messages; each processed frame is answered with tracked-box deltas.
+
+    Frames that arrive while the previous one is still being processed replace
+    it, so the replies always describe the newest frame. See VideoStream.
+    """
+    await websocket.accept()
+    await VideoStream(websocket, detect_every, working_size).run()
 
 
 @app.post("/load-plan", response_model=LoadPlanResponse)
 async def load_plan(body: LoadPlanRequest):
-    return plan_load(body)
+    try:
+        if body.optimize:
+            return await optimizer.optimize_plan(body)
+        return plan_load(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BrokenProcessPool:
+        raise HTTPException(status_code=503, detail="Planner worker crashed, please retry")
+
+
+@app.post("/load-plan/batch")
+async def load_plan_batch(body: LoadPlanBatchRequest):
+    """Plan many requests in parallel, streaming NDJSON lines as plans finish."""
+    try:
+        jobs = expand(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(stream_batch(jobs, body.rank), media_type="application/x-ndjson")
+
+
+@app.post("/load-plan/sessions", response_model=PlanSessionResponse)
+async def create_plan_session(body: LoadPlanRequest):
+    """Plan once, then keep the grid on the server for incremental edits."""
+    plan = await load_plan(body)
+    return plan_sessions.create(body, plan).response()
+
+
+def _plan_session(session_id: str):
+    session = plan_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired plan session")
+    return session
+
+
+@app.get("/load-plan/sessions/{session_id}", response_model=PlanSessionResponse)
+async def get_plan_session(session_id: str):
+    return _plan_session(session_id).response()
+
+
+@app.post("/load-plan/sessions/{session_id}/edit", response_model=PlanDiff)
+async def edit_plan_session(session_id: str, body: PlanEditRequest):
+    try:
+        return _plan_session(session_id).apply(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/load-plan/sessions/{session_id}")
+async def delete_plan_session(session_id: str):
+    if not plan_sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired plan session")
+    return {"deleted": True}
+
+
+@app.post("/load-plan/3d", response_model=LoadPlan3DResponse)
+async def load_plan_3d(body: LoadPlan3DRequest):
+    try:
+        return plan_load_3d(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from boxes import BoxArray
+from detectors import BACKENDS, Detector, resolve
+from telemetry import log_error
+
+# Backend picked by DETECTOR_BACKEND (None when it is not installed) and the weights used by /detect;
+# override with YOLO_WEIGHTS to try another checkpoint
+BACKEND, DEFAULT_WEIGHTS = resolve(weights=os.getenv("YOLO_WEIGHTS"))
+WARMUP_SIZE = 640
+# After a failed load, requests fall back straight away for this long instead of retrying the load;
+# replacing the weights file retries at once
+MODEL_RETRY_SECONDS = float(os.getenv("MODEL_RETRY_SECONDS", "60"))
+
+
+def weights_fingerprint(name: str = DEFAULT_WEIGHTS) -> str:
+    """Identifies the backend and weights in use; changes whenever the file is replaced."""
+    if BACKEND is None:
+        return "opencv-fallback"
+    try:
+        st = os.stat(name)
+    except OSError:
+        return f"{BACKEND}:{name}:missing"
+    return f"{BACKEND}:{name}:{st.st_size}:{st.st_mtime_ns}"
+
+
+class _LoadedModel:
+    def __init__(self, name: str, detector: Detector):
+        self.name = name
+        self.detector = detector
+        # Backends that keep per-call state (ultralytics) are serialized per model
+        self.lock = threading.Lock() if not detector.thread_safe else None
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.warmed_up = False
+        self.loaded_at = time.time()
+
+
+class ModelRegistry:
+    """Process-wide cache of detection models.
+
+    Weights are deserialized once per worker and kept resident; every request
+    shares the same instance instead of loading the model itself. The
+    backend (ultralytics or ONNX Runtime) is chosen by DETECTOR_BACKEND.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, _LoadedModel] = {}
+        self._lock = threading.Lock()
+        self._errors: Dict[str, str] = {}
+        # name -> (weights fingerprint, monotonic time) of the last failed load
+        self._failures: Dict[str, Tuple[str, float]] = {}
+
+    def load(self, name: str = DEFAULT_WEIGHTS, warmup: bool = True) -> Optional[_LoadedModel]:
+        entry = self._models.get(name)
+        if entry is not None:
+            return entry
+        if BACKEND is None or self._backing_off(name):
+            return None
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None:
+                return entry
+            if self._backing_off(name):
+                return None
+            start = time.perf_counter()
+            try:
+                detector = BACKENDS[BACKEND](name)
+                detector.load()
+            except Exception as e:
+                log_error("model_load_error", model=name, backend=BACKEND, error=str(e),
+                          retry_in_seconds=MODEL_RETRY_SECONDS)
+                self._errors[name] = str(e)
+                self._failures[name] = (weights_fingerprint(name), time.monotonic())
+                return None
+            self._failures.pop(name, None)
+            entry = _LoadedModel(name, detector)
+            entry.load_seconds = time.perf_counter() - start
+            if warmup:
+                self._warmup(entry)
+            self._errors.pop(name, None)
+            self._models[name] = entry
+            return entry
+
+    def _backing_off(self, name: str) -> bool:
+        failure = self._failures.get(name)
+        if failure is None:
+            return False
+        fingerprint, failed_at = failure
+        return time.monotonic() - failed_at < MODEL_RETRY_SECONDS and weights_fingerprint(name) == fingerprint
+
+    def _warmup(self, entry: _LoadedModel):
+        # A dummy inference builds the predictor / allocates the session's buffers before real traffic arrives
+        dummy = np.zeros((WARMUP_SIZE, WARMUP_SIZE, 3), dtype=np.uint8)
+        start = time.perf_counter()
+        try:
+            self._run(entry, [dummy])
+            entry.warmed_up = True
+        except Exception as e:
+            log_error("model_warmup_error", model=entry.name, error=str(e))
+        entry.warmup_seconds = time.perf_counter() - start
+
+    def warmup(self, name: str = DEFAULT_WEIGHTS):
+        """Warm up a model loaded with warmup=False, e.g. in a worker forked after the weights were preloaded."""
+        entry = self._models.get(name)
+        if entry is not None and not entry.warmed_up:
+            self._warmup(entry)
+
+    def get(self, name: str = DEFAULT_WEIGHTS) -> Optional[_LoadedModel]:
+        """Return the resident model, loading it lazily on first use."""
+        return self.load(name)
+
+    @staticmethod
+    def _run(entry: _LoadedModel, images: List[np.ndarray]) -> List[BoxArray]:
+        if entry.lock is None:
+            return entry.detector.predict(images)
+        with entry.lock:
+            return entry.detector.predict(images)
+
+    def predict(self, images: List[np.ndarray], name: str = DEFAULT_WEIGHTS) -> List[BoxArray]:
+        """Run inference on a list of BGR images (one batched call); one BoxArray per image."""
+        entry = self.get(name)
+        if entry is None:
+            raise RuntimeError(f"Model {name} is not available")
+        return self._run(entry, images)
+
+    def status(self) -> Dict[str, Any]:
+        models = {}
+        for name, entry in self._models.items():
+            models[name] = {
+                "loaded": True,
+                **entry.detector.info(),
+                "load_seconds": round(entry.load_seconds, 3),
+                "warmed_up": entry.warmed_up,
+                "warmup_seconds": round(entry.warmup_seconds, 3),
+                "loaded_at": entry.loaded_at,
+            }
+        for name, error in self._errors.items():
+            models.setdefault(name, {"loaded": False, "error": error})
+        return {"backend": BACKEND, "backend_available": BACKEND is not None, "models": models}
+
+
+registry = ModelRegistry()
@@ -15,17 +15,43 @@ class DetectResponse(BaseModel):
     boxes: List[Box]
     image_width: int
     image_height: int
+    # queue_ms: waiting for a detection worker, exec_ms: decode + inference in the worker
+    timings: Optional[Dict[str, float]] = None
+    # Decode time, working resolution and memory saved by downscaling before detection
+    preprocess: Optional[Dict[str, float]] = None
+    # True when served from the detection cache without running the detector
+    cached: bool = False
+
+
+class DetectBatchResponse(BaseModel):
+    # One entry per uploaded image, in upload (or archive) order
+    filenames: List[str]
+    results: List[DetectResponse]
 
 
 class ChatRequest(BaseModel):
     messages: List[Dict[str, Any]]
     context: Optional[Dict[str, Any]] = None
+    # "file": synthesize and store an MP3, "stream": link to /tts/stream, "none": text only
+    audio_mode: str = "file"
+    # Continue a server-side conversation (send only the new messages), or start one with session=True
+    session_id: Optional[str] = None
+    session: bool = False
+
+
+class TTSRequest(BaseModel):
+    text: str
 
 
 class ChatResponse(BaseModel):
     reply: str
     audio_url: Optional[str] = None
     context: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
+    # Token counts reported by the API, including prompt cache reads and writes
+    usage: Optional[Dict[str, int]] = None
+    # Set when the reply came from the local intent router instead of Claude
+    intent: Optional[str] = None
 
 
 class LoadPlanRequest(BaseModel):
@@ -33,6 +59,55 @@ class LoadPlanRequest(BaseModel):
     grid_height: int = 15
     boxes: List[Box]
     vehicle: Optional[Dict[str, Any]] = None
+    # "first_fit" (default, the original row-major scan) or "skyline" (faster on large grids,
+    # but may leave boxes unplaced that first_fit would fit)
+    strategy: str = "first_fit"
+    # Search box orderings and rotations for up to time_budget_ms instead of one greedy pass
+    optimize: bool = False
+    time_budget_ms: int = 300
+    allow_rotation: bool = True
+    seed: Optional[int] = None
+
+
+class PlanMetrics(BaseModel):
+    fill_ratio: float
+    filled_cells: int
+    total_cells: int
+    # Shared edges between filled cells, the same count that feeds the score
+    adjacency: int
+    adjacency_ratio: float
+    # Occupancy-weighted centroid in grid units, and its offset from the grid centre
+    center_of_mass: Optional[List[float]] = None
+    center_offset: Optional[List[float]] = None
+    # Share of each box's perimeter resting against another box or a wall
+    support: Dict[str, float] = {}
+    min_support: float = 0.0
+    mean_support: float = 0.0
+
+
+class Calibration(BaseModel):
+    """How image pixels relate to the cargo floor shown on the grid."""
+    # Pixel rectangle [x0, y0, x1, y1] covering the cargo floor; default is the whole image
+    roi: Optional[List[float]] = None
+    # 3x3 homography from image pixels to floor coordinates normalized to 0..1 (overrides roi)
+    homography: Optional[List[List[float]]] = None
+
+
+class TrajectoryPoint(BaseModel):
+    elapsed_ms: float
+    score: float
+    placed: int
+
+
+class OptimizationReport(BaseModel):
+    workers: int
+    evaluated: int
+    elapsed_ms: float
+    # The greedy plan the search started from
+    baseline_score: float
+    baseline_placed: int
+    # Every improvement of the best plan, in time order
+    trajectory: List[TrajectoryPoint]
 
 
 class LoadPlanResponse(BaseModel):
@@ -40,3 +115,134 @@ class LoadPlanResponse(BaseModel):
     score: float
     warnings: List[str]
     sequence: List[str]
+    metrics: Optional[PlanMetrics] = None
+    optimization: Optional[OptimizationReport] = None
+
+
+class VehicleCandidate(BaseModel):
+    name: str
+    grid_width: int
+    grid_height: int
+
+
+class LoadPlanBatchRequest(BaseModel):
+    """Either independent `plans`, or one `boxes` set tried against every entry in `vehicles`."""
+    plans: List[LoadPlanRequest] = []
+    boxes: Optional[List[Box]] = None
+    vehicles: List[VehicleCandidate] = []
+    strategy: str = "first_fit"
+    # Finish the stream with a ranking line, best plan first
+    rank: bool = False
+
+
+class BoxMove(BaseModel):
+    id: str
+    x: int
+    y: int
+    # Turn the box by 90 degrees as part of the move
+    rotate: bool = False
+
+
+class PlanEditRequest(BaseModel):
+    # Applied in this order: remove, move, add
+    remove: List[str] = []
+    move: List[BoxMove] = []
+    add: List[Box] = []
+
+
+class PlanSessionResponse(BaseModel):
+    session_id: str
+    version: int
+    plan: LoadPlanResponse
+
+
+class PlanDiff(BaseModel):
+    """What one edit changed; boxes not mentioned kept their placement."""
+    session_id: str
+    version: int
+    added: List[Box] = []
+    moved: List[Box] = []
+    removed: List[str] = []
+    # Every box currently waiting for space, not just the ones this edit affected
+    unplaced: List[str] = []
+    warnings: List[str] = []
+    score: float
+
+
+class Box3D(BaseModel):
+    """A carton; w runs across the vehicle (x), h along it (y) and d is its height (z)."""
+    id: str
+    w: int
+    h: int
+    d: int
+    weight: float = 0.0
+    label: str = "box"
+    # Fragile boxes go on top and carry nothing
+    fragile: bool = False
+    stackable: bool = True
+    # Heaviest load this box may carry on its top face, None for no limit
+    max_stack_weight: Optional[float] = None
+    # "fixed" keeps w/h/d as given, "upright" may turn it on the floor, "any" allows all six orientations
+    rotation: str = "upright"
+
+
+class Axle(BaseModel):
+    # Distance from the front wall of the cargo space, in the same unit as the vehicle length
+    position: float
+    max_load: float
+
+
+class Vehicle(BaseModel):
+    """Inner cargo dimensions (x = width, y = length, z = height) and load limits."""
+    name: Optional[str] = None
+    width: int
+    length: int
+    height: int
+    max_payload: Optional[float] = None
+    axles: List[Axle] = []
+
+
+class Placement3D(BaseModel):
+    id: str
+    x: int
+    y: int
+    z: int
+    w: int
+    h: int
+    d: int
+    weight: float = 0.0
+    label: str = "box"
+
+
+class AxleLoad(BaseModel):
+    position: float
+    load: float
+    max_load: float
+
+
+class LoadPlan3DRequest(BaseModel):
+    vehicle: Vehicle
+    boxes: List[Box3D]
+    # Share of a box's base that must rest on the floor or on boxes directly below
+    min_support: float = 0.75
+
+
+class LoadPlan3DResponse(BaseModel):
+    placements: List[Placement3D]
+    warnings: List[str]
+    sequence: List[str]
+    unplaced: List[str]
+    volume_utilization: float
+    total_weight: float
+    center_of_gravity: Optional[List[float]] = None
+    axle_loads: List[AxleLoad] = []
+
+
+class DetectPlanResponse(BaseModel):
+    detection: DetectResponse
+    # Detected boxes in grid cells, as handed to the planner
+    grid_boxes: List[Box]
+    plan: LoadPlanResponse
+    # Set when the request asked for an editable plan session
+    session_id: Optional[str] = None
+    timings: Optional[Dict[str, float]] = None
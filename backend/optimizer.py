@@ -0,0 +1,162 @@
+import asyncio
+import math
+import os
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from boxes import BoxArray
+from models import LoadPlanRequest, LoadPlanResponse, OptimizationReport, TrajectoryPoint
+from load_planner import area_order, build_response, grid_score, pack
+from packing import ENGINES
+import plan_pool
+from telemetry import span
+
+# Upper bound for time_budget_ms so one request cannot hold every worker for long
+PLAN_MAX_BUDGET_MS = int(os.getenv("PLAN_MAX_BUDGET_MS", "5000"))
+
+# Share of iterations that start over from a fresh randomized greedy order
+RESTART_RATE = 0.1
+# Initial annealing temperature, in units of "one more box placed"
+START_TEMPERATURE = 0.5
+
+
+def _evaluate(grid_w: int, grid_h: int, dims: List[Tuple[int, int]], strategy: str,
+              order: List[int], rotated: List[bool]) -> Tuple[float, int, float, List[int]]:
+    """Pack one candidate; fitness counts placed boxes first and uses the score to break ties."""
+    engine = ENGINES[strategy](grid_w, grid_h)
+    unplaced = []
+    for i in order:
+        w, h = dims[i]
+        if rotated[i]:
+            w, h = h, w
+        if engine.insert(w, h) is None:
+            unplaced.append(i)
+    placed = len(order) - len(unplaced)
+    score = grid_score(engine.occupied)
+    return placed + score, placed, score, unplaced
+
+
+def _random_start(dims: List[Tuple[int, int]], rng: random.Random, allow_rotation: bool) -> Tuple[List[int], List[bool]]:
+    # Area-descending with noise, so restarts stay close to the greedy order that usually works
+    noisy = [w * h * rng.uniform(0.7, 1.3) for w, h in dims]
+    order = sorted(range(len(dims)), key=lambda i: noisy[i], reverse=True)
+    rotated = [allow_rotation and rng.random() < 0.5 for _ in dims]
+    return order, rotated
+
+
+def _mutate(order: List[int], rotated: List[bool], unplaced: List[int], rng: random.Random,
+            allow_rotation: bool) -> Tuple[List[int], List[bool]]:
+    order, rotated = order[:], rotated[:]
+    move = rng.random()
+    if unplaced and move < 0.4:
+        # Pull a box that did not fit towards the front of the queue
+        i = rng.choice(unplaced)
+        order.remove(i)
+        order.insert(rng.randrange(len(order) + 1) // 2, i)
+    elif allow_rotation and move < 0.7:
+        i = rng.choice(unplaced) if unplaced and rng.random() < 0.5 else rng.randrange(len(rotated))
+        rotated[i] = not rotated[i]
+    elif len(order) > 1:
+        a, b = rng.sample(range(len(order)), 2)
+        order[a], order[b] = order[b], order[a]
+    return order, rotated
+
+
+def _search(grid_w: int, grid_h: int, dims: List[Tuple[int, int]], strategy: str, budget: float,
+            seed: int, allow_rotation: bool, from_greedy: bool) -> Dict[str, Any]:
+    """Simulated annealing over (order, rotation) with random restarts, until the budget runs out."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    deadline = started + budget
+
+    if from_greedy:
+        order = sorted(range(len(dims)), key=lambda i: dims[i][0] * dims[i][1], reverse=True)
+        rotated = [False] * len(dims)
+    else:
+        order, rotated = _random_start(dims, rng, allow_rotation)
+    fitness, placed, score, unplaced = _evaluate(grid_w, grid_h, dims, strategy, order, rotated)
+    current = (fitness, order, rotated, unplaced)
+    best = {"fitness": fitness, "placed": placed, "score": score, "order": order, "rotated": rotated}
+    trajectory = [(0.0, score, placed, fitness)]
+    evaluated = 1
+
+    while dims:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        if rng.random() < RESTART_RATE:
+            order, rotated = _random_start(dims, rng, allow_rotation)
+        else:
+            order, rotated = _mutate(current[1], current[2], current[3], rng, allow_rotation)
+        fitness, placed, score, unplaced = _evaluate(grid_w, grid_h, dims, strategy, order, rotated)
+        evaluated += 1
+
+        temperature = START_TEMPERATURE * (deadline - now) / budget + 1e-3
+        delta = fitness - current[0]
+        if delta >= 0 or rng.random() < math.exp(delta / temperature):
+            current = (fitness, order, rotated, unplaced)
+        if fitness > best["fitness"]:
+            best = {"fitness": fitness, "placed": placed, "score": score, "order": order, "rotated": rotated}
+            trajectory.append((round((time.perf_counter() - started) * 1000, 3), score, placed, fitness))
+
+    best["evaluated"] = evaluated
+    best["trajectory"] = trajectory
+    return best
+
+
+def _budget(time_budget_ms: int) -> float:
+    if time_budget_ms <= 0:
+        raise ValueError("time_budget_ms must be positive")
+    return min(time_budget_ms, PLAN_MAX_BUDGET_MS) / 1000
+
+
+async def optimize_plan(body: LoadPlanRequest) -> LoadPlanResponse:
+    """Search orderings and rotations across the worker pool and return the best plan found.
+
+    One worker starts from the greedy area-descending order, so the result is
+    never worse than plan_load; the others start from randomized orders.
+    """
+    budget = _budget(body.time_budget_ms)
+    boxes = BoxArray.from_boxes(body.boxes)
+    dims = [tuple(d) for d in boxes.xywh[:, 2:4].tolist()]
+    # Also validates the strategy before any work is handed out
+    baseline_engine, baseline, _ = pack(body.grid_width, body.grid_height, boxes.take(area_order(boxes)), body.strategy)
+    baseline_score = grid_score(baseline_engine.occupied)
+
+    seed = body.seed if body.seed is not None else random.randrange(2 ** 31)
+    workers = plan_pool.workers()
+    args = (body.grid_width, body.grid_height, dims, body.strategy, budget)
+    started = time.perf_counter()
+    with span("optimize"):
+        results = await asyncio.gather(*[
+            plan_pool.run(_search, *args, seed + k, body.allow_rotation, k == 0)
+            for k in range(workers)
+        ])
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    best = max(results, key=lambda r: r["fitness"])
+    order = np.array(best["order"], dtype=np.intp)
+    rotated = np.array(best["rotated"], dtype=bool)[order]
+    engine, placements, warnings = pack(body.grid_width, body.grid_height, boxes.take(order), body.strategy, rotated)
+    response = build_response(engine, placements, warnings)
+
+    # Merge the per-worker improvements into one best-so-far curve
+    trajectory: List[TrajectoryPoint] = []
+    best_fitness = -1.0
+    for elapsed, score, placed, fitness in sorted(p for r in results for p in r["trajectory"]):
+        if fitness > best_fitness:
+            best_fitness = fitness
+            trajectory.append(TrajectoryPoint(elapsed_ms=elapsed, score=score, placed=placed))
+
+    response.optimization = OptimizationReport(
+        workers=workers,
+        evaluated=sum(r["evaluated"] for r in results),
+        elapsed_ms=elapsed_ms,
+        baseline_score=baseline_score,
+        baseline_placed=len(baseline),
+        trajectory=trajectory,
+    )
+    return response
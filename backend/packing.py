@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+
+class PackingEngine:
+    """Places axis-aligned w x h rectangles on a grid_w x grid_h occupancy grid.
+
+    Engines keep the occupancy as a NumPy boolean array indexed [y, x] so the
+    planner can score the result with array ops once packing is done.
+    """
+
+    name = ""
+
+    def __init__(self, grid_w: int, grid_h: int):
+        self.grid_w = grid_w
+        self.grid_h = grid_h
+        self.occupied = np.zeros((max(grid_h, 0), max(grid_w, 0)), dtype=bool)
+
+    def find(self, w: int, h: int) -> Optional[Tuple[int, int]]:
+        raise NotImplementedError
+
+    def place(self, x: int, y: int, w: int, h: int):
+        if w > 0 and h > 0:
+            self.occupied[y:y + h, x:x + w] = True
+
+    def clear(self, x: int, y: int, w: int, h: int):
+        # Only FirstFitEngine searches the bitmap itself; skyline engines won't reuse freed cells
+        if w > 0 and h > 0:
+            self.occupied[y:y + h, x:x + w] = False
+
+    def is_free(self, x: int, y: int, w: int, h: int) -> bool:
+        if x < 0 or y < 0 or x + w > self.grid_w or y + h > self.grid_h:
+            return False
+        return not self.occupied[y:y + h, x:x + w].any()
+
+    def insert(self, w: int, h: int) -> Optional[Tuple[int, int]]:
+        pos = self.find(w, h)
+        if pos is not None:
+            self.place(pos[0], pos[1], w, h)
+        return pos
+
+    def _degenerate(self, w: int, h: int) -> Optional[Tuple[int, int]]:
+        # Zero-sized boxes cover no cells; the original scan accepted them at the origin
+        if 0 < self.grid_w and 0 < self.grid_h and w <= self.grid_w and h <= self.grid_h:
+            return (0, 0)
+        return None
+
+
+class FirstFitEngine(PackingEngine):
+    """Bitmap first-fit using a summed-area table for overlap checks.
+
+    Returns exactly the position the original row-major cell scan would pick:
+    the first (y, x) where the w x h window contains no occupied cell.
+    """
+
+    name = "first_fit"
+
+    def find(self, w: int, h: int) -> Optional[Tuple[int, int]]:
+        if w <= 0 or h <= 0:
+            return self._degenerate(w, h)
+        if w > self.grid_w or h > self.grid_h:
+            return None
+        sat = np.zeros((self.grid_h + 1, self.grid_w + 1), dtype=np.int32)
+        np.cumsum(self.occupied, axis=0, out=sat[1:, 1:])
+        np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+        window = sat[h:, w:] - sat[:-h, w:] - sat[h:, :-w] + sat[:-h, :-w]
+        free = window == 0
+        if not free.any():
+            return None
+        y, x = divmod(int(np.argmax(free)), free.shape[1])
+        return (x, y)
+
+
+class SkylineEngine(PackingEngine):
+    """Bottom-left skyline packing.
+
+    The free space is summarised by a list of [x, y, width] segments, one per
+    step of the filled profile, so a lookup costs O(segments) instead of
+    touching every grid cell. Gaps left under the skyline are not reused.
+    """
+
+    name = "skyline"
+
+    def __init__(self, grid_w: int, grid_h: int):
+        super().__init__(grid_w, grid_h)
+        self.skyline: List[List[int]] = [[0, 0, grid_w]] if grid_w > 0 else []
+
+    def _fit_y(self, i: int, w: int) -> int:
+        x = self.skyline[i][0]
+        right = x + w
+        y = 0
+        while i < len(self.skyline) and self.skyline[i][0] < right:
+            y = max(y, self.skyline[i][1])
+            i += 1
+        return y
+
+    def find(self, w: int, h: int) -> Optional[Tuple[int, int]]:
+        if w <= 0 or h <= 0:
+            return self._degenerate(w, h)
+        if w > self.grid_w or h > self.grid_h:
+            return None
+        best = None
+        for i, (x, _, _) in enumerate(self.skyline):
+            if x + w > self.grid_w:
+                break
+            y = self._fit_y(i, w)
+            if y + h > self.grid_h:
+                continue
+            if best is None or (y, x) < best:
+                best = (y, x)
+        if best is None:
+            return None
+        return (best[1], best[0])
+
+    def place(self, x: int, y: int, w: int, h: int):
+        if w <= 0 or h <= 0:
+            return
+        super().place(x, y, w, h)
+        right = x + w
+        updated: List[List[int]] = []
+        for sx, sy, sw in self.skyline:
+            end = sx + sw
+            if end <= x or sx >= right:
+                updated.append([sx, sy, sw])
+                continue
+            if sx < x:
+                updated.append([sx, sy, x - sx])
+            if end > right:
+                updated.append([right, sy, end - right])
+        updated.append([x, y + h, w])
+        updated.sort()
+        merged: List[List[int]] = []
+        for seg in updated:
+            if merged and merged[-1][1] == seg[1]:
+                merged[-1][2] += seg[2]
+            else:
+                merged.append(seg)
+        self.skyline = merged
+
+
+ENGINES: Dict[str, Type[PackingEngine]] = {
+    FirstFitEngine.name: FirstFitEngine,
+    SkylineEngine.name: SkylineEngine,
+}
+
+# Skyline is much faster on large grids but never reuses gaps under its profile, so on
+# small grids it can leave boxes unplaced that first-fit would fit
+DEFAULT_STRATEGY = FirstFitEngine.name
+
+
+def get_engine(strategy: str, grid_w: int, grid_h: int) -> PackingEngine:
+    try:
+        engine_cls = ENGINES[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown packing strategy '{strategy}', expected one of {sorted(ENGINES)}")
+    return engine_cls(grid_w, grid_h)
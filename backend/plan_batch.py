@@ -0,0 +1,84 @@
+import asyncio
+import json
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from models import LoadPlanBatchRequest, LoadPlanRequest
+from load_planner import plan_load
+import optimizer
+import plan_pool
+
+
+def expand(batch: LoadPlanBatchRequest) -> List[Tuple[Optional[str], LoadPlanRequest]]:
+    """The individual (vehicle name, request) jobs a batch stands for, in input order."""
+    jobs: List[Tuple[Optional[str], LoadPlanRequest]] = [(None, plan) for plan in batch.plans]
+    if batch.boxes is not None:
+        if not batch.vehicles:
+            raise ValueError("boxes needs at least one entry in vehicles")
+        for vehicle in batch.vehicles:
+            jobs.append((vehicle.name, LoadPlanRequest(
+                grid_width=vehicle.grid_width,
+                grid_height=vehicle.grid_height,
+                boxes=batch.boxes,
+                strategy=batch.strategy,
+            )))
+    if not jobs:
+        raise ValueError("Provide plans, or boxes with vehicles")
+    return jobs
+
+
+def _plan_encoded(body: LoadPlanRequest) -> Tuple[str, float, int, int]:
+    # Runs in a planner worker; encoding there keeps JSON work off the event loop too
+    plan = plan_load(body)
+    return plan.model_dump_json(), plan.score, len(plan.placements), len(plan.warnings)
+
+
+async def _plan(body: LoadPlanRequest) -> Tuple[str, float, int, int]:
+    if body.optimize:
+        # The optimizer spreads one request over every worker itself
+        plan = await optimizer.optimize_plan(body)
+        return plan.model_dump_json(), plan.score, len(plan.placements), len(plan.warnings)
+    return await plan_pool.run(_plan_encoded, body)
+
+
+async def stream_batch(jobs: List[Tuple[Optional[str], LoadPlanRequest]], rank: bool) -> AsyncIterator[str]:
+    """Yield one NDJSON line per plan as soon as it finishes, then the ranking if asked for.
+
+    Lines carry the job's index so clients can match them to the input.
+    """
+    async def run(index: int, vehicle: Optional[str], body: LoadPlanRequest):
+        try:
+            return index, vehicle, body, await _plan(body), None
+        except ValueError as e:
+            return index, vehicle, body, None, str(e)
+        except BrokenProcessPool:
+            # The response is already streaming, so report it on the job's line instead of a 503
+            return index, vehicle, body, None, "Planner worker crashed, please retry"
+
+    tasks = [asyncio.create_task(run(i, vehicle, body)) for i, (vehicle, body) in enumerate(jobs)]
+    finished: List[Dict] = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, vehicle, body, result, error = await next_done
+            if error is not None:
+                yield json.dumps({"index": index, "vehicle": vehicle, "error": error}) + "\n"
+                continue
+            encoded, score, placed, unplaced = result
+            # The plan is already JSON; splice it in rather than decoding and re-encoding
+            yield f'{{"index": {index}, "vehicle": {json.dumps(vehicle)}, "plan": {encoded}}}\n'
+            finished.append({
+                "index": index,
+                "vehicle": vehicle,
+                "score": score,
+                "placed": placed,
+                "unplaced": unplaced,
+                "cells": body.grid_width * body.grid_height,
+            })
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if rank:
+        # Fewest boxes left behind first, then best score, then the smallest vehicle
+        finished.sort(key=lambda r: (r["unplaced"], -r["score"], r["cells"], r["index"]))
+        yield json.dumps({"ranking": finished}) + "\n"
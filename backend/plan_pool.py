@@ -0,0 +1,68 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from telemetry import captured, replay
+
+# Processes for CPU-bound planning; 0 runs jobs on the event loop's default thread pool
+PLAN_WORKERS = int(os.getenv("PLAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+_PLAN_WORKERS_SET = "PLAN_WORKERS" in os.environ
+PLAN_START_METHOD = os.getenv("PLAN_START_METHOD", "spawn")
+
+_executor: Optional[Executor] = None
+
+
+def _noop():
+    return None
+
+
+def workers() -> int:
+    return max(1, PLAN_WORKERS)
+
+
+def share_cores(cores: int, servers: int):
+    """Size each server process's pool so `servers` of them together use at most `cores` planners.
+
+    An explicit PLAN_WORKERS is left alone. When there are as many servers as
+    cores, each one plans on its own thread pool instead.
+    """
+    global PLAN_WORKERS
+    if not _PLAN_WORKERS_SET and _executor is None:
+        PLAN_WORKERS = min(PLAN_WORKERS, cores // max(1, servers))
+
+
+def start():
+    """Spawn the planner workers up front so the first request doesn't pay for it."""
+    global _executor
+    if _executor is not None or PLAN_WORKERS <= 0:
+        return
+    _executor = ProcessPoolExecutor(
+        max_workers=PLAN_WORKERS,
+        mp_context=multiprocessing.get_context(PLAN_START_METHOD),
+    )
+    for _ in range(PLAN_WORKERS):
+        _executor.submit(_noop)
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=not wait)
+    _executor = None
+
+
+async def run(fn: Callable, *args) -> Any:
+    start()
+    loop = asyncio.get_running_loop()
+    try:
+        # Without a process pool _executor stays None, which means the loop's default thread pool
+        result, spans = await loop.run_in_executor(_executor, captured, fn, *args)
+    except BrokenProcessPool:
+        # A worker died; replace the pool so later requests can succeed
+        shutdown(wait=False)
+        raise
+    replay(spans)
+    return result
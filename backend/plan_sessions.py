@@ -0,0 +1,159 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from boxes import BoxArray
+from models import Box, LoadPlanRequest, LoadPlanResponse, PlanDiff, PlanEditRequest, PlanSessionResponse
+from load_planner import build_response, grid_score
+from packing import FirstFitEngine
+
+# Idle sessions are dropped after this many seconds, and the oldest beyond PLAN_SESSION_MAX
+PLAN_SESSION_TTL = float(os.getenv("PLAN_SESSION_TTL", "1800"))
+PLAN_SESSION_MAX = int(os.getenv("PLAN_SESSION_MAX", "256"))
+
+
+class PlanSession:
+    """A load plan kept on the server so edits only touch the boxes they name.
+
+    The occupancy grid survives between edits: removing or moving a box
+    clears just its cells, and new boxes are first-fit into the free space
+    that is left (one vectorized scan each) instead of replanning from an
+    empty grid. Boxes that don't fit wait in `pending` and are retried
+    whenever an edit frees space.
+    """
+
+    def __init__(self, session_id: str, grid_w: int, grid_h: int):
+        self.session_id = session_id
+        # First-fit searches the bitmap, so cells freed by removals are reused
+        self.engine = FirstFitEngine(grid_w, grid_h)
+        self.placements: Dict[str, Box] = {}
+        self.pending: Dict[str, Box] = {}
+        self.version = 0
+        self.touched = time.time()
+
+    @classmethod
+    def from_plan(cls, session_id: str, body: LoadPlanRequest, plan: LoadPlanResponse) -> "PlanSession":
+        session = cls(session_id, body.grid_width, body.grid_height)
+        for p in plan.placements:
+            session.engine.place(p.x, p.y, p.w, p.h)
+            session.placements[p.id] = p
+        placed = set(session.placements)
+        for b in sorted(body.boxes, key=lambda b: b.w * b.h, reverse=True):
+            if b.id not in placed:
+                session.pending[b.id] = b
+        return session
+
+    def plan(self) -> LoadPlanResponse:
+        warnings = [f"Could not place {box_id}, not enough space" for box_id in self.pending]
+        return build_response(self.engine, BoxArray.from_boxes(self.placements.values()), warnings)
+
+    def response(self) -> PlanSessionResponse:
+        return PlanSessionResponse(session_id=self.session_id, version=self.version, plan=self.plan())
+
+    def _validate(self, edit: PlanEditRequest):
+        known = set(self.placements) | set(self.pending)
+        for box_id in edit.remove:
+            if box_id not in known:
+                raise ValueError(f"Unknown box {box_id}")
+        removed = set(edit.remove)
+        for move in edit.move:
+            if move.id not in self.placements or move.id in removed:
+                raise ValueError(f"Box {move.id} is not placed")
+        remaining = known - removed
+        for b in edit.add:
+            if b.id in remaining:
+                raise ValueError(f"Box {b.id} already exists")
+            remaining.add(b.id)
+
+    def apply(self, edit: PlanEditRequest) -> PlanDiff:
+        """Remove, move, then add boxes; the whole edit is rejected if any id is invalid."""
+        self._validate(edit)
+        diff = PlanDiff(session_id=self.session_id, version=self.version, score=0.0)
+        freed = False
+
+        for box_id in edit.remove:
+            p = self.placements.pop(box_id, None)
+            if p is not None:
+                self.engine.clear(p.x, p.y, p.w, p.h)
+                freed = True
+            self.pending.pop(box_id, None)
+            diff.removed.append(box_id)
+
+        for move in edit.move:
+            p = self.placements[move.id]
+            w, h = (p.h, p.w) if move.rotate else (p.w, p.h)
+            self.engine.clear(p.x, p.y, p.w, p.h)
+            if self.engine.is_free(move.x, move.y, w, h):
+                moved = p.model_copy(update={"x": move.x, "y": move.y, "w": w, "h": h})
+                self.engine.place(moved.x, moved.y, w, h)
+                self.placements[move.id] = moved
+                diff.moved.append(moved)
+                freed = True
+            else:
+                self.engine.place(p.x, p.y, p.w, p.h)
+                diff.warnings.append(f"Could not move {move.id}, target is occupied or outside the grid")
+
+        # Waiting boxes get the freed space before new ones, largest first
+        waiting = sorted(self.pending.values(), key=lambda b: b.w * b.h, reverse=True) if freed else []
+        incoming = sorted(edit.add, key=lambda b: b.w * b.h, reverse=True)
+        for b in waiting + incoming:
+            pos = self.engine.insert(b.w, b.h)
+            if pos is None:
+                if b.id not in self.pending:
+                    self.pending[b.id] = b
+                    diff.warnings.append(f"Could not place {b.id}, not enough space")
+                continue
+            self.pending.pop(b.id, None)
+            placed = Box(id=b.id, x=pos[0], y=pos[1], w=b.w, h=b.h, label=b.label, confidence=b.confidence)
+            self.placements[b.id] = placed
+            diff.added.append(placed)
+
+        self.version += 1
+        diff.version = self.version
+        diff.unplaced = list(self.pending)
+        diff.score = grid_score(self.engine.occupied)
+        return diff
+
+
+class PlanSessionStore:
+    """In-memory sessions, evicted by idle time and count like the other server-side caches."""
+
+    def __init__(self, ttl_seconds: float = PLAN_SESSION_TTL, max_sessions: int = PLAN_SESSION_MAX):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, PlanSession]" = OrderedDict()
+
+    def create(self, body: LoadPlanRequest, plan: LoadPlanResponse) -> PlanSession:
+        self.cleanup()
+        session = PlanSession.from_plan(uuid.uuid4().hex, body, plan)
+        self._sessions[session.session_id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[PlanSession]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.touched > self.ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        session.touched = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def cleanup(self):
+        cutoff = time.time() - self.ttl_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.touched < cutoff]:
+            del self._sessions[session_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "max_sessions": self.max_sessions}
+
+
+plan_sessions = PlanSessionStore()
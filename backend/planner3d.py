@@ -0,0 +1,315 @@
+from itertools import permutations
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from models import AxleLoad, Box3D, LoadPlan3DRequest, LoadPlan3DResponse, Placement3D, Vehicle
+
+ROTATIONS = {
+    "fixed": [(0, 1, 2)],
+    "upright": [(0, 1, 2), (1, 0, 2)],
+    "any": list(permutations((0, 1, 2))),
+}
+
+# Extreme points are tested for support in chunks, and the supported ones for overlap in
+# smaller batches; most boxes find a spot in the first few
+_CHUNK = 64
+_PAIRS = 16
+
+
+class _Placed:
+    """Placed boxes as growable NumPy columns, so overlap checks are array ops."""
+
+    def __init__(self, capacity: int):
+        self.lo = np.zeros((capacity, 3), dtype=np.int64)
+        self.hi = np.zeros((capacity, 3), dtype=np.int64)
+        self.weight = np.zeros(capacity)
+        self.carried = np.zeros(capacity)
+        self.max_carry = np.zeros(capacity)
+        # Fragile and non-stackable boxes take nothing on top, whatever it weighs
+        self.no_stack = np.zeros(capacity, dtype=bool)
+        # For each box, the boxes under it and the share of its weight each one takes
+        self.supports: List[List[Tuple[int, float]]] = []
+        self.n = 0
+
+    def add(self, lo, hi, weight: float, max_carry: float, no_stack: bool, supports: List[Tuple[int, float]]):
+        i = self.n
+        self.lo[i] = lo
+        self.hi[i] = hi
+        self.weight[i] = weight
+        self.max_carry[i] = max_carry
+        self.no_stack[i] = no_stack
+        self.supports.append(supports)
+        self.n += 1
+        return i
+
+
+def _load_increments(placed: _Placed, supports: List[Tuple[int, float]], weight: float) -> Dict[int, float]:
+    """Extra load every box below receives when `weight` is set on `supports`."""
+    increments: Dict[int, float] = {}
+    stack = [(j, weight * share) for j, share in supports]
+    while stack:
+        j, load = stack.pop()
+        increments[j] = increments.get(j, 0.0) + load
+        stack.extend((k, load * share) for k, share in placed.supports[j])
+    return increments
+
+
+def _axle_loads(vehicle: Vehicle, total: float, moment: float) -> List[float]:
+    """Static axle loads for cargo weight `total` with first moment `moment` about the front wall.
+
+    Two or more axles are treated as a front axle plus a rear group at the
+    group's mean position sharing its load equally. Only cargo is counted, so
+    max_load should already exclude the vehicle's own weight on that axle.
+    """
+    axles = sorted(vehicle.axles, key=lambda a: a.position)
+    if not axles:
+        return []
+    if len(axles) == 1:
+        return [total]
+    front = axles[0].position
+    rear = [a.position for a in axles[1:]]
+    rear_pos = sum(rear) / len(rear)
+    span = rear_pos - front
+    rear_load = (moment - total * front) / span if span else total / 2
+    front_load = total - rear_load
+    return [front_load] + [rear_load / len(rear)] * len(rear)
+
+
+def _axles_ok(vehicle: Vehicle, total: float, moment: float) -> bool:
+    axles = sorted(vehicle.axles, key=lambda a: a.position)
+    return all(load <= a.max_load + 1e-9 for load, a in zip(_axle_loads(vehicle, total, moment), axles))
+
+
+def _top_area(points: np.ndarray, lo: np.ndarray, hi: np.ndarray, reach: np.ndarray) -> np.ndarray:
+    """Per point, the area of box tops level with it inside the largest footprint any carton can take there.
+
+    No carton can rest on more than this, so points whose area is below
+    min_support of a base can skip that base without any geometry. Floor
+    points hold anything.
+    """
+    x, y = points[:, 0, None], points[:, 1, None]
+    ox = np.minimum(hi[:, 0], x + reach[0]) - np.maximum(lo[:, 0], x)
+    oy = np.minimum(hi[:, 1], y + reach[1]) - np.maximum(lo[:, 1], y)
+    level = (hi[:, 2] == points[:, 2, None]) & (ox > 0) & (oy > 0)
+    area = np.where(level, ox * oy, 0).sum(axis=1).astype(np.float64)
+    area[points[:, 2] == 0] = np.inf
+    return area
+
+
+def _orientations(box: Box3D) -> List[Tuple[int, int, int]]:
+    try:
+        orders = ROTATIONS[box.rotation]
+    except KeyError:
+        raise ValueError(f"Unknown rotation '{box.rotation}' for {box.id}, expected one of {sorted(ROTATIONS)}")
+    dims = (box.w, box.h, box.d)
+    return list(dict.fromkeys(tuple(dims[i] for i in order) for order in orders))
+
+
+def plan_load_3d(body: LoadPlan3DRequest) -> LoadPlan3DResponse:
+    """Extreme-point heuristic for loading cartons into a vehicle.
+
+    Boxes are placed largest first (fragile and non-stackable ones last, so
+    they end up on top) at the extreme point closest to the front wall, then
+    lowest, then leftmost. A position must be inside the vehicle, clear of
+    other boxes, rest at least `min_support` of its base on the floor or on
+    box tops at the same height, and keep stacking, payload and axle limits.
+    """
+    vehicle = body.vehicle
+    size = np.array([vehicle.width, vehicle.length, vehicle.height], dtype=np.int64)
+    boxes = sorted(
+        body.boxes,
+        key=lambda b: (b.fragile or not b.stackable, -(b.w * b.h * b.d), -b.weight),
+    )
+
+    if not boxes:
+        return _summarize(vehicle, [], [], [])
+    # Smallest extent any carton can take along each axis, used to retire useless points
+    smallest = np.min([np.min(_orientations(b), axis=0) for b in boxes], axis=0)
+    # And the largest, bounding the footprint that can rest on any point
+    largest = np.max([np.max(_orientations(b), axis=0) for b in boxes], axis=0)
+
+    placed = _Placed(len(boxes))
+    # Candidate corners as (x, y, z) rows, kept in wall-building order: front to back,
+    # then bottom to top, then left to right
+    eps = np.zeros((1, 3), dtype=np.int64)
+    # Per point, the smallest dimensions already seen to collide there. Space only fills
+    # up, so any box at least that large in every axis can skip the point.
+    limits = np.tile(size + 1, (1, 1))
+    # Per point, the top area that could hold a carton there (see _top_area)
+    support = np.full(1, np.inf)
+    total_weight = 0.0
+    moment_y = 0.0
+    placements: List[Placement3D] = []
+    warnings: List[str] = []
+    unplaced: List[str] = []
+
+    for box in boxes:
+        if vehicle.max_payload is not None and total_weight + box.weight > vehicle.max_payload:
+            unplaced.append(box.id)
+            warnings.append(f"Could not place {box.id}, payload limit reached")
+            continue
+
+        rejected: Set[str] = set()
+        best = _find_position(placed, eps, limits, support, np.array(_orientations(box), dtype=np.int64), size, box,
+                              body.min_support, vehicle, total_weight, moment_y, rejected)
+        if best is None:
+            unplaced.append(box.id)
+            reason = " and ".join(sorted(rejected)) + " limit reached" if rejected else "not enough space"
+            warnings.append(f"Could not place {box.id}, {reason}")
+            continue
+
+        pos, supports, increments, dims = best
+        lo = np.array(pos, dtype=np.int64)
+        hi = lo + np.array(dims, dtype=np.int64)
+        no_stack = box.fragile or not box.stackable
+        max_carry = 0.0 if no_stack else (
+            box.max_stack_weight if box.max_stack_weight is not None else np.inf)
+        for j, load in increments.items():
+            placed.carried[j] += load
+        placed.add(lo, hi, box.weight, max_carry, no_stack, supports)
+        total_weight += box.weight
+        moment_y += box.weight * (lo[1] + dims[1] / 2)
+
+        # A point is dead once not even the smallest carton fits there. Old points only
+        # need checking against the new box; new corners against everything placed.
+        dead = np.all((eps < hi) & (eps + smallest > lo), axis=1)
+        corners = np.array([[hi[0], lo[1], lo[2]], [lo[0], hi[1], lo[2]], [lo[0], lo[1], hi[2]]], dtype=np.int64)
+        n = placed.n
+        # Drop the side corners onto whatever is below them, so points don't float in the air
+        if lo[2] > 0:
+            side = corners[:2, None, :]
+            under = np.all((placed.lo[:n, :2] <= side[..., :2]) & (placed.hi[:n, :2] > side[..., :2]), axis=2) \
+                & (placed.hi[:n, 2] <= side[..., 2])
+            corners[:2, 2] = np.where(under, placed.hi[:n, 2], 0).max(axis=1)
+        blocked = np.all((corners[:, None, :] < placed.hi[None, :n]) & (corners[:, None, :] + smallest > placed.lo[None, :n]), axis=2)
+        corners = corners[~blocked.any(axis=1) & np.all(corners + smallest <= size, axis=1)]
+        # Tops only grow where a box lands, so surviving points just add the new box's top
+        eps, support = eps[~dead], support[~dead]
+        support += _top_area(eps, lo[None], hi[None], largest)
+        eps = np.vstack([eps, corners])
+        limits = np.concatenate([limits[~dead], np.broadcast_to(size + 1, (len(corners), 3))])
+        support = np.concatenate([support, _top_area(corners, placed.lo[:n], placed.hi[:n], largest)])
+        order = np.lexsort((eps[:, 0], eps[:, 2], eps[:, 1]))
+        eps, limits, support = eps[order], limits[order], support[order]
+        fresh = np.ones(len(eps), dtype=bool)
+        fresh[1:] = np.any(eps[1:] != eps[:-1], axis=1)
+        eps, limits, support = eps[fresh], limits[fresh], support[fresh]
+
+        placements.append(Placement3D(
+            id=box.id, x=int(lo[0]), y=int(lo[1]), z=int(lo[2]),
+            w=int(dims[0]), h=int(dims[1]), d=int(dims[2]),
+            weight=box.weight, label=box.label,
+        ))
+
+    return _summarize(vehicle, placements, warnings, unplaced)
+
+
+def _find_position(placed: _Placed, eps: np.ndarray, limits: np.ndarray, support: np.ndarray, orientations: np.ndarray,
+                   size: np.ndarray, box: Box3D, min_support: float, vehicle: Vehicle, total_weight: float, moment_y: float,
+                   rejected: Set[str]):
+    """First valid (position, supports, load increments, dims) over every orientation, or None.
+
+    Points are already in placement order, so scanning them once and trying
+    each orientation at a point gives the same answer as searching each
+    orientation separately and keeping the earliest, at a fraction of the cost.
+    """
+    base_area = (orientations[:, 0] * orientations[:, 1]).astype(np.float64)
+    # Point x orientation pairs inside the vehicle, not already known to collide and with
+    # enough top area around to be supported
+    fits = np.all(eps[:, None, :] + orientations <= size, axis=2) & \
+        ~np.all(orientations >= limits[:, None, :], axis=2) & (support[:, None] >= min_support * base_area)
+    index = np.nonzero(fits.any(axis=1))[0]
+    n = placed.n
+    lo, hi = placed.lo[:n], placed.hi[:n]
+    reach = orientations.max(axis=0)
+
+    for start in range(0, len(index), _CHUNK):
+        rows = index[start:start + _CHUNK]
+        chunk, allowed = eps[rows], fits[rows]
+        raised = chunk[:, 2] > 0
+        supported = allowed & ~raised[:, None]
+
+        # Support first: most raised points are corners over a gap or a small top, and only the
+        # few boxes whose top is at one of the chunk's heights can hold anything up
+        shares = tops = None
+        ci, ki = np.nonzero(allowed & raised[:, None])
+        if len(ci):
+            tops = np.nonzero((hi[:, 2, None] == chunk[raised, 2]).any(axis=1)
+                              & np.all(hi[:, :2] > chunk[:, :2].min(axis=0), axis=1)
+                              & np.all(lo[:, :2] < chunk[:, :2].max(axis=0) + reach[:2], axis=1))[0]
+            top_lo, top_hi = lo[tops], hi[tops]
+            x, y = chunk[ci, 0, None], chunk[ci, 1, None]
+            ox = np.minimum(top_hi[:, 0], x + orientations[ki, 0, None]) - np.maximum(top_lo[:, 0], x)
+            oy = np.minimum(top_hi[:, 1], y + orientations[ki, 1, None]) - np.maximum(top_lo[:, 1], y)
+            area = np.where((top_hi[:, 2] == chunk[ci, 2, None]) & (ox > 0) & (oy > 0), ox * oy, 0).astype(np.float64)
+            ok = area.sum(axis=1) >= min_support * base_area[ki]
+            supported[ci[ok], ki[ok]] = True
+            shares = np.zeros((len(chunk), len(orientations), len(tops)))
+            shares[ci, ki] = area
+
+        # Then overlap, a few supported pairs at a time in placement order (row-major, so the
+        # earliest point wins and, at a point, the first orientation), against the boxes around them
+        si, sk = np.nonzero(supported)
+        for at in range(0, len(si), _PAIRS):
+            pi, pk = si[at:at + _PAIRS], sk[at:at + _PAIRS]
+            corner, far = chunk[pi], chunk[pi] + orientations[pk]
+            near = np.nonzero(np.all(hi > corner.min(axis=0), axis=1) & np.all(lo < far.max(axis=0), axis=1))[0]
+            overlap = np.all((corner[:, None, :] < hi[near]) & (far[:, None, :] > lo[near]), axis=2).any(axis=1)
+            # Space only fills up, so a collision here rules these dimensions out for good
+            limits[rows[pi[overlap]]] = orientations[pk[overlap]]
+
+            for i, k in zip(pi[~overlap], pk[~overlap]):
+                pos, dims = chunk[i], orientations[k]
+                supports: List[Tuple[int, float]] = []
+                if pos[2] > 0:
+                    area = shares[i, k]
+                    below = np.nonzero(area)[0]
+                    supports = [(int(tops[j]), float(area[j] / area.sum())) for j in below]
+                    if placed.no_stack[tops[below]].any():
+                        rejected.add("stacking")
+                        continue
+
+                increments = _load_increments(placed, supports, box.weight)
+                if any(placed.carried[j] + load > placed.max_carry[j] + 1e-9 for j, load in increments.items()):
+                    rejected.add("stacking")
+                    continue
+                if vehicle.axles and not _axles_ok(vehicle, total_weight + box.weight,
+                                                   moment_y + box.weight * (pos[1] + dims[1] / 2)):
+                    rejected.add("axle load")
+                    continue
+                return (tuple(int(v) for v in pos), supports, increments, tuple(int(v) for v in dims))
+    return None
+
+
+def _summarize(vehicle: Vehicle, placements: List[Placement3D], warnings: List[str],
+               unplaced: List[str]) -> LoadPlan3DResponse:
+    capacity = float(vehicle.width) * vehicle.length * vehicle.height
+    volumes = np.array([p.w * p.h * p.d for p in placements], dtype=np.float64)
+    weights = np.array([p.weight for p in placements], dtype=np.float64)
+    total_weight = float(weights.sum())
+
+    center_of_gravity: Optional[List[float]] = None
+    if placements:
+        centers = np.array([[p.x + p.w / 2, p.y + p.h / 2, p.z + p.d / 2] for p in placements])
+        # Without weights, fall back to a uniform density
+        mass = weights if total_weight > 0 else volumes
+        center_of_gravity = [round(float(v), 2) for v in (centers * mass[:, None]).sum(axis=0) / mass.sum()]
+
+    axle_loads: List[AxleLoad] = []
+    if vehicle.axles:
+        moment = sum(p.weight * (p.y + p.h / 2) for p in placements)
+        axles = sorted(vehicle.axles, key=lambda a: a.position)
+        for axle, load in zip(axles, _axle_loads(vehicle, total_weight, moment)):
+            axle_loads.append(AxleLoad(position=axle.position, load=round(load, 2), max_load=axle.max_load))
+
+    return LoadPlan3DResponse(
+        placements=placements,
+        warnings=warnings,
+        sequence=[p.id for p in placements],
+        unplaced=unplaced,
+        volume_utilization=round(float(volumes.sum()) / capacity, 4) if capacity else 0.0,
+        total_weight=round(total_weight, 2),
+        center_of_gravity=center_of_gravity,
+        axle_loads=axle_loads,
+    )
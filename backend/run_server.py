@@ -1,5 +1,193 @@
 #!/usr/bin/env python3
+"""Start the backend.
+
+    python run_server.py                 # development: one process with auto-reload
+    python run_server.py --prod          # production: one worker, no auto-reload
+    python run_server.py --prod --workers 4 --port 8080
+
+In --prod mode the app is imported and the detection weights are loaded once
+in the parent, which then forks the workers, so they share the read-only
+weights copy-on-write instead of each holding a private copy. uvloop and
+httptools are used when installed. SIGTERM/SIGINT stop the workers
+gracefully: they stop accepting connections, finish in-flight requests, then
+drain queued detections and speech synthesis before exiting.
+
+Workers accept connections as soon as `main` is imported and warm their
+subsystems in the background; point the load balancer's readiness check at
+/ready (and liveness at /health). READY_SUBSYSTEMS=planning gives a worker
+that serves only /load-plan and never imports OpenCV or the LLM SDKs. By
+default chat and tts are required only when their API key is set; their
+checks call the upstream's model list, and a subsystem that fails to warm is
+retried with backoff (READY_RETRY_SECONDS).
+
+Chat sessions, plan sessions, /tts/stream tokens and the detection
+micro-batch queue live in each worker's memory. With more than one worker a
+follow-up request usually lands on another worker and gets a 404, so --prod
+defaults to a single worker. Only raise --workers (or WEB_CONCURRENCY) behind
+a load balancer with sticky sessions, or when clients use only the stateless
+endpoints (/detect, /load-plan, /load-plan/3d, /chat without a session).
+The planner process pool is split between workers so they never run more
+planners than there are cores.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
 import uvicorn
 
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+# Worker processes for --prod; 0 means one per core this process may run on. Sessions and
+# stream tokens are per-process, so more than one needs sticky routing (see above).
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Seconds workers get to finish in-flight requests before connections are dropped
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Extra time on top of GRACEFUL_TIMEOUT (shutdown hooks drain jobs) before a worker is killed
+KILL_TIMEOUT = GRACEFUL_TIMEOUT + float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "20")) + 5
+
+
+def available_cores() -> int:
+    try:
+        # Honours CPU pinning and container cpusets, unlike os.cpu_count()
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    return WEB_CONCURRENCY if WEB_CONCURRENCY > 0 else available_cores()
+
+
+def _installed(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def server_config(app) -> uvicorn.Config:
+    return uvicorn.Config(
+        app,
+        loop="uvloop" if _installed("uvloop") else "asyncio",
+        http="httptools" if _installed("httptools") else "h11",
+        lifespan="on",
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        proxy_headers=True,
+        # Every request is already logged as JSON by the telemetry middleware
+        access_log=False,
+    )
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _preload(workers: int):
+    import main
+    import plan_pool
+    from detect_pool import pool
+    from model_registry import registry
+    from telemetry import log
+
+    # Detection worker processes load their own copy, so there is nothing to share then
+    if main.PRELOAD_MODEL and pool.workers == 0:
+        # No warm-up here: inference threads must not exist before fork; each worker warms up on startup
+        entry = registry.load(warmup=False)
+        log("model_preloaded", loaded=entry is not None, status=registry.status())
+    plan_pool.share_cores(available_cores(), workers)
+    return main.app
+
+
+def serve_prod(host: str, port: int, workers: int):
+    import plan_pool
+    from telemetry import log, log_error
+
+    app = _preload(workers)
+    sock = _bind(host, port)
+    if workers > 1:
+        log("in_memory_state", level=logging.WARNING, workers=workers,
+            detail="chat/plan sessions and /tts/stream tokens are per worker; route clients stickily")
+    log("server_starting", host=host, port=port, workers=workers, plan_workers=plan_pool.PLAN_WORKERS,
+        loop="uvloop" if _installed("uvloop") else "asyncio", http="httptools" if _installed("httptools") else "h11")
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        uvicorn.Server(server_config(app)).run(sockets=[sock])
+        return
+
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # Own process group, so a terminal Ctrl-C reaches only the parent, which stops workers once
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                uvicorn.Server(server_config(app)).run(sockets=[sock])
+            except BaseException as e:
+                log_error("worker_crashed", error=str(e))
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    stopping = None
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping is None:
+            stopping = time.monotonic()
+            log("server_stopping", signal=signal.Signals(signum).name, workers=len(children))
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping is not None and time.monotonic() - stopping > KILL_TIMEOUT:
+                for child in children:
+                    os.kill(child, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+        children.discard(pid)
+        if stopping is None:
+            # Keep the pool at full size if a worker dies (e.g. OOM killed)
+            log_error("worker_exited", pid=pid, exit_code=os.waitstatus_to_exitcode(status))
+            spawn()
+    sock.close()
+    log("server_stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prod", action="store_true", help="pre-forked workers without auto-reload")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="worker processes for --prod")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.prod:
+        serve_prod(args.host, args.port, args.workers)
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Lazy imports of heavy dependencies and readiness of the app's subsystems.
+
+    cv2 = lazy_import("cv2")          # imported on the first cv2.<attr>, timed
+
+OpenCV, Pillow and the Anthropic and ElevenLabs SDKs are bound lazily, and
+the detection backends import theirs in load(), so importing `main` costs
+about what FastAPI costs and a worker pays only for the subsystems it uses.
+After startup, `readiness.warm()` warms the subsystems listed in
+READY_SUBSYSTEMS in the background and keeps retrying any that fail, with
+backoff; /ready answers 503 until they are all warm, while /health stays a
+plain liveness check.
+"""
+import asyncio
+import importlib
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from telemetry import log, log_error
+
+
+def default_subsystems() -> List[str]:
+    # Chat and speech are only required when their API key is set; without one the app still
+    # serves planning and detection, and chat answers that it is not configured
+    names = ["planning", "detection"]
+    if os.getenv("ANTHROPIC_API_KEY"):
+        names.append("chat")
+    if os.getenv("ELEVENLABS_API_KEY"):
+        names.append("tts")
+    return names
+
+
+# Subsystems warmed after startup; /ready reports 503 until every one of them is warm
+READY_SUBSYSTEMS = [s.strip() for s in os.getenv("READY_SUBSYSTEMS", ",".join(default_subsystems())).split(",")
+                    if s.strip()]
+# Seconds before a subsystem that failed to warm is tried again, doubling up to READY_RETRY_MAX_SECONDS; 0 never retries
+READY_RETRY_SECONDS = float(os.getenv("READY_RETRY_SECONDS", "5"))
+READY_RETRY_MAX_SECONDS = float(os.getenv("READY_RETRY_MAX_SECONDS", "300"))
+
+_STARTED = time.monotonic()
+# Seconds each lazily bound module took to import, in the order they were first used
+_import_seconds: Dict[str, float] = {}
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        # Only reached for names not set in __init__, i.e. the real module's attributes
+        if self._module is None:
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            _import_seconds.setdefault(self._name, time.perf_counter() - start)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r} ({'loaded' if self._module is not None else 'not loaded'})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def import_report() -> Dict[str, Any]:
+    """Import cost of the lazily bound modules so far, and which heavy packages this process has loaded."""
+    heavy = ("cv2", "PIL", "anthropic", "elevenlabs", "httpx", "ultralytics", "torch", "onnxruntime", "numpy")
+    return {
+        "lazy_imports_ms": {name: round(s * 1000, 1) for name, s in _import_seconds.items()},
+        "loaded": [name for name in heavy if name in sys.modules],
+    }
+
+
+Warmer = Callable[[], Union[None, Awaitable[None]]]
+
+
+class Readiness:
+    """Which subsystems are warm; drives /ready.
+
+    Each subsystem registers a warmer, a plain function (run in a thread) or a
+    coroutine function. warm() runs the ones in `required` concurrently and
+    records how long each took, so the startup report shows where time went.
+    A warmer that raises is tried again after a backoff, so a transient
+    upstream error does not keep /ready at 503 until the process restarts.
+    """
+
+    def __init__(self, required: Optional[List[str]] = None, retry_seconds: Optional[float] = None,
+                 retry_max_seconds: Optional[float] = None):
+        self.required = list(READY_SUBSYSTEMS if required is None else required)
+        self.retry_seconds = READY_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self.retry_max_seconds = READY_RETRY_MAX_SECONDS if retry_max_seconds is None else retry_max_seconds
+        self._warmers: Dict[str, Warmer] = {}
+        self.subsystems: Dict[str, Dict[str, Any]] = {}
+        self.ready_after: Optional[float] = None
+
+    def register(self, name: str, warmer: Warmer):
+        self._warmers[name] = warmer
+
+    async def _warm_one(self, name: str) -> bool:
+        warmer = self._warmers.get(name)
+        attempts = self.subsystems.get(name, {}).get("attempts", 0) + 1
+        state = self.subsystems[name] = {"state": "warming", "attempts": attempts}
+        if warmer is None:
+            state.update(state="failed", error="unknown subsystem")
+            log_error("warmup_error", subsystem=name, error=state["error"])
+            return False
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(warmer):
+                await warmer()
+            else:
+                await asyncio.to_thread(warmer)
+        except Exception as e:
+            state.update(state="failed", error=str(e))
+            log_error("warmup_error", subsystem=name, error=str(e), attempts=attempts)
+        else:
+            state["state"] = "warm"
+        state["seconds"] = round(time.perf_counter() - start, 3)
+        return state["state"] == "warm"
+
+    async def warm(self):
+        warmed = await asyncio.gather(*(self._warm_one(name) for name in self.required))
+        if self.ready:
+            self.ready_after = time.monotonic() - _STARTED
+        log("startup_report", **self.report())
+
+        # An unknown name will never warm, so only registered subsystems are retried
+        failed = [name for name, ok in zip(self.required, warmed) if not ok and name in self._warmers]
+        delay = self.retry_seconds
+        while failed and delay > 0:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max_seconds)
+            warmed = await asyncio.gather(*(self._warm_one(name) for name in failed))
+            failed = [name for name, ok in zip(failed, warmed) if not ok]
+            if self.ready:
+                self.ready_after = time.monotonic() - _STARTED
+                log("startup_report", **self.report())
+
+    @property
+    def ready(self) -> bool:
+        return all(self.subsystems.get(name, {}).get("state") == "warm" for name in self.required)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "required": self.required,
+            "subsystems": {name: dict(self.subsystems.get(name, {"state": "cold"})) for name in self.required},
+            # From the first backend import to the moment every required subsystem was warm
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            **import_report(),
+        }
+
+
+readiness = Readiness()
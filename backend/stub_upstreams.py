@@ -0,0 +1,135 @@
+"""Local stand-ins for the Anthropic and ElevenLabs HTTP APIs.
+
+Used by the chat tests and benchmarks so /chat can be exercised without
+network access or API keys:
+
+    server = StubUpstream(reply="Hello there. How can I help?").start()
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    os.environ["ELEVENLABS_BASE_URL"] = server.url
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+
+class StubUpstream:
+    def __init__(self, reply: str = "I can see 5 boxes. They fit in two rows.", audio: bytes = b"ID3stub-mp3",
+                 llm_delay: float = 0.0, tts_delay: float = 0.0, token_delay: float = 0.0):
+        self.reply = reply
+        self.audio = audio
+        self.llm_delay = llm_delay
+        self.tts_delay = tts_delay
+        self.token_delay = token_delay
+        self.requests: List[dict] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubUpstream":
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append({"path": self.path, "body": None})
+                if self.path.startswith("/v1/models"):
+                    stub._models(self)
+                else:
+                    self.send_response(404)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub.requests.append({"path": self.path, "body": body})
+                if self.path.startswith("/v1/messages"):
+                    stub._messages(self, body)
+                elif self.path.startswith("/v1/text-to-speech/"):
+                    stub._tts(self, body)
+                else:
+                    self.send_response(404)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _models(self, handler: BaseHTTPRequestHandler):
+        # Both APIs serve /v1/models; ElevenLabs (xi-api-key) returns a bare list, Anthropic a page
+        if handler.headers.get("xi-api-key"):
+            models = [{"model_id": "eleven_turbo_v2_5", "name": "Stub"}]
+        else:
+            models = {"data": [{"type": "model", "id": "stub", "display_name": "Stub", "created_at": "2024-01-01T00:00:00Z"}],
+                      "has_more": False, "first_id": "stub", "last_id": "stub"}
+        payload = json.dumps(models).encode()
+        handler.send_response(200)
+        handler.send_header("content-type", "application/json")
+        handler.send_header("content-length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _message(self, content: list, body: dict) -> dict:
+        # Roughly four characters per token, so tests can see how prompt size grows
+        prompt = json.dumps({"system": body.get("system"), "messages": body.get("messages")})
+        return {
+            "id": "msg_stub", "type": "message", "role": "assistant", "model": "stub",
+            "content": content, "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(self.reply.split())},
+        }
+
+    def _messages(self, handler: BaseHTTPRequestHandler, body: dict):
+        time.sleep(self.llm_delay)
+        if not body.get("stream"):
+            payload = json.dumps(self._message([{"type": "text", "text": self.reply}], body)).encode()
+            handler.send_response(200)
+            handler.send_header("content-type", "application/json")
+            handler.send_header("content-length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+
+        handler.send_response(200)
+        handler.send_header("content-type", "text/event-stream")
+        handler.send_header("connection", "close")
+        handler.end_headers()
+
+        def send(event: str, data: dict):
+            handler.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+            handler.wfile.flush()
+
+        send("message_start", {"type": "message_start", "message": self._message([], body)})
+        send("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for word in self.reply.split(" "):
+            time.sleep(self.token_delay)
+            send("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                         "delta": {"type": "text_delta", "text": word + " "}})
+        send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        send("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                               "usage": {"output_tokens": len(self.reply.split())}})
+        send("message_stop", {"type": "message_stop"})
+        handler.close_connection = True
+
+    def _tts(self, handler: BaseHTTPRequestHandler, body: dict):
+        time.sleep(self.tts_delay)
+        handler.send_response(200)
+        handler.send_header("content-type", "audio/mpeg")
+        handler.send_header("content-length", str(len(self.audio)))
+        handler.end_headers()
+        handler.wfile.write(self.audio)
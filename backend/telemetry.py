@@ -0,0 +1,296 @@
+"""Stage timings, request IDs, structured logs and an opt-in sampling profiler.
+
+    with span("llm"):
+        response = await client.messages.create(...)
+
+Every span is recorded in a process-wide histogram, exported by /metrics in
+the Prometheus text format, and added to the current request's trace, which
+RequestTelemetry logs as one JSON line when the request finishes. Work that
+runs in a detection or planner worker is wrapped in `captured()`, which
+returns the worker's spans so the caller can `replay()` them into its own
+histograms and request trace.
+"""
+import collections
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; stages range from sub-millisecond scoring to multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Per-request profiling is only honoured when this is set, since it slows the whole process down
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "0") != "0"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("trace", default=None)
+# Spans recorded while a worker job runs, shipped back to the caller instead of recorded here
+_capture = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values, like a Prometheus client histogram."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            # Per-bucket counts, then sum and count
+            series = self._series.setdefault(label_values, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, v[:]) for k, v in self._series.items())
+        for label_values, values in series:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            sep = "," if labels else ""
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative:g}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {values[-1]:g}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {values[-1]:g}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0.0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, value in series:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value:g}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+stage_seconds = Histogram("logithon_stage_duration_seconds", "Time spent in one processing stage.", ["stage"])
+request_seconds = Histogram("logithon_http_request_duration_seconds", "HTTP request latency until the last body byte.",
+                            ["method", "route", "status"])
+chat_answers = Counter("logithon_chat_answers_total", "Chat replies by who produced them.", ["source", "intent"])
+
+
+def observe(stage: str, seconds: float):
+    buffer = getattr(_capture, "spans", None)
+    if buffer is not None:
+        buffer.append((stage, seconds))
+        return
+    stage_seconds.observe(seconds, stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def captured(fn: Callable, *args) -> Tuple[Any, List[Tuple[str, float]]]:
+    """Run `fn` and return (result, spans) instead of recording the spans in this process."""
+    _capture.spans = []
+    try:
+        return fn(*args), _capture.spans
+    finally:
+        _capture.spans = None
+
+
+def replay(spans: List[Tuple[str, float]]):
+    for stage, seconds in spans:
+        observe(stage, seconds)
+
+
+@contextmanager
+def collecting():
+    """Collect the spans recorded inside the block, e.g. to hand them to every request a batch served."""
+    spans: List[Tuple[str, float]] = []
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+def add_to_trace(spans: List[Tuple[str, float]]):
+    """Attach spans that were already counted in the histograms to the current request."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.extend(spans)
+
+
+def request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def metrics_text() -> str:
+    return "\n".join(stage_seconds.expose() + request_seconds.expose() + chat_answers.expose()) + "\n"
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 3), "level": record.levelname.lower(), "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+logger = logging.getLogger("logithon")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(_JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def log(event: str, level: int = logging.INFO, **fields):
+    """One JSON line on stderr, tagged with the current request ID when there is one."""
+    rid = _request_id.get()
+    if rid is not None:
+        fields.setdefault("request_id", rid)
+    logger.log(level, event, extra={"fields": fields})
+
+
+def log_error(event: str, **fields):
+    log(event, logging.ERROR, **fields)
+
+
+class _Sampler:
+    """Samples every thread's stack at a fixed interval into collapsed-stack counts.
+
+    The output is one `frame;frame;frame count` line per distinct stack, the
+    format flamegraph.pl and speedscope read.
+    """
+
+    # Leaf frames of threads that are only waiting for work
+    _IDLE = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.counts: "collections.Counter[str]" = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me or frame.f_code.co_filename.endswith(self._IDLE):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                self.counts[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+
+    def start(self) -> "_Sampler":
+        self._thread.start()
+        return self
+
+    def stop(self, path: str):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestTelemetry:
+    """ASGI middleware: request IDs, the request latency histogram and one log line per request.
+
+    The ID comes from an incoming X-Request-ID header or is generated, and is
+    echoed on the response. With PROFILE_REQUESTS enabled, a request sent with
+    `X-Profile: 1` is sampled and its profile written to PROFILE_DIR.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        rid = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        rid_token = _request_id.set(rid)
+        trace: List[Tuple[str, float]] = []
+        trace_token = _trace.set(trace)
+        sampler = _Sampler().start() if PROFILE_REQUESTS and headers.get(b"x-profile") == b"1" else None
+        profile_path = os.path.join(PROFILE_DIR, f"{rid}.collapsed") if sampler else None
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = [(b"x-request-id", rid.encode("latin-1"))]
+                if profile_path:
+                    extra.append((b"x-profile", profile_path.encode("latin-1")))
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            if sampler:
+                sampler.stop(profile_path)
+            # The route template keeps the label set bounded (no session IDs in it)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_seconds.observe(elapsed, scope["method"], route, str(status))
+            stages: Dict[str, float] = {}
+            for stage, seconds in trace:
+                stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 3)
+            log("request", method=scope["method"], path=scope["path"], route=route, status=status,
+                duration_ms=round(elapsed * 1000, 3), stages=stages)
+            _trace.reset(trace_token)
+            _request_id.reset(rid_token)
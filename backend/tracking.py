@@ -0,0 +1,139 @@
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+from boxes import BoxArray
+
+# Minimum IoU for a detection to continue an existing track
+TRACK_IOU = float(os.getenv("TRACK_IOU", "0.3"))
+# Detection rounds a track may go unmatched before it is dropped
+TRACK_MAX_MISSES = int(os.getenv("TRACK_MAX_MISSES", "2"))
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between two (N, 4) and (M, 4) xywh arrays."""
+    a = a.astype(np.float64)[:, None, :]
+    b = b.astype(np.float64)[None, :, :]
+    iw = np.clip(np.minimum(a[..., 0] + a[..., 2], b[..., 0] + b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 1] + a[..., 3], b[..., 1] + b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    union = a[..., 2] * a[..., 3] + b[..., 2] * b[..., 3] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+def greedy_match(iou: np.ndarray, threshold: float) -> List[tuple]:
+    """(row, col) pairs, best IoU first, each row and column used at most once."""
+    rows, cols = np.nonzero(iou >= threshold)
+    order = np.argsort(-iou[rows, cols], kind="stable")
+    used_r, used_c, pairs = set(), set(), []
+    for r, c in zip(rows[order].tolist(), cols[order].tolist()):
+        if r not in used_r and c not in used_c:
+            used_r.add(r)
+            used_c.add(c)
+            pairs.append((r, c))
+    return pairs
+
+
+class Tracker:
+    """IoU tracker with constant-velocity prediction between detections.
+
+    update() associates a fresh set of detections with the current tracks so
+    box IDs stay stable; predict() moves every track along its last velocity
+    for frames where detection was skipped. Both return a delta (added,
+    updated, removed) against what the client was last sent.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU, max_misses: int = TRACK_MAX_MISSES):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.ids: List[str] = []
+        self.xywh = np.zeros((0, 4))
+        # Position at the last detection; predictions are anchor + velocity * frames since then
+        self.anchor = np.zeros((0, 2))
+        self.velocity = np.zeros((0, 2))
+        self.confidence = np.zeros(0)
+        self.labels: List[str] = []
+        self.seen = np.zeros(0, dtype=np.int64)
+        self.misses = np.zeros(0, dtype=np.int64)
+        self._sent: Dict[str, tuple] = {}
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _keep(self, mask: np.ndarray):
+        index = np.nonzero(mask)[0]
+        self.ids = [self.ids[i] for i in index]
+        self.labels = [self.labels[i] for i in index]
+        self.xywh, self.anchor, self.velocity = self.xywh[index], self.anchor[index], self.velocity[index]
+        self.confidence, self.seen, self.misses = self.confidence[index], self.seen[index], self.misses[index]
+
+    def update(self, detections: BoxArray, frame: int) -> Dict[str, Any]:
+        boxes = detections.xywh.astype(np.float64)
+        pairs = greedy_match(iou_matrix(self.xywh, boxes), self.iou_threshold) if len(self) and len(boxes) else []
+        matched_tracks = np.zeros(len(self), dtype=bool)
+        matched_dets = np.zeros(len(boxes), dtype=bool)
+        if pairs:
+            t, d = (np.array(v) for v in zip(*pairs))
+            gap = np.maximum(frame - self.seen[t], 1)[:, None]
+            # Measured between detections, so prediction error never feeds back into the velocity
+            self.velocity[t] = (boxes[d, :2] - self.anchor[t]) / gap
+            self.xywh[t] = boxes[d]
+            self.anchor[t] = boxes[d, :2]
+            self.confidence[t] = detections.confidence[d]
+            for ti, di in zip(t.tolist(), d.tolist()):
+                self.labels[ti] = detections.labels[di]
+            self.seen[t] = frame
+            self.misses[t] = 0
+            matched_tracks[t] = True
+            matched_dets[d] = True
+
+        self.misses[~matched_tracks] += 1
+        # Unmatched tracks stay where they are; they are kept for a round or two in case detection missed them
+        self.anchor[~matched_tracks] = self.xywh[~matched_tracks, :2]
+        self.velocity[~matched_tracks] = 0
+        self.seen[~matched_tracks] = frame
+        self._keep(self.misses <= self.max_misses)
+
+        new = np.nonzero(~matched_dets)[0]
+        if len(new):
+            self.ids += [f"trk-{self._next_id + i}" for i in range(len(new))]
+            self._next_id += len(new)
+            self.xywh = np.concatenate([self.xywh, boxes[new]])
+            self.anchor = np.concatenate([self.anchor, boxes[new, :2]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((len(new), 2))])
+            self.confidence = np.concatenate([self.confidence, detections.confidence[new]])
+            self.labels += [detections.labels[i] for i in new.tolist()]
+            self.seen = np.concatenate([self.seen, np.full(len(new), frame, dtype=np.int64)])
+            self.misses = np.concatenate([self.misses, np.zeros(len(new), dtype=np.int64)])
+        return self._delta()
+
+    def predict(self, frame: int) -> Dict[str, Any]:
+        if len(self):
+            self.xywh[:, :2] = self.anchor + self.velocity * (frame - self.seen)[:, None]
+        return self._delta()
+
+    def boxes(self) -> List[Dict[str, Any]]:
+        xywh = np.round(self.xywh).astype(np.int64).tolist()
+        return [{"id": i, "x": x, "y": y, "w": w, "h": h, "label": label, "confidence": round(c, 3)}
+                for i, (x, y, w, h), label, c in zip(self.ids, xywh, self.labels, self.confidence.tolist())]
+
+    def _delta(self) -> Dict[str, Any]:
+        added, updated = [], []
+        current = {}
+        for box in self.boxes():
+            key = (box["x"], box["y"], box["w"], box["h"], box["label"])
+            current[box["id"]] = key
+            previous = self._sent.get(box["id"])
+            if previous is None:
+                added.append(box)
+            elif previous != key:
+                updated.append(box)
+        removed = [i for i in self._sent if i not in current]
+        self._sent = current
+        return {"added": added, "updated": updated, "removed": removed}
+
+    def reset(self) -> Dict[str, Any]:
+        self._keep(np.zeros(len(self), dtype=bool))
+        return self._delta()
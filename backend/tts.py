@@ -0,0 +1,370 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from clients import elevenlabs_client
+from telemetry import log_error, observe, span
+
+# Audio setup
+AUDIO_DIR = "audio_output"
+os.makedirs(AUDIO_DIR, exist_ok=True)
+
+# Use the user-provided voice ID
+VOICE_ID = "cNYrMw9glwJZXR8RwbuR"
+TTS_MODEL_ID = "eleven_multilingual_v2"
+
+# Replies saved in audio_mode="file" go in their own directory, so the store's TTL and size
+# bounds only ever delete files it wrote, never other MP3s that happen to be in AUDIO_DIR
+AUDIO_REPLY_DIR = os.path.join(AUDIO_DIR, "replies")
+# Bounds for the on-disk store used by audio_mode="file"
+AUDIO_MAX_BYTES = int(os.getenv("AUDIO_MAX_BYTES", str(200 * 1024 * 1024)))
+AUDIO_TTL_SECONDS = float(os.getenv("AUDIO_TTL_SECONDS", "3600"))
+AUDIO_CLEANUP_INTERVAL = float(os.getenv("AUDIO_CLEANUP_INTERVAL", "60"))
+# How long a /tts/stream/{token} link stays valid in audio_mode="stream"
+STREAM_TOKEN_TTL = float(os.getenv("STREAM_TOKEN_TTL", "300"))
+# Content-addressed cache for short, repeated phrases (greetings, fallbacks, per-sentence audio)
+TTS_CACHE_DIR = os.path.join(AUDIO_DIR, "cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+TTS_CACHE_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MAX_ENTRIES", "2000"))
+TTS_CACHE_MAX_CHARS = int(os.getenv("TTS_CACHE_MAX_CHARS", "500"))
+
+# A sentence ends at ., ! or ? followed by whitespace; the trailing fragment stays buffered
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(buffer: str) -> Tuple[List[str], str]:
+    """Split streamed text into complete sentences and the unfinished remainder."""
+    parts = _SENTENCE_END.split(buffer)
+    complete = [p.strip() for p in parts[:-1] if p.strip()]
+    return complete, parts[-1]
+
+
+class AudioStore:
+    """MP3 replies in a directory of their own, bounded by total size and age.
+
+    Files are tracked oldest-first; cleanup() drops anything older than the
+    TTL and then the oldest files until the directory fits in max_bytes.
+    Everything in the directory was written by save(), here or in an earlier
+    run, so nothing else is ever adopted or evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._files: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._files[name] = (size, mtime)
+            self._bytes += size
+
+    def save(self, chunks: List[bytes]) -> str:
+        filename = f"{uuid.uuid4()}.mp3"
+        size = 0
+        with span("file_write"), open(os.path.join(self.directory, filename), "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        with self._lock:
+            self._files[filename] = (size, time.time())
+            self._bytes += size
+        if self._bytes > self.max_bytes:
+            self.cleanup()
+        return filename
+
+    def cleanup(self) -> int:
+        now = time.time()
+        removed = []
+        with self._lock:
+            while self._files:
+                name, (size, created) = next(iter(self._files.items()))
+                if now - created <= self.ttl_seconds and self._bytes <= self.max_bytes:
+                    break
+                self._files.popitem(last=False)
+                self._bytes -= size
+                removed.append(name)
+        for name in removed:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        self.evicted += len(removed)
+        return len(removed)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted": self.evicted,
+        }
+
+
+audio_store = AudioStore(AUDIO_REPLY_DIR, AUDIO_MAX_BYTES, AUDIO_TTL_SECONDS)
+
+
+class TTSCache:
+    """LRU of synthesized audio keyed by hash(voice_id, model_id, text).
+
+    Files are named after the key, so the same phrase always maps to the same
+    /audio/cache URL. The LRU order is persisted to index.json by the cleanup
+    loop and on shutdown, not on every put, so the cache survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_entries: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.index_path = os.path.join(directory, "index.json")
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Serializes index writes without holding up lookups
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(text: str, voice_id: str = VOICE_ID, model_id: str = TTS_MODEL_ID) -> str:
+        return hashlib.sha256(f"{voice_id}\0{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def url(self, key: str) -> str:
+        return f"/audio/cache/{key}.mp3"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                keys = json.load(f)
+        except (FileNotFoundError, ValueError):
+            keys = []
+        # Files written after the last index save are treated as least recently used
+        listed = set(keys)
+        unlisted = [name[:-4] for name in os.listdir(self.directory) if name.endswith(".mp3") and name[:-4] not in listed]
+        for key in unlisted + keys:
+            try:
+                size = os.path.getsize(self._path(key))
+            except OSError:
+                continue
+            self._entries[key] = size
+            self._bytes += size
+
+    def save_index(self):
+        """Write the LRU order to index.json if it changed since the last save."""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                keys = list(self._entries)
+                self._dirty = False
+            tmp = f"{self.index_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump(keys, f)
+                os.replace(tmp, self.index_path)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                log_error("tts_index_save_error", error=str(e))
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._dirty = True
+                self.hits += 1
+                return self.url(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, chunks: List[bytes]) -> str:
+        data = b"".join(chunks)
+        with span("file_write"), open(self._path(key), "wb") as f:
+            f.write(data)
+        evicted = []
+        with self._lock:
+            self._bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                old, size = self._entries.popitem(last=False)
+                self._bytes -= size
+                evicted.append(old)
+            self._dirty = True
+        for old in evicted:
+            try:
+                os.remove(self._path(old))
+            except FileNotFoundError:
+                pass
+        return self.url(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_ENTRIES)
+# Keys being synthesized right now, so concurrent requests for one phrase share a call
+_inflight: Dict[str, "asyncio.Task"] = {}
+
+
+# token -> (text, expiry) for replies whose audio is relayed on demand
+_stream_tokens: Dict[str, Tuple[str, float]] = {}
+
+
+def register_stream(text: str) -> str:
+    """Remember `text` and return a URL that streams its speech when fetched."""
+    token = uuid.uuid4().hex
+    _stream_tokens[token] = (text, time.time() + STREAM_TOKEN_TTL)
+    return f"/tts/stream/{token}"
+
+
+def stream_text(token: str) -> Optional[str]:
+    entry = _stream_tokens.get(token)
+    if entry is None or entry[1] < time.time():
+        return None
+    return entry[0]
+
+
+def _expire_stream_tokens():
+    now = time.time()
+    for token in [t for t, (_, expiry) in _stream_tokens.items() if expiry < now]:
+        _stream_tokens.pop(token, None)
+
+
+async def stream_speech(text: str) -> AsyncIterator[bytes]:
+    """Relay ElevenLabs audio chunks as they arrive.
+
+    Short phrases are also kept in the TTS cache once the stream completes,
+    so the next request for them is served from a file.
+    """
+    client = elevenlabs_client()
+    if client is None:
+        raise RuntimeError("Text-to-speech is not configured")
+    cacheable = len(text) <= TTS_CACHE_MAX_CHARS
+    chunks: List[bytes] = []
+    started = time.perf_counter()
+    async for chunk in client.text_to_speech.stream(
+        voice_id=VOICE_ID,
+        text=text,
+        model_id=TTS_MODEL_ID,
+    ):
+        if cacheable:
+            chunks.append(chunk)
+        yield chunk
+    # Measured up to the last chunk, so it includes the time the client took to read the stream
+    observe("tts_stream", time.perf_counter() - started)
+    if cacheable and chunks:
+        await asyncio.to_thread(tts_cache.put, tts_cache.key(text), chunks)
+
+
+async def _convert(text: str) -> List[bytes]:
+    client = elevenlabs_client()
+    with span("tts"):
+        return [chunk async for chunk in client.text_to_speech.convert(
+            voice_id=VOICE_ID,
+            text=text,
+            model_id=TTS_MODEL_ID,
+        )]
+
+
+async def _synthesize_cached(key: str, text: str) -> str:
+    try:
+        chunks = await _convert(text)
+        return await asyncio.to_thread(tts_cache.put, key, chunks)
+    finally:
+        _inflight.pop(key, None)
+
+
+async def synthesize(text: str) -> Optional[str]:
+    """Generate speech for `text` and return its /audio URL, or None if TTS is unavailable."""
+    client = elevenlabs_client()
+    if client is None or not text.strip():
+        return None
+    try:
+        if len(text) <= TTS_CACHE_MAX_CHARS:
+            key = tts_cache.key(text)
+            url = tts_cache.get(key)
+            if url:
+                return url
+            if key not in _inflight:
+                _inflight[key] = asyncio.ensure_future(_synthesize_cached(key, text))
+            return await asyncio.shield(_inflight[key])
+
+        chunks = await _convert(text)
+
+        # Save audio file off the event loop
+        audio_filename = await asyncio.to_thread(audio_store.save, chunks)
+
+        # Return relative URL
+        return f"/audio/replies/{audio_filename}"
+    except Exception as e:
+        log_error("tts_error", error=str(e))
+        # Continue without audio
+        return None
+
+
+async def speech_url(text: str, audio_mode: str) -> Optional[str]:
+    """Audio URL for a reply: a stored file, an on-demand stream link, or nothing."""
+    if audio_mode == "none" or not text.strip() or elevenlabs_client() is None:
+        return None
+    if audio_mode == "stream":
+        # A cached phrase is already a finished file, which beats relaying it again
+        if len(text) <= TTS_CACHE_MAX_CHARS and tts_cache.key(text) in tts_cache:
+            return tts_cache.get(tts_cache.key(text))
+        return register_stream(text)
+    return await synthesize(text)
+
+
+async def drain(timeout: float):
+    """Wait up to `timeout` seconds for speech still being synthesized into the cache."""
+    tasks = list(_inflight.values())
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
+
+
+async def cleanup_loop(interval: float = AUDIO_CLEANUP_INTERVAL):
+    while True:
+        try:
+            await asyncio.to_thread(audio_store.cleanup)
+            await asyncio.to_thread(tts_cache.save_index)
+            _expire_stream_tokens()
+        except Exception as e:
+            log_error("audio_cleanup_error", error=str(e))
+        await asyncio.sleep(interval)
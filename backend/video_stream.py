@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Optional, Tuple
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from boxes import BoxArray
+from detect import detect_blobs
+from detect_pool import PoolSaturated, pool
+from telemetry import log_error, span
+from tracking import Tracker
+
+# Run the detector on every Nth frame; the tracker predicts the frames in between
+VIDEO_DETECT_EVERY = int(os.getenv("VIDEO_DETECT_EVERY", "5"))
+# Longer side frames are decoded to for detection; smaller than stills, since throughput matters more here
+VIDEO_WORKING_SIZE = int(os.getenv("VIDEO_WORKING_SIZE", "640"))
+VIDEO_MAX_FRAME_BYTES = int(os.getenv("VIDEO_MAX_FRAME_BYTES", str(8 * 1024 * 1024)))
+
+
+class LatestFrame:
+    """One-slot mailbox: a frame that arrives before the previous one was taken replaces it."""
+
+    def __init__(self):
+        self._frame: Optional[Tuple[int, bytes]] = None
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, data: bytes):
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (self.received, data)
+        self.received += 1
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[int, bytes]]:
+        while self._frame is None and not self.closed:
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class VideoStream:
+    """Detection over a WebSocket stream of encoded frames (JPEG/PNG as binary messages).
+
+    Frames are numbered as they arrive. The processing loop always takes the
+    newest one, so when inference falls behind the stale frames are skipped
+    instead of queued. The detector runs on every `detect_every`-th frame
+    (or sooner when nothing is tracked yet) and the tracker predicts the rest,
+    so the sustained frame rate is bounded by decode-free tracking rather
+    than by per-image inference latency.
+
+    Each processed frame is answered with {"event": "frame", "frame": n,
+    "detected": bool, "added": [...], "updated": [...], "removed": [...], ...};
+    boxes carry track IDs that stay stable across frames. Text messages
+    {"detect_every": n} and {"reset": true} adjust the stream.
+    """
+
+    def __init__(self, websocket: WebSocket, detect_every: int = VIDEO_DETECT_EVERY,
+                 working_size: int = VIDEO_WORKING_SIZE):
+        self.websocket = websocket
+        self.detect_every = max(1, detect_every)
+        self.working_size = working_size
+        self.frames = LatestFrame()
+        self.tracker = Tracker()
+        self.last_detection: Optional[int] = None
+        self._reset = False
+        self.detections = 0
+        self.processed = 0
+        self._times: deque = deque(maxlen=30)
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    if len(message["bytes"]) > VIDEO_MAX_FRAME_BYTES:
+                        await self.websocket.send_json({"event": "error", "detail": "Frame too large"})
+                        continue
+                    self.frames.put(message["bytes"])
+                elif message.get("text"):
+                    # A bad control message is answered with an error; the stream keeps going
+                    try:
+                        self._control(json.loads(message["text"]))
+                    except (ValueError, TypeError) as e:
+                        await self.websocket.send_json({"event": "error", "detail": f"Invalid control message: {e}"})
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        except Exception as e:
+            log_error("video_stream_receive_error", error=str(e))
+        finally:
+            self.frames.close()
+
+    def _control(self, command: Any):
+        if not isinstance(command, dict):
+            raise ValueError("expected a JSON object")
+        if "detect_every" in command:
+            self.detect_every = max(1, int(command["detect_every"]))
+        if command.get("reset"):
+            self._reset = True
+
+    def _due(self, index: int) -> bool:
+        return self.last_detection is None or not len(self.tracker) or index - self.last_detection >= self.detect_every
+
+    async def _detect(self, data: bytes) -> Optional[dict]:
+        with pool.slot():
+            _, _, results = await pool.wait(pool.run(detect_blobs, [data], 1, self.working_size))
+        return results[0]
+
+    def _fps(self) -> float:
+        self._times.append(time.monotonic())
+        if len(self._times) < 2:
+            return 0.0
+        return round((len(self._times) - 1) / max(self._times[-1] - self._times[0], 1e-9), 2)
+
+    async def run(self):
+        receiver = asyncio.create_task(self._receive())
+        try:
+            while True:
+                frame = await self.frames.get()
+                if frame is None:
+                    break
+                index, data = frame
+                started = time.perf_counter()
+                message = {"event": "frame", "frame": index, "detected": False}
+                removed = []
+                if self._reset:
+                    # Drop every track and re-detect from scratch on this frame
+                    removed = self.tracker.reset()["removed"]
+                    self.last_detection, self._reset = None, False
+                if self._due(index):
+                    try:
+                        result = await self._detect(data)
+                    except (PoolSaturated, asyncio.TimeoutError):
+                        # Keep the stream moving on predictions until the detector has room again
+                        result = False
+                    if result is None:
+                        await self.websocket.send_json({"event": "error", "frame": index, "detail": "Could not decode frame"})
+                        continue
+                    if result:
+                        with span("tracking"):
+                            delta = self.tracker.update(BoxArray.from_boxes(result["boxes"]), index)
+                        self.last_detection = index
+                        self.detections += 1
+                        message.update(detected=True, image_width=result["image_width"], image_height=result["image_height"])
+                if not message["detected"]:
+                    with span("tracking"):
+                        delta = self.tracker.predict(index)
+                self.processed += 1
+                delta["removed"] = removed + delta["removed"]
+                message.update(delta)
+                message.update(
+                    tracks=len(self.tracker),
+                    received=self.frames.received,
+                    dropped=self.frames.dropped,
+                    fps=self._fps(),
+                    latency_ms=round((time.perf_counter() - started) * 1000, 2),
+                )
+                await self.websocket.send_json(message)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            log_error("video_stream_error", error=str(e))
+        finally:
+            receiver.cancel()
@@ -1019,6 +1019,12 @@ const App: React.FC = () => {
   const [sequence, setSequence] = useState<string[]>([]);
   const [manualCount, setManualCount] = useState<number>(0);
   const [originalDetectedCount, setOriginalDetectedCount] = useState<number>(0);
+  // Server-side plan session, so count edits send only the boxes that change
+  const [planSession, setPlanSession] = useState<string | null>(null);
+  // Every box in the session as sent to the server, placed or not, so an expired session can be rebuilt
+  const [planBoxes, setPlanBoxes] = useState<Box[]>([]);
+  // Server-side chat session; the backend keeps the history, so each turn sends only the new question
+  const [chatSession, setChatSession] = useState<string | null>(null);
   const [isConnected, setIsConnected] = useState(false);
   const [imagePreview, setImagePreview] = useState<string | null>(null);
   const recognitionRef = useRef<any>(null);
@@ -1030,19 +1036,25 @@ const App: React.FC = () => {
     if (!text.trim()) return;
     setHistory((h) => [...h, `You: ${text}`]);
     try {
-      const res = await fetch("/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          messages: [
-            { role: "user", content: text },
-            { role: "user", content: `Current box count: ${manualCount}` },
-            { role: "user", content: `Detected boxes details: ${pixelBoxes.map(b => `${b.id} (${b.w}×${b.h}px, ${b.label || 'box'}, ${typeof b.confidence === 'number' ? (b.confidence * 100).toFixed(0) + '%' : 'unknown'} confidence)`).join(', ')}` },
-          ],
-          context: { boxes, route, vehicle, pixelBoxes, imageSize },
-        }),
-      });
+      const ask = (sessionId: string | null) =>
+        fetch("/chat", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            messages: [{ role: "user", content: text }],
+            // The server condenses this into a short context block, so raw detections are fine to send
+            // Counts, fill, load order and unplaced boxes are answered from this without an LLM call
+            context: { boxCount: manualCount, boxes, route, vehicle, pixelBoxes, imageSize, sequence, warnings, grid: { w: 20, h: 15 } },
+            ...(sessionId ? { session_id: sessionId } : { session: true }),
+          }),
+        });
+      let res = await ask(chatSession);
+      if (res.status === 404) {
+        // Session expired on the server; start a new one
+        res = await ask(null);
+      }
       const data = await res.json();
+      if (data.session_id) setChatSession(data.session_id);
       setHistory((h) => [...h, `AI: ${data.reply}`]);
 
       // Play audio response if available and audio is enabled
@@ -1070,7 +1082,7 @@ const App: React.FC = () => {
       console.error("Chat error:", e);
       setHistory((h) => [...h, "AI: Sorry, I encountered an error."]);
     }
-  }, [manualCount, boxes, route, vehicle, audioEnabled, pixelBoxes, imageSize]);
+  }, [manualCount, boxes, route, vehicle, audioEnabled, pixelBoxes, imageSize, chatSession, sequence, warnings]);
 
   useEffect(() => {
     // Initialize Speech Recognition
@@ -1174,71 +1186,87 @@ const App: React.FC = () => {
 
     const form = new FormData();
     form.append("file", file);
-    const res = await fetch("/detect", { method: "POST", body: form });
+    form.append("grid_width", "20");
+    form.append("grid_height", "15");
+    form.append("session", "true");
+    // Detection, pixel-to-grid mapping and planning happen in one server round trip
+    const res = await fetch("/detect-and-plan", { method: "POST", body: form });
     const data = await res.json();
-    const imageW = data.image_width;
-    const imageH = data.image_height;
-    setImageSize({ w: imageW, h: imageH });
-    setPixelBoxes(data.boxes || []);
-    // Map detected pixel boxes to grid cells by simple scaling
-    const scaleX = 20 / imageW;
-    const scaleY = 15 / imageH;
-    const mapped: Box[] = data.boxes.map((b: any, i: number) => ({
-      id: b.id || `box-${i + 1}`,
-      x: Math.max(0, Math.min(19, Math.floor(b.x * scaleX))),
-      y: Math.max(0, Math.min(14, Math.floor(b.y * scaleY))),
-      w: Math.max(1, Math.min(20, Math.ceil(b.w * scaleX))),
-      h: Math.max(1, Math.min(15, Math.ceil(b.h * scaleY))),
-      label: b.label,
-      confidence: b.confidence,
-    }));
-    setBoxes(mapped);
+    const detection = data.detection;
+    setImageSize({ w: detection.image_width, h: detection.image_height });
+    setPixelBoxes(detection.boxes || []);
+    const mapped: Box[] = data.grid_boxes || [];
     setManualCount(mapped.length);
     setOriginalDetectedCount(mapped.length);
-    const planRes = await fetch("/load-plan", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ grid_width: 20, grid_height: 15, boxes: mapped }),
-    });
-    const plan = await planRes.json();
+    const plan = data.plan;
+    setPlanSession(data.session_id);
+    setPlanBoxes(mapped);
     setBoxes(plan.placements);
     setWarnings(plan.warnings || []);
     setSequence(plan.sequence || []);
   };
 
   const updateLoadPlan = async (newCount: number) => {
-    // Update boxes array to match the new count
-    const updatedBoxes = [...boxes];
-    
-    if (newCount > boxes.length) {
-      // Add more boxes if count increased
-      for (let i = boxes.length; i < newCount; i++) {
-        updatedBoxes.push({
-          id: `box-${i + 1}`,
-          x: Math.floor(Math.random() * 18),
-          y: Math.floor(Math.random() * 13),
-          w: 1,
-          h: 1,
-        });
+    // Send only the boxes that change; the server keeps everything else where it is
+    const add: Box[] = [];
+    let remove: string[] = [];
+    const next = [...planBoxes];
+    if (newCount > next.length) {
+      const taken = new Set(next.map((b) => b.id));
+      let n = next.length;
+      while (next.length < newCount) {
+        n += 1;
+        const id = `box-${n}`;
+        if (taken.has(id)) continue;
+        const box = { id, x: 0, y: 0, w: 1, h: 1 };
+        next.push(box);
+        add.push(box);
       }
-    } else if (newCount < boxes.length) {
-      // Remove boxes if count decreased
-      updatedBoxes.splice(newCount);
+    } else if (newCount < next.length) {
+      remove = next.splice(newCount).map((b) => b.id);
     }
-    
-    setBoxes(updatedBoxes);
-    
-    // Re-run load planning with updated boxes
+    if (!add.length && !remove.length) return;
+
+    const createSession = async (sessionBoxes: Box[]) => {
+      const planRes = await fetch("/load-plan/sessions", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ grid_width: 20, grid_height: 15, boxes: sessionBoxes }),
+      });
+      if (!planRes.ok) throw new Error(`session create failed: ${planRes.status}`);
+      const session = await planRes.json();
+      setPlanSession(session.session_id);
+      setPlanBoxes(sessionBoxes);
+      setBoxes(session.plan.placements);
+      setWarnings(session.plan.warnings || []);
+      setSequence(session.plan.sequence || []);
+    };
+
     try {
-      const planRes = await fetch("/load-plan", {
+      if (!planSession) {
+        // Nothing planned yet (no image): start a session with the requested boxes
+        await createSession(next);
+        return;
+      }
+      const editRes = await fetch(`/load-plan/sessions/${planSession}/edit`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ grid_width: 20, grid_height: 15, boxes: updatedBoxes }),
+        body: JSON.stringify({ add, remove }),
       });
-      const plan = await planRes.json();
-      setBoxes(plan.placements);
-      setWarnings(plan.warnings || []);
-      setSequence(plan.sequence || []);
+      if (editRes.status === 404) {
+        // Session expired or was evicted on the server; replan every box, placed or still
+        // waiting for space, with the edit already applied
+        await createSession(next);
+        return;
+      }
+      if (!editRes.ok) throw new Error(`edit failed: ${editRes.status}`);
+      const diff = await editRes.json();
+      const gone = new Set<string>(diff.removed);
+      const addedIds: string[] = diff.added.map((b: Box) => b.id);
+      setPlanBoxes(next);
+      setBoxes(boxes.filter((b) => !gone.has(b.id)).concat(diff.added));
+      setSequence(sequence.filter((id) => !gone.has(id)).concat(addedIds));
+      setWarnings(diff.unplaced.map((id: string) => `Could not place ${id}, not enough space`));
     } catch (e) {
       console.error("Load plan update error:", e);
     }
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from boxes import BoxArray, nms
+from models import Box
+
+
+def test_box_array_round_trip():
+    boxes = [Box(id="a", x=1, y=2, w=3, h=4, label="crate", confidence=0.5), {"id": "b", "x": 5, "y": 6, "w": 7, "h": 8}]
+    array = BoxArray.from_boxes(boxes)
+    assert len(array) == 2
+    assert array.w.tolist() == [3, 7] and array.y.tolist() == [2, 6]
+    assert array.to_dicts() == [
+        {"id": "a", "x": 1, "y": 2, "w": 3, "h": 4, "label": "crate", "confidence": 0.5},
+        {"id": "b", "x": 5, "y": 6, "w": 7, "h": 8, "label": "box", "confidence": 1.0},
+    ]
+    assert array.to_models()[0] == boxes[0]
+
+    taken = array.take([1])
+    assert taken.ids == ["b"] and taken.xywh.tolist() == [[5, 6, 7, 8]]
+    assert BoxArray.from_boxes([]).to_dicts() == [] and len(BoxArray.empty()) == 0
+    # Detection output is numbered in order when no ids are given
+    assert BoxArray(np.zeros((2, 4))).ids == ["box-1", "box-2"]
+
+
+def test_nms_suppresses_overlaps_best_first():
+    xywh = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [50, 50, 10, 10], [0, 0, 10, 10]])
+    scores = np.array([0.6, 0.9, 0.8, 0.1])
+    keep = nms(xywh, scores, iou_threshold=0.5)
+    # Box 1 wins its cluster over 0 and 3; box 2 stands alone
+    assert keep.tolist() == [1, 2]
+    # IoU of the shifted pair is 0.68, so a higher threshold keeps box 0; its exact copy 3 still goes
+    assert nms(xywh, scores, iou_threshold=0.7).tolist() == [1, 2, 0]
+
+
+def test_nms_containment():
+    # A small hit inside a big box has a low IoU but is still a duplicate
+    xywh = np.array([[0, 0, 100, 100], [10, 10, 20, 20]])
+    scores = np.array([0.9, 0.8])
+    assert nms(xywh, scores, iou_threshold=0.5).tolist() == [0, 1]
+    assert nms(xywh, scores, iou_threshold=0.5, contain_threshold=0.8).tolist() == [0]
+    assert nms(np.zeros((0, 4)), np.zeros(0)).tolist() == []
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from stub_upstreams import StubUpstream
+
+# Set by start_backend; the backend reads its configuration on import, so it is imported there
+stub = clients = main = None
+
+
+def start_backend(patch, workdir):
+    """Point the backend at a local stub server, run it from `workdir` and import it."""
+    global stub, clients, main
+    stub = StubUpstream(reply="I can see 5 boxes. They fit in two rows! Load the heavy ones first.").start()
+    patch.setenv("ANTHROPIC_API_KEY", "test-key")
+    patch.setenv("ANTHROPIC_BASE_URL", stub.url)
+    patch.setenv("ELEVENLABS_API_KEY", "test-key")
+    patch.setenv("ELEVENLABS_BASE_URL", stub.url)
+    patch.setenv("PRELOAD_MODEL", "0")
+    patch.chdir(workdir)
+    import clients
+    import main
+
+
+@pytest.fixture(scope="module", autouse=True)
+def backend(tmp_path_factory):
+    # Module scoped, so the environment and working directory are restored before other test modules run
+    with pytest.MonkeyPatch.context() as patch:
+        start_backend(patch, tmp_path_factory.mktemp("chat"))
+        try:
+            yield
+        finally:
+            stub.stop()
+
+
+payload = {
+    "messages": [{"role": "user", "content": "How should I load 5 boxes?"}],
+    "context": {"boxes": [], "vehicle": "van"}
+}
+
+
+def test_chat():
+    with TestClient(main.app) as client:
+        response = client.post("/chat", json=payload)
+        print(f"Chat test: {response.status_code}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["reply"].strip() == stub.reply
+        assert data["audio_url"].startswith("/audio/")
+        assert client.get(data["audio_url"]).content == stub.audio
+
+
+def test_chat_stream():
+    with TestClient(main.app) as client:
+        with client.stream("POST", "/chat/stream", json=payload) as response:
+            assert response.status_code == 200
+            events = []
+            for block in response.iter_text():
+                for chunk in block.split("\n\n"):
+                    if chunk.strip():
+                        lines = dict(line.split(": ", 1) for line in chunk.splitlines())
+                        events.append((lines["event"], json.loads(lines["data"])))
+
+    kinds = [kind for kind, _ in events]
+    print(f"Stream events: {kinds}")
+    assert kinds[-1] == "done"
+    assert "".join(d["text"] for kind, d in events if kind == "token").strip() == stub.reply
+    # One audio clip per sentence, delivered in order
+    audio = [d for kind, d in events if kind == "audio"]
+    assert [a["index"] for a in audio] == [0, 1, 2]
+    tts_texts = [r["body"]["text"] for r in stub.requests if r["path"].startswith("/v1/text-to-speech/")]
+    assert "I can see 5 boxes." in tts_texts
+
+
+def test_chat_audio_stream_mode():
+    files_before = set(os.listdir(main.audio_store.directory))
+    with TestClient(main.app) as client:
+        # A reply that has not been cached yet, so it must be relayed
+        stub.reply = "Streaming reply that nobody has heard before."
+        response = client.post("/chat", json={**payload, "audio_mode": "stream"})
+        assert response.status_code == 200
+        audio_url = response.json()["audio_url"]
+        print(f"Streamed audio URL: {audio_url}")
+        assert audio_url.startswith("/tts/stream/")
+        audio = client.get(audio_url)
+        assert audio.headers["content-type"] == "audio/mpeg"
+        assert audio.content == stub.audio
+        assert client.get("/tts/stream/unknown").status_code == 404
+
+        with client.websocket_connect("/ws/tts") as ws:
+            ws.send_json({"text": "Load the heavy ones first."})
+            assert ws.receive_bytes() == stub.audio
+            assert ws.receive_json() == {"event": "end"}
+    # No per-reply MP3 was written in stream mode
+    assert set(os.listdir(main.audio_store.directory)) == files_before
+
+
+def test_tts_cache_repeats():
+    phrase = {**payload, "messages": [{"role": "user", "content": "Hi"}]}
+    with TestClient(main.app) as client:
+        first = client.post("/chat", json=phrase).json()["audio_url"]
+        tts_calls = len([r for r in stub.requests if r["path"].startswith("/v1/text-to-speech/")])
+        second = client.post("/chat", json=phrase).json()["audio_url"]
+        stats = client.get("/health").json()["tts_cache"]
+    print(f"TTS cache: {stats}")
+    # Same text, voice and model map to the same file without another synthesis call
+    assert first == second and first.startswith("/audio/cache/")
+    assert len([r for r in stub.requests if r["path"].startswith("/v1/text-to-speech/")]) == tts_calls
+    assert stats["hits"] >= 1
+
+
+def test_tts_cache_index_concurrent_puts():
+    from concurrent.futures import ThreadPoolExecutor
+    from tts import TTSCache
+
+    directory = tempfile.mkdtemp()
+    cache = TTSCache(directory, max_bytes=10_000, max_entries=50)
+    keys = [TTSCache.key(f"Sentence {i}.") for i in range(40)]
+    # Puts and index saves from many threads at once, like /chat/stream synthesizing sentences in parallel
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda k: (cache.put(k, [b"mp3"]), cache.save_index()), keys))
+    cache.save_index()
+    assert [name for name in os.listdir(directory) if name.endswith(".tmp")] == []
+    assert list(TTSCache(directory, max_bytes=10_000, max_entries=50)._entries) == list(cache._entries)
+
+    # Files written after the last save are still known after a restart
+    cache.put(TTSCache.key("Unsaved."), [b"mp3"])
+    assert TTSCache.key("Unsaved.") in TTSCache(directory, max_bytes=10_000, max_entries=50)
+
+
+def test_audio_store_only_evicts_its_own_files():
+    from tts import AudioStore
+
+    parent = tempfile.mkdtemp()
+    # An MP3 someone else put next to the store's directory, e.g. a tracked sample file
+    with open(os.path.join(parent, "sample.mp3"), "wb") as f:
+        f.write(b"ID3sample")
+    store = AudioStore(os.path.join(parent, "replies"), max_bytes=10, ttl_seconds=0)
+    assert store.stats()["files"] == 0
+    name = store.save([b"ID3reply"])
+    assert os.path.exists(os.path.join(parent, "replies", name))
+    store.cleanup()
+    assert not os.path.exists(os.path.join(parent, "replies", name))
+    assert sorted(os.listdir(parent)) == ["replies", "sample.mp3"]
+
+
+def test_chat_session_compaction():
+    turn = {"messages": [{"role": "user", "content": "Where should the next box go?"}], "audio_mode": "none",
+            "context": {"vehicle": "van", "boxes": [{"id": f"box-{i}", "x": 0, "y": 0, "w": 2, "h": 3} for i in range(40)]}}
+    stub.reply = "Put it next to the last one, against the left wall of the van."
+    with TestClient(main.app) as client:
+        data = client.post("/chat", json={**turn, "session": True}).json()
+        session_id = data["session_id"]
+        tokens = [data["usage"]["input_tokens"]]
+        for _ in range(15):
+            data = client.post("/chat", json={**turn, "session_id": session_id}).json()
+            tokens.append(data["usage"]["input_tokens"])
+        chat_calls = [r["body"] for r in stub.requests if r["path"].startswith("/v1/messages") and "stream" not in r["body"]]
+        assert client.post("/chat", json={**turn, "session_id": "missing"}).status_code == 404
+    print(f"Input tokens per turn: {tokens}")
+    last = chat_calls[-1]
+    # The system prompt is below the model's cache minimum, so it carries no breakpoint;
+    # the 40 boxes travel as one summary line, not raw JSON
+    assert "cache_control" not in last["system"][0]
+    assert "Summary of the earlier conversation" in last["system"][-1]["text"]
+    assert "grid boxes: 40 (40x 2x3)" in json.dumps(last["messages"][-1])
+    # History is folded into the summary in the background, so the prompt stops growing; a trim
+    # waits for the turn in flight, so the history can run one turn past the summarized cut
+    assert len(last["messages"]) <= 18
+    assert max(tokens[8:]) <= max(tokens[:8]) * 1.5
+
+
+def test_cache_breakpoints_need_a_long_enough_prefix():
+    from chat_sessions import build_request
+
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"Turn {i} " + "x" * 400} for i in range(5)]
+    short = build_request("Short prompt.", history, summary="Earlier turns.", min_cache_tokens=2048)
+    assert all("cache_control" not in block for block in short["system"])
+    assert all(isinstance(m["content"], str) for m in short["messages"][:-1])
+
+    # Long enough history: only the last message before the new turn is a breakpoint
+    long = build_request("Short prompt.", history, min_cache_tokens=300)
+    assert "cache_control" not in long["system"][0]
+    assert long["messages"][-2]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+
+    # A system prompt over the minimum is cached on its own
+    cached = build_request("y" * 8200, history[:1], min_cache_tokens=2048)
+    assert cached["system"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+def test_summary_trim_waits_for_the_running_turn():
+    from types import SimpleNamespace
+    from chat_sessions import ChatSession
+
+    class SummaryClient:
+        def __init__(self):
+            self.messages = self
+
+        async def create(self, **kwargs):
+            return SimpleNamespace(content=[SimpleNamespace(text="Summary.")])
+
+    async def scenario():
+        session = ChatSession("s")
+        for i in range(10):
+            session.add([{"role": "user", "content": f"q{i}"}], None)
+            session.add_reply(f"a{i}")
+        session.compact(SummaryClient(), "model")
+        # A turn that fails after the summary came back must discard only its own message
+        async with session.lock:
+            mark = len(session.messages)
+            session.add([{"role": "user", "content": "failing turn"}], None)
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+            session.discard_since(mark)
+        await session._summarizing
+        return session
+
+    session = asyncio.run(scenario())
+    assert session.summary == "Summary."
+    assert [m["content"] for m in session.messages][-2:] == ["q9", "a9"]
+    assert "failing turn" not in [m["content"] for m in session.messages]
+
+
+def test_local_answers():
+    context = {"boxCount": 2, "vehicle": "van", "sequence": ["box-2", "box-1"],
+               "boxes": [{"id": "box-1", "x": 0, "y": 0, "w": 10, "h": 15}, {"id": "box-2", "x": 10, "y": 0, "w": 5, "h": 15}]}
+    with TestClient(main.app) as client:
+        llm_calls = len([r for r in stub.requests if r["path"].startswith("/v1/messages")])
+        count = client.post("/chat", json={"messages": [{"role": "user", "content": "How many boxes are there?"}],
+                                           "context": context, "audio_mode": "none"}).json()
+        order = client.post("/chat", json={"messages": [{"role": "user", "content": "What order do I load them in?"}],
+                                           "context": context, "audio_mode": "none"}).json()
+        fill = client.post("/chat", json={"messages": [{"role": "user", "content": "What's the fill ratio?"}],
+                                          "context": context, "audio_mode": "none"}).json()
+        stats = client.get("/health").json()["intent_router"]
+        # Judgement calls still go to Claude
+        advice = client.post("/chat", json={"messages": [{"role": "user", "content": "Why is the fill ratio low?"}],
+                                            "context": context, "audio_mode": "none"}).json()
+    print(f"Local answers: {count['reply']!r} {order['reply']!r} {fill['reply']!r} {stats}")
+    assert count["intent"] == "box_count" and "2 boxes" in count["reply"]
+    assert order["reply"] == "Load in this order: box-2 and box-1."
+    assert fill["intent"] == "fill_ratio" and "75%" in fill["reply"]
+    assert advice["intent"] is None
+    assert len([r for r in stub.requests if r["path"].startswith("/v1/messages")]) == llm_calls + 1
+    assert stats["local"] >= 3
+
+
+def test_local_answers_fall_back_on_bad_context():
+    question = {"messages": [{"role": "user", "content": "What's the fill ratio?"}], "audio_mode": "none"}
+    bad_contexts = [
+        {"boxes": [{"id": "box-1", "x": "left", "y": 0, "w": 10, "h": 15}]},
+        {"boxes": [{"id": "box-1", "x": None, "y": 0, "w": 10, "h": 15}]},
+        {"boxes": [{"id": "box-1", "x": 0, "y": 0, "w": 10, "h": 15}], "grid": {"w": "wide", "h": 15}},
+        {"boxes": [{"id": "box-1", "x": 0, "y": 0, "w": 10, "h": 15}], "grid": [20, 15]},
+    ]
+    with TestClient(main.app) as client:
+        for context in bad_contexts:
+            response = client.post("/chat", json={**question, "context": context})
+            assert response.status_code == 200, context
+            assert response.json()["intent"] is None
+        # Float coordinates are truncated like the frontend's grid cells
+        floats = client.post("/chat", json={**question, "context": {
+            "boxes": [{"id": "box-1", "x": 0.0, "y": 0, "w": 10.0, "h": 15.9}]}}).json()
+    assert floats["intent"] == "fill_ratio" and "50%" in floats["reply"]
+
+
+def test_local_answers_fall_back_on_non_list_context():
+    cases = [
+        ("How many boxes?", {"boxes": 5}),
+        ("How many boxes?", {"pixelBoxes": 3}),
+        ("How many boxes?", {"boxes": [5, "a"], "pixelBoxes": "xyz"}),
+        ("What's the loading order?", {"sequence": 7}),
+        ("What's the loading order?", {"sequence": "abc"}),
+        ("What's the loading order?", {"sequence": [None, {"id": 1}]}),
+        ("What's the fill ratio?", {"boxes": "abc"}),
+        ("Which boxes didn't fit?", {"warnings": 3}),
+    ]
+    with TestClient(main.app) as client:
+        for text, context in cases:
+            response = client.post("/chat", json={"messages": [{"role": "user", "content": text}], "context": context,
+                                                  "audio_mode": "none"})
+            assert response.status_code == 200, context
+            # Falls through to the stub model instead of answering from the broken context
+            assert response.json()["intent"] is None, context
+            assert response.json()["reply"].strip() == stub.reply, context
+
+
+def test_ready_checks_the_upstreams():
+    # Whatever the keys were when startup was first imported, require both upstreams here
+    required, main.readiness.required = main.readiness.required, ["chat", "tts"]
+    try:
+        with TestClient(main.app) as client:
+            deadline = time.monotonic() + 10
+            while any(main.readiness.subsystems.get(name, {}).get("state") in (None, "warming") for name in ("chat", "tts")):
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+            report = client.get("/ready").json()
+    finally:
+        main.readiness.required = required
+    assert report["subsystems"]["chat"]["state"] == "warm" and report["subsystems"]["tts"]["state"] == "warm"
+    # Each check made a real call instead of only building its client
+    assert len([r for r in stub.requests if r["path"].startswith("/v1/models")]) >= 2
+
+    # Without a key chat is reported as failed rather than ready
+    from startup import Readiness
+
+    readiness = Readiness(["chat"], retry_seconds=0)
+    readiness.register("chat", main.warm_chat)
+    key, clients.ANTHROPIC_API_KEY = clients.ANTHROPIC_API_KEY, None
+    cached, clients._anthropic_client = clients._anthropic_client, None
+    try:
+        asyncio.run(readiness.warm())
+    finally:
+        clients.ANTHROPIC_API_KEY, clients._anthropic_client = key, cached
+    assert not readiness.ready and "ANTHROPIC_API_KEY" in readiness.subsystems["chat"]["error"]
+
+
+if __name__ == "__main__":
+    with pytest.MonkeyPatch.context() as patch:
+        start_backend(patch, tempfile.mkdtemp())
+        try:
+            test_chat()
+            test_chat_stream()
+            test_chat_audio_stream_mode()
+            test_tts_cache_repeats()
+            test_tts_cache_index_concurrent_puts()
+            test_audio_store_only_evicts_its_own_files()
+            test_chat_session_compaction()
+            test_cache_breakpoints_need_a_long_enough_prefix()
+            test_summary_trim_waits_for_the_running_turn()
+            test_local_answers()
+            test_local_answers_fall_back_on_bad_context()
+            test_local_answers_fall_back_on_non_list_context()
+            test_ready_checks_the_upstreams()
+        finally:
+            stub.stop()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import detect_cache as detect_cache_module
+from detect_cache import DetectionCache
+
+RESULT = {"boxes": [{"id": "box-1", "x": 1, "y": 2, "w": 3, "h": 4}], "image_width": 64, "image_height": 48}
+
+
+def test_key_depends_on_image_and_detector_config(monkeypatch):
+    cache = DetectionCache(directory=None)
+    key = cache.key(b"image-a")
+    assert key == cache.key(b"image-a")
+    assert key != cache.key(b"image-b")
+
+    # New weights or thresholds must miss instead of serving stale boxes
+    monkeypatch.setattr(detect_cache_module, "weights_fingerprint", lambda path: "other-weights")
+    assert cache.key(b"image-a") != key
+    monkeypatch.undo()
+    monkeypatch.setattr(detect_cache_module, "NMS_IOU", 0.123)
+    assert cache.key(b"image-a") != key
+    for name, value in (("DETECT_CONF", 0.9), ("DETECT_IOU", 0.1), ("DETECT_MAX_DET", 5)):
+        monkeypatch.undo()
+        monkeypatch.setattr(detect_cache_module, name, value)
+        assert cache.key(b"image-a") != key, name
+
+
+def test_memory_lru():
+    cache = DetectionCache(max_entries=2, directory=None)
+    for key in ("a", "b"):
+        asyncio.run(cache.put(key, RESULT))
+    assert cache.get("a") == RESULT
+    asyncio.run(cache.put("c", RESULT))
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == RESULT and cache.get("c") == RESULT
+
+
+def test_disk_tier_is_shared_and_bounded(tmp_path):
+    writer = DetectionCache(max_entries=4, directory=str(tmp_path), max_disk_entries=10)
+    for i in range(25):
+        asyncio.run(writer.put(f"key{i}", RESULT))
+    files = os.listdir(tmp_path)
+    print(f"Disk files: {len(files)}, stats: {writer.stats()}")
+    assert len(files) <= 10
+    assert not [name for name in files if name.endswith(".tmp")]
+    assert writer.stats()["disk_evictions"] > 0
+
+    # A second process sees what the first one wrote
+    reader = DetectionCache(max_entries=4, directory=str(tmp_path), max_disk_entries=10)
+    assert reader.get("key24") == RESULT
+    assert reader.disk_hits == 1
+    assert reader.get("key0") is None
+
+
+def test_disk_write_errors_skip_the_cache(tmp_path, monkeypatch):
+    cache = DetectionCache(max_entries=4, directory=str(tmp_path))
+
+    def disk_full(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(detect_cache_module.json, "dump", disk_full)
+    asyncio.run(cache.put("key", RESULT))
+    assert cache.stats()["disk_errors"] == 1
+    assert os.listdir(tmp_path) == []
+    # Still served from memory
+    assert cache.get("key") == RESULT
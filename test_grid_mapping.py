@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from grid_mapping import map_to_grid
+from models import Calibration
+
+
+def frontend_mapping(b, i, image_w, image_h, grid_w, grid_h):
+    """The scaling App.tsx used before mapping moved to the server."""
+    sx, sy = grid_w / image_w, grid_h / image_h
+    return (
+        b.get("id") or f"box-{i + 1}",
+        max(0, min(grid_w - 1, math.floor(b["x"] * sx))),
+        max(0, min(grid_h - 1, math.floor(b["y"] * sy))),
+        max(1, min(grid_w, math.ceil(b["w"] * sx))),
+        max(1, min(grid_h, math.ceil(b["h"] * sy))),
+    )
+
+
+def as_tuples(boxes):
+    return [(b.id, b.x, b.y, b.w, b.h) for b in boxes]
+
+
+def test_matches_the_old_frontend_mapping():
+    rng = random.Random(4)
+    # 640x480 onto 20x15 scales by 1/32, so both sides compute exactly
+    pixel_boxes = [{"x": rng.randint(-20, 640), "y": rng.randint(-20, 480), "w": rng.randint(1, 700),
+                    "h": rng.randint(1, 500), "confidence": 0.8} for _ in range(300)]
+    pixel_boxes[0]["id"] = "named"
+    mapped = map_to_grid(pixel_boxes, 640, 480, 20, 15)
+    assert as_tuples(mapped) == [frontend_mapping(b, i, 640, 480, 20, 15) for i, b in enumerate(pixel_boxes)]
+    assert mapped[0].id == "named" and mapped[1].id == "box-2"
+    assert mapped[1].confidence == 0.8 and mapped[1].label == "box"
+
+
+def test_float_noise_does_not_add_a_cell():
+    # 0.3 and 0.6 of the width are not exact in binary; the box is exactly 3 cells wide
+    mapped = map_to_grid([{"x": 30, "y": 0, "w": 30, "h": 10}], 100, 100, 10, 10)
+    assert as_tuples(mapped) == [("box-1", 3, 0, 3, 1)]
+
+
+def test_roi_calibration():
+    # Floor occupies pixels 100..500 x 50..350 of the photo
+    calibration = Calibration(roi=[100, 50, 500, 350])
+    mapped = map_to_grid([{"x": 100, "y": 50, "w": 200, "h": 150}, {"x": 0, "y": 0, "w": 50, "h": 20}],
+                         640, 480, 20, 15, calibration)
+    # Boxes outside the floor are clamped onto its edge but keep their size
+    assert as_tuples(mapped) == [("box-1", 0, 0, 10, 8), ("box-2", 0, 0, 3, 1)]
+
+
+def test_homography_calibration():
+    # A plain scaling homography gives the same result as the default mapping
+    scale = Calibration(homography=[[1 / 640, 0, 0], [0, 1 / 480, 0], [0, 0, 1]])
+    pixel_boxes = [{"x": 64, "y": 96, "w": 128, "h": 64}]
+    assert as_tuples(map_to_grid(pixel_boxes, 640, 480, 20, 15, scale)) == \
+        as_tuples(map_to_grid(pixel_boxes, 640, 480, 20, 15))
+
+    # Perspective: rows lower in the photo are divided by a larger w, so the same pixel box covers fewer cells
+    tilt = Calibration(homography=[[1 / 640, 0, 0], [0, 1 / 480, 0], [0, 0.001, 1]])
+    low, high = map_to_grid([{"x": 0, "y": 400, "w": 64, "h": 48}, {"x": 0, "y": 0, "w": 64, "h": 48}],
+                            640, 480, 20, 15, tilt)
+    assert (low.w, low.h) == (2, 1) and (high.w, high.h) == (2, 2)
+    assert high.y == 0 and 0 < low.y < 15
+
+
+def test_invalid_calibration():
+    box = [{"x": 0, "y": 0, "w": 10, "h": 10}]
+    for calibration, grid in (
+        (Calibration(roi=[0, 0, 100]), (20, 15)),
+        (Calibration(roi=[100, 0, 0, 100]), (20, 15)),
+        (Calibration(homography=[[1, 0], [0, 1]]), (20, 15)),
+        (Calibration(homography=[[1, 0, 0], [0, 1, 0], [0, 0, 0]]), (20, 15)),
+        (None, (0, 15)),
+    ):
+        try:
+            map_to_grid(box, 100, 100, grid[0], grid[1], calibration)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected ValueError for {calibration} on {grid}")
+    assert map_to_grid([], 100, 100, 20, 15) == []
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import model_registry
+from model_registry import ModelRegistry
+
+
+class BrokenDetector:
+    loads = 0
+
+    def __init__(self, name):
+        self.name = name
+
+    def load(self):
+        BrokenDetector.loads += 1
+        raise FileNotFoundError(f"{self.name} not found")
+
+
+def test_failed_load_backs_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_registry, "BACKEND", "broken")
+    monkeypatch.setitem(model_registry.BACKENDS, "broken", BrokenDetector)
+    monkeypatch.setattr(model_registry, "MODEL_RETRY_SECONDS", 60)
+    weights = tmp_path / "weights.pt"
+    registry = ModelRegistry()
+
+    BrokenDetector.loads = 0
+    for _ in range(5):
+        assert registry.get(str(weights)) is None
+    # Every /detect call after the first falls back without paying for another load
+    assert BrokenDetector.loads == 1
+    assert "not found" in registry.status()["models"][str(weights)]["error"]
+
+    # New weights on disk are tried straight away
+    weights.write_bytes(b"new weights")
+    assert registry.get(str(weights)) is None
+    assert BrokenDetector.loads == 2
+
+    # And so is the same file once the backoff has passed
+    monkeypatch.setattr(model_registry, "MODEL_RETRY_SECONDS", 0)
+    assert registry.get(str(weights)) is None
+    assert BrokenDetector.loads == 3
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import optimizer
+import plan_pool
+from load_planner import plan_load
+from models import Box, LoadPlanRequest
+
+
+def random_request(rng, **kwargs):
+    boxes = [Box(id=f"b{i}", x=0, y=0, w=rng.randint(1, 7), h=rng.randint(1, 7)) for i in range(rng.randint(5, 25))]
+    return LoadPlanRequest(grid_width=12, grid_height=9, boxes=boxes, optimize=True, **kwargs)
+
+
+def run_on_threads(monkeypatch, workers):
+    # Search on the default thread pool, so the test needs no planner processes
+    monkeypatch.setattr(plan_pool, "PLAN_WORKERS", 0)
+    monkeypatch.setattr(plan_pool, "_executor", None)
+    monkeypatch.setattr(plan_pool, "workers", lambda: workers)
+
+
+def test_never_worse_than_greedy(monkeypatch):
+    run_on_threads(monkeypatch, 1)
+    rng = random.Random(3)
+    for case in range(15):
+        body = random_request(rng, time_budget_ms=30, seed=case)
+        greedy = plan_load(body)
+        result = asyncio.run(optimizer.optimize_plan(body))
+        report = result.optimization
+        assert report.baseline_placed == len(greedy.placements), case
+        # The single worker starts from the greedy order, so it can only improve on it
+        assert (len(result.placements), result.score) >= (len(greedy.placements), greedy.score), case
+        assert len(result.placements) + len(result.warnings) == len(body.boxes), case
+        assert report.trajectory and report.trajectory[0].placed == len(greedy.placements), case
+
+
+def test_placements_stay_valid_with_rotation(monkeypatch):
+    run_on_threads(monkeypatch, 2)
+    body = random_request(random.Random(5), time_budget_ms=50, seed=1, allow_rotation=True)
+    result = asyncio.run(optimizer.optimize_plan(body))
+    sizes = {b.id: {(b.w, b.h), (b.h, b.w)} for b in body.boxes}
+    cells = set()
+    for p in result.placements:
+        assert (p.w, p.h) in sizes[p.id]
+        assert p.x + p.w <= body.grid_width and p.y + p.h <= body.grid_height
+        covered = {(x, y) for x in range(p.x, p.x + p.w) for y in range(p.y, p.y + p.h)}
+        assert not cells & covered
+        cells |= covered
+    assert result.optimization.workers == 2
+
+
+def test_time_budget_is_respected(monkeypatch):
+    run_on_threads(monkeypatch, 1)
+    body = random_request(random.Random(9), time_budget_ms=150, seed=2)
+    started = time.perf_counter()
+    result = asyncio.run(optimizer.optimize_plan(body))
+    elapsed = time.perf_counter() - started
+    print(f"Budget 150 ms: search {result.optimization.elapsed_ms} ms, {result.optimization.evaluated} candidates")
+    assert result.optimization.evaluated > 1
+    assert 0.15 <= elapsed < 1.5
+
+    # Oversized budgets are capped
+    monkeypatch.setattr(optimizer, "PLAN_MAX_BUDGET_MS", 100)
+    started = time.perf_counter()
+    asyncio.run(optimizer.optimize_plan(body.model_copy(update={"time_budget_ms": 60_000})))
+    assert time.perf_counter() - started < 1.5
+
+
+def test_invalid_budget_and_strategy(monkeypatch):
+    run_on_threads(monkeypatch, 1)
+    body = random_request(random.Random(1))
+    for update in ({"time_budget_ms": 0}, {"strategy": "nope"}):
+        try:
+            asyncio.run(optimizer.optimize_plan(body.model_copy(update=update)))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected ValueError for {update}")
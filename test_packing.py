@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from load_planner import plan_load
+from models import Box, LoadPlanRequest
+from packing import DEFAULT_STRATEGY, ENGINES
+
+
+def original_plan_load(grid_w, grid_h, boxes):
+    """plan_load as it was before the packing engines, kept as the reference."""
+    sorted_boxes = sorted(boxes, key=lambda b: b.w * b.h, reverse=True)
+    occupied = [[False for _ in range(grid_w)] for _ in range(grid_h)]
+    placements = []
+    warnings = []
+
+    def can_place(x, y, w, h):
+        if x < 0 or y < 0 or x + w > grid_w or y + h > grid_h:
+            return False
+        for yy in range(y, y + h):
+            for xx in range(x, x + w):
+                if occupied[yy][xx]:
+                    return False
+        return True
+
+    def place(x, y, w, h):
+        for yy in range(y, y + h):
+            for xx in range(x, x + w):
+                occupied[yy][xx] = True
+
+    for b in sorted_boxes:
+        placed = False
+        for yy in range(grid_h):
+            for xx in range(grid_w):
+                if can_place(xx, yy, b.w, b.h):
+                    place(xx, yy, b.w, b.h)
+                    placements.append(Box(id=b.id, x=xx, y=yy, w=b.w, h=b.h, label=b.label, confidence=b.confidence))
+                    placed = True
+                    break
+            if placed:
+                break
+        if not placed:
+            warnings.append(f"Could not place {b.id}, not enough space")
+
+    adjacency = 0
+    for yy in range(grid_h):
+        for xx in range(grid_w):
+            if occupied[yy][xx]:
+                if yy > 0 and occupied[yy - 1][xx]:
+                    adjacency += 1
+                if xx > 0 and occupied[yy][xx - 1]:
+                    adjacency += 1
+    total_cells = grid_w * grid_h
+    filled = sum(1 for yy in range(grid_h) for xx in range(grid_w) if occupied[yy][xx])
+    fill_ratio = filled / total_cells if total_cells else 0
+    score = round(0.6 * fill_ratio + 0.4 * (adjacency / (total_cells * 2)), 3)
+    return placements, score, warnings
+
+
+def random_boxes(rng, count, max_w, max_h):
+    return [Box(id=f"b{i}", x=0, y=0, w=rng.randint(1, max_w), h=rng.randint(1, max_h)) for i in range(count)]
+
+
+def test_default_is_first_fit():
+    assert DEFAULT_STRATEGY == "first_fit"
+    assert LoadPlanRequest(boxes=[]).strategy == "first_fit"
+
+
+def test_first_fit_matches_original_plan_load():
+    rng = random.Random(7)
+    for case in range(200):
+        grid_w, grid_h = rng.choice([(20, 15), (10, 10), (7, 23)])
+        boxes = random_boxes(rng, rng.randint(0, 25), 8, 8)
+        result = plan_load(LoadPlanRequest(grid_width=grid_w, grid_height=grid_h, boxes=boxes, strategy="first_fit"))
+        placements, score, warnings = original_plan_load(grid_w, grid_h, boxes)
+        assert result.placements == placements, case
+        assert result.score == score, case
+        assert result.warnings == warnings, case
+        assert result.sequence == [p.id for p in placements], case
+
+
+def test_skyline_places_without_overlap():
+    rng = random.Random(11)
+    for case in range(200):
+        grid_w, grid_h = rng.choice([(20, 15), (40, 30), (13, 9)])
+        boxes = random_boxes(rng, rng.randint(1, 30), 9, 9)
+        result = plan_load(LoadPlanRequest(grid_width=grid_w, grid_height=grid_h, boxes=boxes, strategy="skyline"))
+        cells = set()
+        for p in result.placements:
+            assert 0 <= p.x and p.x + p.w <= grid_w and 0 <= p.y and p.y + p.h <= grid_h, case
+            covered = {(x, y) for x in range(p.x, p.x + p.w) for y in range(p.y, p.y + p.h)}
+            assert not cells & covered, (case, p.id)
+            cells |= covered
+        assert len(result.placements) + len(result.warnings) == len(boxes), case
+
+
+def test_unknown_strategy():
+    assert sorted(ENGINES) == ["first_fit", "skyline"]
+    try:
+        plan_load(LoadPlanRequest(boxes=[], strategy="nope"))
+    except ValueError as e:
+        assert "nope" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
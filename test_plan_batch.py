@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import plan_pool
+from load_planner import plan_load
+from models import Box, LoadPlanBatchRequest, LoadPlanRequest, VehicleCandidate
+from plan_batch import expand, stream_batch
+
+BOXES = [Box(id=f"b{i}", x=0, y=0, w=3, h=3) for i in range(6)]
+VEHICLES = [
+    VehicleCandidate(name="large", grid_width=20, grid_height=20),
+    VehicleCandidate(name="small", grid_width=6, grid_height=6),
+    VehicleCandidate(name="medium", grid_width=9, grid_height=6),
+]
+
+
+def collect(batch):
+    async def run():
+        return [line async for line in stream_batch(expand(batch), batch.rank)]
+
+    lines = asyncio.run(run())
+    assert all(line.endswith("\n") for line in lines)
+    return [json.loads(line) for line in lines]
+
+
+def test_ranks_vehicles(monkeypatch):
+    monkeypatch.setattr(plan_pool, "PLAN_WORKERS", 0)
+    monkeypatch.setattr(plan_pool, "_executor", None)
+    records = collect(LoadPlanBatchRequest(boxes=BOXES, vehicles=VEHICLES, rank=True))
+    plans, ranking = records[:-1], records[-1]["ranking"]
+
+    # One line per vehicle, in whatever order they finished, each matching a direct plan_load
+    assert sorted(r["index"] for r in plans) == [0, 1, 2]
+    for record in plans:
+        vehicle = VEHICLES[record["index"]]
+        assert record["vehicle"] == vehicle.name
+        expected = plan_load(LoadPlanRequest(grid_width=vehicle.grid_width, grid_height=vehicle.grid_height, boxes=BOXES))
+        assert record["plan"] == json.loads(expected.model_dump_json())
+
+    print(f"Ranking: {ranking}")
+    # Medium fits every box and fills more of its floor than large; small leaves boxes behind
+    assert [r["vehicle"] for r in ranking] == ["medium", "large", "small"]
+    assert [r["unplaced"] for r in ranking] == [0, 0, 2]
+    assert ranking[0]["cells"] == 54
+
+
+def test_errors_are_reported_per_job(monkeypatch):
+    monkeypatch.setattr(plan_pool, "PLAN_WORKERS", 0)
+    monkeypatch.setattr(plan_pool, "_executor", None)
+    batch = LoadPlanBatchRequest(plans=[
+        LoadPlanRequest(boxes=BOXES),
+        LoadPlanRequest(boxes=BOXES, strategy="nope"),
+    ], rank=True)
+    records = collect(batch)
+    by_index = {r["index"]: r for r in records[:-1]}
+    assert "plan" in by_index[0]
+    assert "nope" in by_index[1]["error"]
+    # Failed jobs are left out of the ranking
+    assert [r["index"] for r in records[-1]["ranking"]] == [0]
+
+
+def test_expand_validates_the_batch():
+    jobs = expand(LoadPlanBatchRequest(plans=[LoadPlanRequest(boxes=BOXES)], boxes=BOXES, vehicles=VEHICLES[:1],
+                                       strategy="skyline"))
+    assert [vehicle for vehicle, _ in jobs] == [None, "large"]
+    assert jobs[1][1].strategy == "skyline" and jobs[1][1].grid_width == 20
+    for batch in (LoadPlanBatchRequest(), LoadPlanBatchRequest(boxes=BOXES)):
+        try:
+            expand(batch)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected ValueError for {batch}")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from load_planner import plan_load
+from models import Box, BoxMove, LoadPlanRequest, PlanEditRequest
+from plan_sessions import PlanSessionStore
+
+
+def box(box_id, w, h):
+    return Box(id=box_id, x=0, y=0, w=w, h=h)
+
+
+def session_for(store, grid_w, grid_h, boxes):
+    body = LoadPlanRequest(grid_width=grid_w, grid_height=grid_h, boxes=boxes, strategy="first_fit")
+    return store.create(body, plan_load(body))
+
+
+def test_edit_applies_remove_then_move_then_add():
+    session = session_for(PlanSessionStore(), 4, 2, [box("a", 2, 2), box("b", 2, 2)])
+    assert (session.placements["a"].x, session.placements["b"].x) == (0, 2)
+
+    # The move only fits once "a" is gone, and "c" only fits in the space "b" leaves behind
+    diff = session.apply(PlanEditRequest(remove=["a"], move=[BoxMove(id="b", x=0, y=0)], add=[box("c", 2, 2)]))
+    print(f"Diff: {diff}")
+    assert diff.removed == ["a"]
+    assert [(p.id, p.x) for p in diff.moved] == [("b", 0)]
+    assert [(p.id, p.x) for p in diff.added] == [("c", 2)]
+    assert diff.warnings == [] and diff.unplaced == []
+    assert diff.version == 1
+    assert session.engine.occupied.all()
+
+
+def test_failed_move_keeps_the_box_in_place():
+    session = session_for(PlanSessionStore(), 4, 2, [box("a", 2, 2), box("b", 2, 2)])
+    diff = session.apply(PlanEditRequest(move=[BoxMove(id="b", x=1, y=0)]))
+    assert diff.moved == []
+    assert "Could not move b" in diff.warnings[0]
+    assert session.placements["b"].x == 2
+    assert session.engine.occupied.all()
+
+
+def test_pending_boxes_are_retried_when_space_frees():
+    session = session_for(PlanSessionStore(), 4, 2, [box("a", 2, 2), box("b", 2, 2), box("c", 2, 2)])
+    assert list(session.pending) == ["c"]
+
+    # Adding another box that doesn't fit leaves both waiting, warning only about the new one
+    diff = session.apply(PlanEditRequest(add=[box("d", 1, 1)]))
+    assert diff.unplaced == ["c", "d"]
+    assert diff.warnings == ["Could not place d, not enough space"]
+
+    # Freed space goes to the waiting boxes, largest first
+    diff = session.apply(PlanEditRequest(remove=["a"]))
+    assert [p.id for p in diff.added] == ["c"]
+    assert diff.unplaced == ["d"]
+    assert session.plan().warnings == ["Could not place d, not enough space"]
+
+    # Removing a box that never got placed just drops it
+    diff = session.apply(PlanEditRequest(remove=["d"]))
+    assert diff.unplaced == [] and diff.added == []
+
+
+def test_invalid_edit_changes_nothing():
+    session = session_for(PlanSessionStore(), 4, 2, [box("a", 2, 2)])
+    before = session.engine.occupied.copy()
+    for edit in (
+        PlanEditRequest(remove=["a", "missing"]),
+        PlanEditRequest(remove=["a"], move=[BoxMove(id="a", x=2, y=0)]),
+        PlanEditRequest(add=[box("a", 1, 1)]),
+    ):
+        try:
+            session.apply(edit)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"expected ValueError for {edit}")
+    assert session.version == 0
+    assert (session.engine.occupied == before).all()
+    assert list(session.placements) == ["a"]
+
+
+def test_store_expiry_and_eviction():
+    store = PlanSessionStore(ttl_seconds=60, max_sessions=2)
+    first = session_for(store, 4, 2, [])
+    second = session_for(store, 4, 2, [])
+    third = session_for(store, 4, 2, [])
+    assert store.get(first.session_id) is None
+    assert store.get(third.session_id) is third
+
+    second.touched -= 120
+    assert store.get(second.session_id) is None
+    assert store.delete(third.session_id)
+    assert not store.delete(third.session_id)
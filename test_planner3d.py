@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from models import Axle, Box3D, LoadPlan3DRequest, Vehicle
+from planner3d import plan_load_3d
+
+# One carton footprint wide and long, so a second carton can only go on top
+NARROW = Vehicle(width=10, length=10, height=100)
+
+
+def plan(vehicle, boxes):
+    return plan_load_3d(LoadPlan3DRequest(vehicle=vehicle, boxes=boxes))
+
+
+def by_id(result):
+    return {p.id: p for p in result.placements}
+
+
+def test_stacks_plain_boxes():
+    result = plan(NARROW, [Box3D(id="a", w=10, h=10, d=10), Box3D(id="b", w=10, h=10, d=10)])
+    placed = by_id(result)
+    assert result.unplaced == []
+    assert sorted(p.z for p in placed.values()) == [0, 10]
+
+
+def test_fragile_carries_nothing_even_without_weight():
+    result = plan(NARROW, [
+        Box3D(id="a", w=10, h=10, d=10, fragile=True),
+        Box3D(id="b", w=10, h=10, d=10, fragile=True),
+    ])
+    print(f"Fragile warnings: {result.warnings}")
+    assert len(result.placements) == 1
+    assert len(result.unplaced) == 1
+    assert "stacking" in result.warnings[0]
+
+
+def test_non_stackable_carries_nothing():
+    result = plan(NARROW, [
+        Box3D(id="base", w=10, h=10, d=10, stackable=False),
+        Box3D(id="top", w=10, h=10, d=10, stackable=False),
+    ])
+    assert len(result.placements) == 1
+    assert "stacking" in result.warnings[0]
+
+
+def test_fragile_box_goes_on_top_of_a_sturdy_one():
+    result = plan(NARROW, [
+        Box3D(id="glass", w=10, h=10, d=10, fragile=True),
+        Box3D(id="crate", w=10, h=10, d=10, weight=20),
+    ])
+    placed = by_id(result)
+    assert result.unplaced == []
+    assert placed["crate"].z == 0
+    assert placed["glass"].z == 10
+
+
+def test_max_stack_weight():
+    boxes = [
+        Box3D(id="base", w=10, h=10, d=20, weight=50, max_stack_weight=15),
+        Box3D(id="light", w=10, h=10, d=10, weight=10),
+        Box3D(id="heavy", w=10, h=10, d=10, weight=10),
+    ]
+    result = plan(NARROW, boxes)
+    # The second carton on top would put 20 on a base rated for 15
+    assert len(result.placements) == 2
+    assert "stacking" in result.warnings[0]
+
+    # The limit also counts weight passed down through boxes in between
+    result = plan(NARROW, [boxes[0].model_copy(update={"max_stack_weight": 25})] + boxes[1:])
+    assert result.unplaced == []
+
+
+def test_axle_limit():
+    vehicle = Vehicle(width=10, length=100, height=10,
+                      axles=[Axle(position=10, max_load=1000), Axle(position=90, max_load=30)])
+    result = plan(vehicle, [Box3D(id=f"b{i}", w=10, h=10, d=10, weight=20) for i in range(10)])
+    print(f"Axle loads: {result.axle_loads}")
+    assert result.unplaced
+    assert any("axle load" in w for w in result.warnings)
+    for axle in result.axle_loads:
+        assert axle.load <= axle.max_load + 1e-6
+
+
+def test_payload_limit():
+    vehicle = Vehicle(width=10, length=100, height=10, max_payload=50)
+    result = plan(vehicle, [Box3D(id=f"b{i}", w=10, h=10, d=10, weight=20) for i in range(4)])
+    assert len(result.placements) == 2
+    assert result.total_weight == 40
+    assert all("payload" in w for w in result.warnings)
+
+
+def test_placements_do_not_overlap():
+    vehicle = Vehicle(width=40, length=60, height=40)
+    boxes = [Box3D(id=f"b{i}", w=5 + i % 4 * 3, h=6 + i % 3 * 4, d=4 + i % 5 * 2, rotation="any") for i in range(40)]
+    result = plan(vehicle, boxes)
+    placements = result.placements
+    for i, a in enumerate(placements):
+        assert a.x + a.w <= vehicle.width and a.y + a.h <= vehicle.length and a.z + a.d <= vehicle.height
+        for b in placements[i + 1:]:
+            assert (a.x >= b.x + b.w or b.x >= a.x + a.w or a.y >= b.y + b.h or b.y >= a.y + a.h
+                    or a.z >= b.z + b.d or b.z >= a.z + a.d), (a.id, b.id)
+
+
+def test_full_trailer_of_cartons():
+    rng = random.Random(0)
+    trailer = Vehicle(width=245, length=1360, height=270)
+    boxes = [Box3D(id=f"c{i}", w=rng.randint(20, 50), h=rng.randint(20, 50), d=rng.randint(20, 50), weight=10,
+                   rotation="any") for i in range(500)]
+    started = time.perf_counter()
+    result = plan(trailer, boxes)
+    elapsed = time.perf_counter() - started
+    print(f"500 cartons, any rotation: {elapsed * 1000:.0f} ms")
+    # They all fit in about a quarter of the trailer, so none may be left behind
+    assert result.unplaced == [] and elapsed < 1.5
+
+    p = result.placements
+    lo = np.array([[b.x, b.y, b.z] for b in p])
+    hi = lo + np.array([[b.w, b.h, b.d] for b in p])
+    overlap = np.all((lo[:, None] < hi[None]) & (hi[:, None] > lo[None]), axis=2)
+    np.fill_diagonal(overlap, False)
+    assert not overlap.any() and np.all(hi <= [trailer.width, trailer.length, trailer.height])
+    # Every raised carton rests at least min_support of its base on tops at its height
+    ox = np.clip(np.minimum(hi[:, None, 0], hi[None, :, 0]) - np.maximum(lo[:, None, 0], lo[None, :, 0]), 0, None)
+    oy = np.clip(np.minimum(hi[:, None, 1], hi[None, :, 1]) - np.maximum(lo[:, None, 1], lo[None, :, 1]), 0, None)
+    resting = np.where(hi[None, :, 2] == lo[:, None, 2], ox * oy, 0).sum(axis=1)
+    base = (hi[:, 0] - lo[:, 0]) * (hi[:, 1] - lo[:, 1])
+    raised = lo[:, 2] > 0
+    assert raised.any() and np.all(resting[raised] >= 0.75 * base[raised])
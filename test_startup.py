@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+import startup
+from startup import Readiness
+
+
+def test_failed_warmers_are_retried():
+    calls = {"flaky": 0}
+
+    def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] < 3:
+            raise ConnectionError("upstream timed out")
+
+    readiness = Readiness(["planning", "flaky", "missing"], retry_seconds=0.01, retry_max_seconds=0.02)
+    readiness.register("planning", lambda: None)
+    readiness.register("flaky", flaky)
+
+    async def run():
+        task = asyncio.create_task(readiness.warm())
+        await asyncio.sleep(0)
+        # The first round is over as soon as planning is warm and flaky has failed once
+        while readiness.subsystems.get("flaky", {}).get("attempts", 0) < 1 or \
+                readiness.subsystems["flaky"]["state"] == "warming":
+            await asyncio.sleep(0.001)
+        assert readiness.subsystems["flaky"]["state"] == "failed"
+        await asyncio.wait_for(task, 2)
+
+    asyncio.run(run())
+    assert readiness.subsystems["flaky"] == {"state": "warm", "attempts": 3, "seconds": readiness.subsystems["flaky"]["seconds"]}
+    assert readiness.subsystems["planning"]["attempts"] == 1
+    # An unregistered subsystem is reported once and never retried
+    assert readiness.subsystems["missing"]["attempts"] == 1 and not readiness.ready
+
+    readiness.required = ["planning", "flaky"]
+    assert readiness.ready
+
+
+def test_retries_can_be_turned_off():
+    readiness = Readiness(["broken"], retry_seconds=0)
+    readiness.register("broken", lambda: 1 / 0)
+    asyncio.run(asyncio.wait_for(readiness.warm(), 2))
+    assert readiness.subsystems["broken"]["state"] == "failed" and readiness.subsystems["broken"]["attempts"] == 1
+
+
+def test_only_configured_upstreams_are_required(monkeypatch):
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.delenv("ELEVENLABS_API_KEY", raising=False)
+    assert startup.default_subsystems() == ["planning", "detection"]
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "key")
+    assert startup.default_subsystems() == ["planning", "detection", "chat"]
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "key")
+    assert startup.default_subsystems() == ["planning", "detection", "chat", "tts"]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from boxes import BoxArray
+from tracking import Tracker
+from video_stream import VideoStream
+
+
+def detections(*xywh, label="box"):
+    return BoxArray.from_boxes([{"id": f"det-{i}", "x": x, "y": y, "w": w, "h": h, "label": label}
+                                for i, (x, y, w, h) in enumerate(xywh)])
+
+
+def test_tracker_keeps_ids_across_detections():
+    tracker = Tracker(iou_threshold=0.3, max_misses=2)
+    delta = tracker.update(detections((0, 0, 10, 10), (50, 50, 10, 10)), frame=0)
+    assert [b["id"] for b in delta["added"]] == ["trk-1", "trk-2"]
+    assert delta["updated"] == [] and delta["removed"] == []
+
+    # Both boxes moved a little, listed in the other order; IDs follow the boxes
+    delta = tracker.update(detections((52, 50, 10, 10), (2, 0, 10, 10)), frame=5)
+    assert delta["added"] == [] and delta["removed"] == []
+    assert {b["id"]: b["x"] for b in delta["updated"]} == {"trk-1": 2, "trk-2": 52}
+
+    # Unchanged boxes produce no delta at all
+    assert tracker.update(detections((52, 50, 10, 10), (2, 0, 10, 10)), frame=10) == \
+        {"added": [], "updated": [], "removed": []}
+
+
+def test_tracker_predicts_between_detections():
+    tracker = Tracker()
+    tracker.update(detections((0, 0, 10, 10)), frame=0)
+    tracker.update(detections((4, 0, 10, 10)), frame=4)
+    # One pixel per frame, carried forward from the last detection
+    delta = tracker.predict(frame=7)
+    assert [(b["id"], b["x"]) for b in delta["updated"]] == [("trk-1", 7)]
+    assert tracker.predict(frame=7)["updated"] == []
+
+
+def test_tracker_expires_unmatched_tracks():
+    tracker = Tracker(iou_threshold=0.3, max_misses=2)
+    tracker.update(detections((0, 0, 10, 10)), frame=0)
+    # A box far away starts a new track; the old one is kept while it has misses to spare
+    for frame in (1, 2):
+        delta = tracker.update(detections((100, 100, 10, 10)), frame=frame)
+        assert delta["removed"] == []
+    assert len(tracker) == 2
+    delta = tracker.update(detections((100, 100, 10, 10)), frame=3)
+    assert delta["removed"] == ["trk-1"]
+    assert tracker.ids == ["trk-2"]
+
+    delta = tracker.reset()
+    assert delta["removed"] == ["trk-2"] and len(tracker) == 0
+    # New tracks after a reset never reuse old IDs
+    assert [b["id"] for b in tracker.update(detections((0, 0, 10, 10)), frame=4)["added"]] == ["trk-3"]
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.sent = []
+
+    async def receive(self):
+        if self.messages:
+            return self.messages.pop(0)
+        return {"type": "websocket.disconnect"}
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+
+def test_bad_control_messages_keep_the_stream_open():
+    texts = ["not json", "[1, 2]", '{"detect_every": null}', '{"detect_every": "fast"}', '{"detect_every": 3}']
+    websocket = FakeWebSocket([{"type": "websocket.receive", "text": t} for t in texts]
+                              + [{"type": "websocket.receive", "bytes": b"frame"}])
+    stream = VideoStream(websocket, detect_every=5)
+    asyncio.run(stream._receive())
+    print(f"Sent: {websocket.sent}")
+    assert [m["event"] for m in websocket.sent] == ["error"] * 4
+    assert all(m["detail"].startswith("Invalid control message") for m in websocket.sent)
+    # Messages after the bad ones were still handled
+    assert stream.detect_every == 3
+    assert stream.frames.received == 1
+    assert stream.frames.closed